@@ -1,6 +1,10 @@
-from dagster import asset, get_dagster_logger, AssetKey
+from dagster import AssetExecutionContext, AssetKey, Config, get_dagster_logger
+from dagster_dbt import DagsterDbtTranslator, DbtCliResource, DbtProject, dbt_assets
 import os
-import subprocess
+import shutil
+from typing import Optional
+
+from ..dbt_state import load_manifest, modified_unique_ids
 # from .meltano_pipeline import meltano_run_elt
 
 # Paths
@@ -9,34 +13,66 @@ DBT_PROFILES_DIR = DBT_PROJECT_DIR   # adjust if you later move to ~/.dbt
 
 logger = get_dagster_logger()
 
-def run_dbt_command(cmd: list[str]) -> str:
-    """Run a dbt command and return its output, raising Exception on failure."""
-    full_cmd = cmd + ["--profiles-dir", DBT_PROFILES_DIR]
-    logger.info(f"Running dbt command: {' '.join(full_cmd)}")
-    try:
-        output = subprocess.check_output(full_cmd, stderr=subprocess.STDOUT).decode()
-        logger.info(output)
-        return output
-    except subprocess.CalledProcessError as e:
-        logger.error(e.output.decode())
-        raise Exception(e.output.decode())
-
-@asset(deps=[AssetKey("meltano_run_elt")])
-def pipeline_dbt_deps() -> None:
-    """Install dbt packages (from packages.yml)."""
-    run_dbt_command(["dbt", "deps", "--project-dir", DBT_PROJECT_DIR])
-
-@asset(deps=[pipeline_dbt_deps])
-def pipeline_dbt_seed() -> None:
-    """Runs dbt seed."""
-    run_dbt_command(["dbt", "seed", "--project-dir", DBT_PROJECT_DIR])
-
-@asset(deps=[pipeline_dbt_seed])
-def pipeline_dbt_run() -> None:
-    """Runs dbt run --full-refresh."""
-    run_dbt_command(["dbt", "run", "--full-refresh", "--project-dir", DBT_PROJECT_DIR])
-
-@asset(deps=[pipeline_dbt_run])
-def pipeline_dbt_test() -> None:
-    """Runs dbt test."""
-    run_dbt_command(["dbt", "test", "--project-dir", DBT_PROJECT_DIR])
\ No newline at end of file
+# state_path keeps the manifest of the last complete build; state:modified+ is
+# computed against it
+dbt_project = DbtProject(
+    project_dir=DBT_PROJECT_DIR,
+    profiles_dir=DBT_PROFILES_DIR,
+    state_path="target/last_build",
+)
+# Under `dagster dev` this runs dbt deps + parse so the manifest below is current.
+# Deployments build it ahead of time with `dagster-dbt project prepare-and-package`.
+dbt_project.prepare_if_dev()
+# A checkout that was never parsed (CI, a fresh clone) parses the project on load
+if not dbt_project.manifest_path.exists():
+    logger.info(f"No dbt manifest at {dbt_project.manifest_path}; running dbt deps and parse")
+    dbt_project.preparer.prepare(dbt_project)
+
+
+class DbtRunConfig(Config):
+    """Build options; the defaults give an incremental build of every selected model."""
+    full_refresh: bool = False
+    fact_lookback_days: int = 3
+    threads: int = 8
+
+
+def save_build_state(target_path) -> None:
+    """Keeps the manifest of a complete build as the baseline for state:modified."""
+    os.makedirs(dbt_project.state_path, exist_ok=True)
+    shutil.copy(os.path.join(target_path, "manifest.json"), os.path.join(dbt_project.state_path, "manifest.json"))
+
+
+def modified_asset_keys() -> Optional[set[AssetKey]]:
+    """Keys of the dbt nodes changed since the last complete build, plus their
+    descendants (dbt's state:modified+); None while there is no previous build."""
+    state_manifest = os.path.join(dbt_project.state_path, "manifest.json")
+    if not os.path.exists(state_manifest):
+        return None
+    manifest = load_manifest(dbt_project.manifest_path)
+    translator = DagsterDbtTranslator()
+    return {
+        translator.get_asset_key(manifest["nodes"][unique_id])
+        for unique_id in modified_unique_ids(manifest, load_manifest(state_manifest))
+    }
+
+
+# dbt sources keep their default keys (raw/<table>), which are the loaded tables
+# reported by raw_bulk_load, so each staging model waits only on its own entity
+@dbt_assets(manifest=dbt_project.manifest_path, project=dbt_project)
+def olist_dbt_models(context: AssetExecutionContext, dbt: DbtCliResource, config: DbtRunConfig):
+    """Runs dbt build (seeds, models and their tests) for the selected models."""
+    args = ["build", "--threads", str(config.threads),
+            "--vars", f"{{fact_lookback_days: {config.fact_lookback_days}}}"]
+    if config.full_refresh:
+        args.append("--full-refresh")
+    # Deployed runs install the dbt packages themselves instead of relying on the
+    # image having run prepare-and-package; deps is quick once they are installed
+    dbt.cli(["deps", "--quiet"], target_path=dbt_project.target_path).wait()
+    # The selection comes from the run (e.g. dbt_modified_sensor), which dbt.cli
+    # turns into --select; adding another --select here would widen it
+    invocation = dbt.cli(args, context=context)
+    yield from invocation.stream()
+    # The baseline only moves once every model changed since it has been rebuilt
+    modified = modified_asset_keys()
+    if not context.is_subset or (modified is not None and modified <= context.selected_asset_keys):
+        save_build_state(invocation.target_path)
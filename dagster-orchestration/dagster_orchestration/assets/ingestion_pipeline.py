@@ -1,15 +1,15 @@
 import subprocess
+import sys
+import os
 from dagster import asset, Definitions
 import pandas as pd
-SCRIPT_PATH = "/home/ser/DSAI/5m-data-m2-project-2/5m-data-m2-project/scripts/ingest.py"
+SCRIPT_PATH = os.path.join(os.path.dirname(__file__), "../../../scripts/ingest.py")
 
 @asset
 def ingestion():
-    """Delegates dataset download/unzip to external script."""
-    result = subprocess.run(["python", SCRIPT_PATH], capture_output=True, text=True)
+    """Delegates dataset download/unzip to external script (a no-op when the dataset is unchanged)."""
+    result = subprocess.run([sys.executable, SCRIPT_PATH], capture_output=True, text=True)
     if result.returncode != 0:
         raise Exception(f"Script failed: {result.stderr}")
     print(result.stdout)
     return pd.DataFrame({"status": [result.returncode]})
-
-
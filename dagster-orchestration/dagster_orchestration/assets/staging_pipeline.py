@@ -0,0 +1,433 @@
+from dagster import (
+    asset, get_dagster_logger, AssetDep, AssetExecutionContext, AssetKey, AssetMaterialization, AssetRecordsFilter,
+    AssetsDefinition, AssetSpec, Backoff,
+    Config, ConfigurableResource, EnvVar, MaterializeResult, RetryPolicy, SpecificPartitionsPartitionMapping,
+    StaticPartitionsDefinition,
+)
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import hashlib
+import json
+import os
+from typing import Optional
+import duckdb
+from filelock import FileLock
+
+logger = get_dagster_logger()
+
+# Paths (override with OLIST_RAW_DIR / OLIST_STAGING_DIR)
+RAW_DIR = os.getenv("OLIST_RAW_DIR", os.path.join(os.path.dirname(__file__), "../../../assets"))
+STAGING_DIR = os.getenv("OLIST_STAGING_DIR", os.path.join(RAW_DIR, "parquet"))
+
+# Same entities (and warehouse table names) as the tap-csv config in meltano-ingestion/meltano.yml
+RAW_FILES = {
+    "customer": "olist_customers_dataset.csv",
+    "geolocation": "olist_geolocation_dataset.csv",
+    "order_item": "olist_order_items_dataset.csv",
+    "order_payment": "olist_order_payments_dataset.csv",
+    "order_review": "olist_order_reviews_dataset.csv",
+    "order": "olist_orders_dataset.csv",
+    "product": "olist_products_dataset.csv",
+    "seller": "olist_sellers_dataset.csv",
+    "product_category_name_translation": "product_category_name_translation.csv",
+}
+
+# Natural key of each entity's rows, for row-level change detection. These are
+# the keys: of the tap-csv config in meltano.yml. geolocation has no unique key
+# (it holds repeated points per zip prefix) so it is always reloaded whole.
+ROW_KEYS = {
+    "customer": ["customer_id"],
+    "order_item": ["order_id", "order_item_id"],
+    "order_payment": ["order_id", "payment_sequential"],
+    "order_review": ["review_id", "order_id"],
+    "order": ["order_id"],
+    "product": ["product_id"],
+    "seller": ["seller_id"],
+    "product_category_name_translation": ["product_category_name"],
+}
+
+# Written by scripts/ingest.py next to the CSVs: {file name: {"sha256": ...}}
+INGEST_MANIFEST = "ingest_manifest.json"
+
+# One partition per raw entity, so each file is staged, loaded and retried on its own
+RAW_PARTITIONS = StaticPartitionsDefinition(list(RAW_FILES))
+# Entities loading at once are capped by this pool's limit (dagster.yaml, or
+# `dagster instance concurrency set raw_ingestion <n>`)
+INGESTION_POOL = "raw_ingestion"
+INGESTION_RETRY_POLICY = RetryPolicy(max_retries=3, delay=30, backoff=Backoff.EXPONENTIAL)
+# When the staged version of a row was produced. Rows a delta leaves untouched
+# keep their earlier stamp, which is what the incremental dbt staging models read.
+LOADED_AT = "_loaded_at"
+# Per staging conversion; DuckDB spills to disk beyond it
+STAGING_MEMORY_LIMIT = os.getenv("OLIST_STAGING_MEMORY_LIMIT", "1GB")
+
+# Declared column types of each raw file, in file order. Zip code prefixes look
+# numeric but keep their leading zeros as strings; money is exact to the cent.
+TIMESTAMP, MONEY = "TIMESTAMP", "DECIMAL(12,2)"
+RAW_SCHEMAS = {
+    "customer": {
+        "customer_id": "VARCHAR", "customer_unique_id": "VARCHAR", "customer_zip_code_prefix": "VARCHAR",
+        "customer_city": "VARCHAR", "customer_state": "VARCHAR",
+    },
+    "geolocation": {
+        "geolocation_zip_code_prefix": "VARCHAR", "geolocation_lat": "DOUBLE", "geolocation_lng": "DOUBLE",
+        "geolocation_city": "VARCHAR", "geolocation_state": "VARCHAR",
+    },
+    "order_item": {
+        "order_id": "VARCHAR", "order_item_id": "INTEGER", "product_id": "VARCHAR", "seller_id": "VARCHAR",
+        "shipping_limit_date": TIMESTAMP, "price": MONEY, "freight_value": MONEY,
+    },
+    "order_payment": {
+        "order_id": "VARCHAR", "payment_sequential": "INTEGER", "payment_type": "VARCHAR",
+        "payment_installments": "INTEGER", "payment_value": MONEY,
+    },
+    "order_review": {
+        "review_id": "VARCHAR", "order_id": "VARCHAR", "review_score": "INTEGER", "review_comment_title": "VARCHAR",
+        "review_comment_message": "VARCHAR", "review_creation_date": TIMESTAMP, "review_answer_timestamp": TIMESTAMP,
+    },
+    "order": {
+        "order_id": "VARCHAR", "customer_id": "VARCHAR", "order_status": "VARCHAR",
+        "order_purchase_timestamp": TIMESTAMP, "order_approved_at": TIMESTAMP,
+        "order_delivered_carrier_date": TIMESTAMP, "order_delivered_customer_date": TIMESTAMP,
+        "order_estimated_delivery_date": TIMESTAMP,
+    },
+    "product": {
+        "product_id": "VARCHAR", "product_category_name": "VARCHAR", "product_name_lenght": "INTEGER",
+        "product_description_lenght": "INTEGER", "product_photos_qty": "INTEGER", "product_weight_g": "DOUBLE",
+        "product_length_cm": "DOUBLE", "product_height_cm": "DOUBLE", "product_width_cm": "DOUBLE",
+    },
+    "seller": {
+        "seller_id": "VARCHAR", "seller_zip_code_prefix": "VARCHAR", "seller_city": "VARCHAR",
+        "seller_state": "VARCHAR",
+    },
+    "product_category_name_translation": {
+        "product_category_name": "VARCHAR", "product_category_name_english": "VARCHAR",
+    },
+}
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def stage_csv_to_parquet(csv_path: str, parquet_path: str, schema: dict[str, str]) -> int:
+    """Normalizes one CSV into typed, zstd-compressed Parquet; returns the row count.
+
+    Header names lose any BOM and surrounding whitespace and must match the
+    declared schema. Values are trimmed, empty ones become NULL, and each column
+    is cast to its declared type (NULL where a value does not parse). Every row
+    is stamped with the staging time in _loaded_at (UTC). DuckDB
+    streams the file through in vectors, so memory stays bounded by the limit
+    below rather than the file size, and the Parquet writer dictionary-encodes
+    the repetitive string columns.
+    """
+    read_csv = f"read_csv({_quote(csv_path)}, header=true, all_varchar=true)"
+    with duckdb.connect(config={"memory_limit": STAGING_MEMORY_LIMIT, "preserve_insertion_order": False}) as conn:
+        header = [row[0] for row in conn.execute(f"DESCRIBE SELECT * FROM {read_csv}").fetchall()]
+        names = [name.lstrip("\ufeff").strip() for name in header]
+        if names != list(schema):
+            raise ValueError(f"{csv_path} has columns {names}, expected {list(schema)}")
+        columns = ", ".join(
+            f"TRY_CAST(NULLIF(TRIM(\"{raw}\"), '') AS {schema[name]}) AS \"{name}\""
+            for raw, name in zip(header, names)
+        )
+        loaded_at = datetime.now(timezone.utc).replace(tzinfo=None).isoformat(sep=" ")
+        columns += f", TIMESTAMP '{loaded_at}' AS {LOADED_AT}"
+        conn.execute(
+            f"COPY (SELECT {columns} FROM {read_csv}) TO {_quote(parquet_path)} (FORMAT parquet, COMPRESSION zstd)"
+        )
+        return conn.execute(f"SELECT count(*) FROM read_parquet({_quote(parquet_path)})").fetchone()[0]
+
+
+def source_sha256(raw_dir: str, file_name: str) -> str:
+    """Content hash of a raw file, from the ingest manifest when it lists the file."""
+    manifest_path = os.path.join(raw_dir, INGEST_MANIFEST)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            entry = json.load(f).get(file_name)
+        if entry:
+            return entry["sha256"]
+    digest = hashlib.sha256()
+    with open(os.path.join(raw_dir, file_name), "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _schema(parquet_path: str) -> list[tuple[str, str]]:
+    return [row[:2] for row in duckdb.sql(f"DESCRIBE SELECT * FROM read_parquet({_quote(parquet_path)})").fetchall()]
+
+
+def _columns(parquet_path: str) -> list[str]:
+    return [name for name, _ in _schema(parquet_path)]
+
+
+def _bigquery_type(duckdb_type: str) -> str:
+    if duckdb_type.startswith("DECIMAL"):
+        return "NUMERIC"
+    return {"VARCHAR": "STRING", "INTEGER": "INT64", "BIGINT": "INT64", "DOUBLE": "FLOAT64",
+            "TIMESTAMP": "TIMESTAMP", "BOOLEAN": "BOOL"}[duckdb_type]
+
+
+# Hash of a staged row's content; the _loaded_at stamp is not content
+ROW_HASH = f"hash(*COLUMNS(* EXCLUDE ({LOADED_AT})))"
+
+
+def write_row_index(parquet_path: str, index_path: str, keys: list[str]) -> None:
+    """Writes the key and row hash of every row in a staged file."""
+    key_list = ", ".join(f'"{k}"' for k in keys)
+    duckdb.sql(
+        f"COPY (SELECT {key_list}, {ROW_HASH} AS _row_hash FROM read_parquet({_quote(parquet_path)})) "
+        f"TO {_quote(index_path)} (FORMAT parquet)"
+    )
+
+
+def write_row_delta(parquet_path: str, index_path: str, delta_path: str, keys: list[str]) -> dict[str, int]:
+    """Diffs a staged file against the row index of the last load; returns the count of each change.
+
+    The delta holds inserted and updated rows in full and deleted rows by key
+    only, each tagged in _change.
+    """
+    key_list = ", ".join(f'"{k}"' for k in keys)
+    with duckdb.connect() as conn:
+        conn.execute(
+            f"CREATE TEMP TABLE new_rows AS SELECT *, {ROW_HASH} AS _row_hash FROM read_parquet({_quote(parquet_path)})"
+        )
+        conn.execute(f"CREATE VIEW old_rows AS SELECT * FROM read_parquet({_quote(index_path)})")
+        conn.execute(f"""
+            COPY (
+                SELECT n.* EXCLUDE (_row_hash), CASE WHEN o._row_hash IS NULL THEN 'insert' ELSE 'update' END AS _change
+                FROM new_rows n LEFT JOIN old_rows o USING ({key_list})
+                WHERE o._row_hash IS DISTINCT FROM n._row_hash
+                UNION ALL BY NAME
+                SELECT {key_list}, 'delete' AS _change FROM old_rows o ANTI JOIN new_rows n USING ({key_list})
+            ) TO {_quote(delta_path)} (FORMAT parquet, COMPRESSION zstd)
+        """)
+        return dict(conn.execute(
+            f"SELECT _change, count(*) FROM read_parquet({_quote(delta_path)}) GROUP BY _change"
+        ).fetchall())
+
+
+# -------------------------
+# Loaders
+# -------------------------
+class ParquetLoader(ConfigurableResource, ABC):
+    """Interface of the raw table loaders; raw_bulk_load works with any implementation."""
+
+    @abstractmethod
+    def load(self, table: str, parquet_path: str) -> int:
+        """Replaces a warehouse table with the contents of a Parquet file; returns the rows loaded."""
+
+    @abstractmethod
+    def merge(self, table: str, delta_path: str, keys: list[str]) -> int:
+        """Applies a row delta from write_row_delta to a loaded table; returns the rows changed."""
+
+
+class BigQueryParquetLoader(ParquetLoader):
+    """Bulk-loads Parquet into BigQuery with one load job per table."""
+    project: str
+    dataset: str = "m2_ingestion"
+    credentials_path: str = ""
+
+    def _client(self):
+        from google.cloud import bigquery
+        if self.credentials_path:
+            return bigquery.Client.from_service_account_json(self.credentials_path, project=self.project)
+        return bigquery.Client(project=self.project)
+
+    def load(self, table: str, parquet_path: str) -> int:
+        from google.cloud import bigquery
+        client = self._client()
+        job_config = bigquery.LoadJobConfig(
+            source_format=bigquery.SourceFormat.PARQUET,
+            write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
+            # Explicit, as BigQuery reads DuckDB's (UTC-naive) Parquet timestamps as DATETIME
+            schema=[bigquery.SchemaField(name, _bigquery_type(type_)) for name, type_ in _schema(parquet_path)],
+        )
+        with open(parquet_path, "rb") as f:
+            job = client.load_table_from_file(f, f"{self.project}.{self.dataset}.{table}", job_config=job_config)
+        job.result()
+        return job.output_rows
+
+    def merge(self, table: str, delta_path: str, keys: list[str]) -> int:
+        """Loads the delta next to the table, then replaces the changed keys in one transaction."""
+        target = f"`{self.project}.{self.dataset}.{table}`"
+        delta_table = f"{self.project}.{self.dataset}.{table}__delta"
+        rows = self.load(f"{table}__delta", delta_path)
+        columns = ", ".join(f"`{c}`" for c in _columns(delta_path) if c != "_change")
+        match = " AND ".join(f"d.`{k}` = t.`{k}`" for k in keys)
+        self._client().query(f"""
+            BEGIN TRANSACTION;
+            DELETE FROM {target} t WHERE EXISTS (SELECT 1 FROM `{delta_table}` d WHERE {match});
+            INSERT INTO {target} ({columns}) SELECT {columns} FROM `{delta_table}` WHERE _change != 'delete';
+            COMMIT TRANSACTION;
+        """).result()
+        self._client().delete_table(delta_table, not_found_ok=True)
+        return rows
+
+
+class DuckDBParquetLoader(ParquetLoader):
+    """Offline stand-in for BigQuery: loads Parquet into a schema of a local DuckDB file.
+
+    DuckDB allows a single writer process, so every load holds an exclusive lock
+    on <database>.lock: partitions running at once load one after the other.
+    """
+    database: str = "olist.duckdb"
+    dataset: str = "m2_ingestion"
+    # Seconds a load waits for the other partitions' loads before it fails
+    lock_timeout: float = 900
+
+    @contextmanager
+    def _connect(self):
+        with FileLock(f"{self.database}.lock", timeout=self.lock_timeout), duckdb.connect(self.database) as conn:
+            yield conn
+
+    def load(self, table: str, parquet_path: str) -> int:
+        with self._connect() as conn:
+            conn.execute(f'CREATE SCHEMA IF NOT EXISTS "{self.dataset}"')
+            conn.execute(
+                f'CREATE OR REPLACE TABLE "{self.dataset}"."{table}" AS SELECT * FROM read_parquet({_quote(parquet_path)})'
+            )
+            return conn.execute(f'SELECT count(*) FROM "{self.dataset}"."{table}"').fetchone()[0]
+
+    def merge(self, table: str, delta_path: str, keys: list[str]) -> int:
+        columns = ", ".join(f'"{c}"' for c in _columns(delta_path) if c != "_change")
+        match = " AND ".join(f'd."{k}" = t."{k}"' for k in keys)
+        with self._connect() as conn:
+            conn.execute(f"CREATE TEMP TABLE delta AS SELECT * FROM read_parquet({_quote(delta_path)})")
+            conn.begin()
+            conn.execute(
+                f'DELETE FROM "{self.dataset}"."{table}" AS t WHERE EXISTS (SELECT 1 FROM delta d WHERE {match})'
+            )
+            conn.execute(
+                f'INSERT INTO "{self.dataset}"."{table}" ({columns}) '
+                f"SELECT {columns} FROM delta WHERE _change <> 'delete'"
+            )
+            conn.commit()
+            return conn.execute("SELECT count(*) FROM delta").fetchone()[0]
+
+
+def build_parquet_loader() -> ParquetLoader:
+    """Picks the loader from OLIST_LOADER: bigquery (default) or duckdb."""
+    if os.getenv("OLIST_LOADER", "bigquery").strip().lower() == "duckdb":
+        return DuckDBParquetLoader(database=os.getenv("OLIST_DUCKDB_PATH", "olist.duckdb"))
+    return BigQueryParquetLoader(
+        project=EnvVar("GCP_PROJECT_ID"),
+        credentials_path=EnvVar("GOOGLE_APPLICATION_CREDENTIALS"),
+    )
+
+
+# -------------------------
+# Assets
+# -------------------------
+class StagingConfig(Config):
+    """Where the raw CSVs are read from and their Parquet copies are written to."""
+    raw_dir: str = RAW_DIR
+    staging_dir: str = STAGING_DIR
+    # Stage and fully reload even when the CSV is unchanged since it was last staged
+    force: bool = False
+
+
+def staged_path(staging_dir: str, table: str, kind: str = "") -> str:
+    """<table>.parquet, or one of its companions: <table>.delta.parquet, <table>.rows.parquet (row index)."""
+    return os.path.join(staging_dir, f"{table}{'.' + kind if kind else ''}.parquet")
+
+
+def _last_source_sha256(context: AssetExecutionContext, asset_key: AssetKey) -> Optional[str]:
+    """source_sha256 of the latest materialization of asset_key for this partition."""
+    records = context.instance.fetch_materializations(
+        AssetRecordsFilter(asset_key=asset_key, asset_partitions=[context.partition_key]), limit=1
+    ).records
+    if not records:
+        return None
+    sha256 = records[0].asset_materialization.metadata.get("source_sha256")
+    return sha256.value if sha256 else None
+
+
+@asset(
+    deps=[AssetKey("ingestion")],
+    partitions_def=RAW_PARTITIONS,
+    pool=INGESTION_POOL,
+    retry_policy=INGESTION_RETRY_POLICY,
+    # Unchanged files yield nothing, which skips raw_bulk_load for them too
+    output_required=False,
+)
+def raw_parquet_staging(context: AssetExecutionContext, config: StagingConfig):
+    """Converts one raw Olist CSV to typed, compressed Parquet with DuckDB, unless it is unchanged."""
+    table = context.partition_key
+    os.makedirs(config.staging_dir, exist_ok=True)
+    parquet_path = staged_path(config.staging_dir, table)
+    sha256 = source_sha256(config.raw_dir, RAW_FILES[table])
+    # Compared with what was last loaded, not staged: a file whose load failed is staged again
+    loaded_sha256 = _last_source_sha256(context, AssetKey("raw_bulk_load"))
+    if not config.force and os.path.exists(parquet_path) and loaded_sha256 == sha256:
+        logger.info(f"{RAW_FILES[table]} unchanged since it was last loaded; skipping {table}")
+        return
+    rows = stage_csv_to_parquet(
+        os.path.join(config.raw_dir, RAW_FILES[table]), parquet_path, RAW_SCHEMAS[table]
+    )
+    logger.info(f"Staged {table}: {rows:,} rows, {os.path.getsize(parquet_path):,} bytes")
+    metadata = {"rows": rows, "bytes": os.path.getsize(parquet_path), "source_sha256": sha256}
+
+    # With a row index from the last load, only the changed rows are shipped
+    delta_path = staged_path(config.staging_dir, table, "delta")
+    if os.path.exists(delta_path):
+        os.remove(delta_path)
+    if table in ROW_KEYS:
+        keys = ROW_KEYS[table]
+        index_path = staged_path(config.staging_dir, table, "rows")
+        write_row_index(parquet_path, staged_path(config.staging_dir, table, "rows.pending"), keys)
+        if os.path.exists(index_path) and not config.force:
+            changes = write_row_delta(parquet_path, index_path, delta_path, keys)
+            logger.info(f"{table} delta: {changes or 'no changed rows'}")
+            metadata.update({f"{change}s": changes.get(change, 0) for change in ("insert", "update", "delete")})
+    yield MaterializeResult(metadata=metadata)
+
+
+@asset(
+    deps=[raw_parquet_staging],
+    partitions_def=RAW_PARTITIONS,
+    pool=INGESTION_POOL,
+    retry_policy=INGESTION_RETRY_POLICY,
+)
+def raw_bulk_load(
+    context: AssetExecutionContext, config: StagingConfig, parquet_loader: ParquetLoader
+) -> MaterializeResult:
+    """Bulk-loads one staged Parquet file into the raw dataset, or merges its row delta."""
+    table = context.partition_key
+    delta_path = staged_path(config.staging_dir, table, "delta")
+    if os.path.exists(delta_path):
+        rows = parquet_loader.merge(table, delta_path, ROW_KEYS[table])
+        logger.info(f"Merged {table}: {rows:,} changed rows")
+    else:
+        rows = parquet_loader.load(table, staged_path(config.staging_dir, table))
+        logger.info(f"Loaded {table}: {rows:,} rows")
+    # The next delta is taken against what has now been loaded
+    pending_index_path = staged_path(config.staging_dir, table, "rows.pending")
+    if os.path.exists(pending_index_path):
+        os.replace(pending_index_path, staged_path(config.staging_dir, table, "rows"))
+    context.log_event(AssetMaterialization(asset_key=raw_table_key(table), metadata={"rows": rows}))
+    metadata = {"rows": rows}
+    # The CSV version now loaded, which lets raw_parquet_staging skip it next time
+    sha256 = _last_source_sha256(context, raw_parquet_staging.key)
+    if sha256:
+        metadata["source_sha256"] = sha256
+    return MaterializeResult(metadata=metadata)
+
+
+def raw_table_key(table: str) -> AssetKey:
+    """Key of a loaded raw table; matches the dbt source raw.<table>."""
+    return AssetKey(["raw", table])
+
+
+# The loaded warehouse tables, each fed by its own raw_bulk_load partition. One
+# definition per table, as a definition holds a single mapping per upstream asset.
+raw_tables = [
+    AssetsDefinition(specs=[AssetSpec(
+        raw_table_key(table),
+        deps=[AssetDep(raw_bulk_load, partition_mapping=SpecificPartitionsPartitionMapping([table]))],
+        description=f"The raw {table} table, loaded from {RAW_FILES[table]}.",
+    )])
+    for table in RAW_FILES
+]
@@ -0,0 +1,48 @@
+import json
+
+# Node types that dbt build materializes; tests follow the models they cover
+BUILT_RESOURCE_TYPES = ("model", "seed", "snapshot")
+
+
+def load_manifest(path) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def modified_unique_ids(manifest: dict, previous: dict) -> set[str]:
+    """dbt's state:modified+ computed from two manifests.
+
+    A model, seed or snapshot is modified when it is new, its SQL checksum or
+    config changed, or a macro it calls changed. Every built node downstream of
+    a modified one is included too.
+    """
+    previous_macros = previous.get("macros", {})
+    changed_macros = {
+        unique_id for unique_id, macro in manifest.get("macros", {}).items()
+        if previous_macros.get(unique_id, {}).get("macro_sql") != macro.get("macro_sql")
+    }
+
+    modified = set()
+    for unique_id, node in manifest["nodes"].items():
+        if node["resource_type"] not in BUILT_RESOURCE_TYPES:
+            continue
+        old = previous["nodes"].get(unique_id)
+        if (
+            old is None
+            or old["checksum"] != node["checksum"]
+            or old["config"] != node["config"]
+            or changed_macros.intersection(node.get("depends_on", {}).get("macros", []))
+        ):
+            modified.add(unique_id)
+
+    selected, stack = set(), list(modified)
+    while stack:
+        unique_id = stack.pop()
+        if unique_id in selected:
+            continue
+        selected.add(unique_id)
+        stack.extend(
+            child for child in manifest["child_map"].get(unique_id, [])
+            if manifest["nodes"].get(child, {}).get("resource_type") in BUILT_RESOURCE_TYPES
+        )
+    return selected
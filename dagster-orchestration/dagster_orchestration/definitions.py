@@ -1,16 +1,27 @@
 from dagster import (
+    AssetKey,
     AssetSelection,
+    DagsterRunStatus,
     Definitions,
+    RunRequest,
+    RunsFilter,
     ScheduleDefinition,
+    SkipReason,
     define_asset_job,
     load_assets_from_modules,
+    multi_asset_sensor,
+    run_status_sensor,
+    sensor,
 )
+import hashlib
+from dagster_dbt import DbtCliResource
 from dagster_duckdb_pandas import DuckDBPandasIOManager
 
 
 from .assets import dbtpipeline
 from .assets import meltano_pipeline  # <-- import the Meltano asset
 from .assets import ingestion_pipeline
+from .assets import staging_pipeline
 
 
 
@@ -22,27 +33,93 @@ from .assets import ingestion_pipeline
 dbt_assets = load_assets_from_modules([dbtpipeline])
 meltano_assets = load_assets_from_modules([meltano_pipeline])
 ingestion_assets = load_assets_from_modules([ingestion_pipeline])
+staging_assets = load_assets_from_modules([staging_pipeline])
 
 from dagster import define_asset_job
 
 # Define jobs
+# Downloads the raw files; raw_ingestion_sensor then loads each entity in its own run
 etl_job = define_asset_job(
     name="etl_job",
-    selection=[
-        "ingestion",
-        "meltano_run_elt",          # Meltano first
-        "pipeline_dbt_deps",
-        "pipeline_dbt_seed",        # then dbt seed
-        "pipeline_dbt_run",         # dbt run
-        "pipeline_dbt_test",        # dbt test
-    ]
+    selection=["ingestion"]
+)
+
+# One run per raw entity: CSV -> Parquet with DuckDB, then a bulk load
+# (replaces Meltano row streaming). Concurrency is capped by the raw_ingestion pool.
+raw_ingestion_job = define_asset_job(
+    name="raw_ingestion",
+    selection=["raw_parquet_staging", "raw_bulk_load"],
+    partitions_def=staging_pipeline.RAW_PARTITIONS,
 )
 
+# Every dbt seed, model and test, one asset (or asset check) each
+dbt_selection = AssetSelection.assets(dbtpipeline.olist_dbt_models)
+
 dbt_only_job = define_asset_job(
     name="dbt_pipeline",
-    selection=["pipeline_dbt_deps","pipeline_dbt_seed", "pipeline_dbt_run", "pipeline_dbt_test"]
+    selection=dbt_selection
+)
+
+# Rebuilds only models changed since the last complete build, plus their
+# descendants; dbt_modified_sensor picks that subset for each run
+dbt_modified_job = define_asset_job(
+    name="dbt_modified",
+    selection=dbt_selection,
+)
+
+# Rebuilds every incremental model from scratch; launched on demand only
+dbt_full_refresh_job = define_asset_job(
+    name="dbt_full_refresh",
+    selection=dbt_selection,
+    config={"ops": {"olist_dbt_models": {"config": {"full_refresh": True}}}},
 )
 
+
+@run_status_sensor(run_status=DagsterRunStatus.SUCCESS, monitored_jobs=[etl_job], request_job=raw_ingestion_job)
+def raw_ingestion_sensor(context):
+    """Fans a finished download out to one raw_ingestion run per entity."""
+    return [
+        RunRequest(run_key=f"{context.dagster_run.run_id}:{entity}", partition_key=entity)
+        for entity in staging_pipeline.RAW_PARTITIONS.get_partition_keys()
+    ]
+
+
+RAW_INGESTION_PENDING = [
+    DagsterRunStatus.QUEUED, DagsterRunStatus.NOT_STARTED, DagsterRunStatus.STARTING, DagsterRunStatus.STARTED,
+]
+
+
+@multi_asset_sensor(monitored_assets=[AssetKey("raw_bulk_load")], job=dbt_only_job)
+def dbt_after_raw_ingestion_sensor(context):
+    """Runs dbt once the raw_ingestion runs are done, if any of them loaded new data.
+
+    Entities whose CSV did not change are skipped, so not every partition reloads.
+    """
+    if not context.latest_materialization_records_by_partition(AssetKey("raw_bulk_load")):
+        return SkipReason("No raw entity loaded since the last dbt run")
+    in_flight = context.instance.get_run_records(
+        RunsFilter(job_name=raw_ingestion_job.name, statuses=RAW_INGESTION_PENDING), limit=1
+    )
+    if in_flight:
+        return SkipReason("Waiting for raw_ingestion runs to finish")
+    context.advance_all_cursors()
+    return RunRequest()
+
+
+@sensor(job=dbt_modified_job, minimum_interval_seconds=300)
+def dbt_modified_sensor(context):
+    """Requests a dbt_modified run for the models changed since the last complete build."""
+    modified = dbtpipeline.modified_asset_keys()
+    if modified is None:
+        return SkipReason("No complete dbt build yet to compare against")
+    if not modified:
+        return SkipReason("No dbt models changed since the last complete build")
+    # One run per parsed project version
+    with open(dbtpipeline.dbt_project.manifest_path, "rb") as f:
+        run_key = hashlib.sha256(f.read()).hexdigest()
+    return RunRequest(run_key=run_key, asset_selection=sorted(modified, key=lambda key: key.to_user_string()))
+
+
 # Schedule dbt_only_job to run every day at midnight
 dbt_schedule = ScheduleDefinition(
     job=dbt_only_job,
@@ -54,11 +131,14 @@ database_io_manager = DuckDBPandasIOManager(database="analytics.pandas_releases"
 
 # Definitions
 defs = Definitions(
-    assets=[*dbt_assets, *meltano_assets, *ingestion_assets],
-    jobs=[etl_job, dbt_only_job],  # <-- include the jobs here
+    assets=[*dbt_assets, *meltano_assets, *ingestion_assets, *staging_assets],
+    jobs=[etl_job, raw_ingestion_job, dbt_only_job, dbt_modified_job, dbt_full_refresh_job],  # <-- include the jobs here
     schedules=[dbt_schedule],
+    sensors=[raw_ingestion_sensor, dbt_after_raw_ingestion_sensor, dbt_modified_sensor],
     resources={
         "io_manager": database_io_manager,
+        "parquet_loader": staging_pipeline.build_parquet_loader(),
+        "dbt": DbtCliResource(project_dir=dbtpipeline.dbt_project),
     },
 )
 
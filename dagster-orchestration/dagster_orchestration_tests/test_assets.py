@@ -1 +1,273 @@
+import multiprocessing
+import os
 
+import duckdb
+import pytest
+from dagster import AssetKey, DagsterInstance, SpecificPartitionsPartitionMapping, materialize
+from dagster_dbt import DagsterDbtTranslator
+
+from dagster_orchestration.assets.staging_pipeline import (
+    RAW_FILES,
+    RAW_PARTITIONS,
+    RAW_SCHEMAS,
+    DuckDBParquetLoader,
+    raw_bulk_load,
+    raw_parquet_staging,
+    raw_tables,
+    stage_csv_to_parquet,
+)
+from dagster_orchestration.dbt_state import modified_unique_ids
+
+# A few rows per raw file, in the Kaggle column layout
+RAW_CSVS = {
+    "customer": (
+        "customer_id,customer_unique_id,customer_zip_code_prefix,customer_city,customer_state\n"
+        "c1,u1,01037,sao paulo,SP\n"
+        "c2,u2,22290,rio de janeiro,RJ\n"
+    ),
+    "geolocation": (
+        "geolocation_zip_code_prefix,geolocation_lat,geolocation_lng,geolocation_city,geolocation_state\n"
+        "01037,-23.54,-46.63,sao paulo,SP\n"
+    ),
+    "order_item": (
+        "order_id,order_item_id,product_id,seller_id,shipping_limit_date,price,freight_value\n"
+        "o1,1,p1,s1,2017-09-19 09:45:35,58.90,13.29\n"
+    ),
+    "order_payment": (
+        "order_id,payment_sequential,payment_type,payment_installments,payment_value\n"
+        "o1,1,credit_card,2,72.19\n"
+    ),
+    "order_review": (
+        "review_id,order_id,review_score,review_comment_title,review_comment_message,review_creation_date,review_answer_timestamp\n"
+        'r1,o1,4,,"bom, chegou\nno prazo",2017-09-28 00:00:00,2017-09-29 10:00:00\n'
+    ),
+    "order": (
+        "order_id,customer_id,order_status,order_purchase_timestamp,order_approved_at,order_delivered_carrier_date,"
+        "order_delivered_customer_date,order_estimated_delivery_date\n"
+        "o1,c1,delivered,2017-09-13 08:59:02,2017-09-13 09:45:35,2017-09-19 18:34:16,2017-09-20 23:43:48,2017-09-29 00:00:00\n"
+        "o2,c2,shipped,2017-10-01 10:00:00,2017-10-01 11:00:00,2017-10-02 12:00:00,,2017-10-20 00:00:00\n"
+    ),
+    "product": (
+        "product_id,product_category_name,product_name_lenght,product_description_lenght,product_photos_qty,"
+        "product_weight_g,product_length_cm,product_height_cm,product_width_cm\n"
+        "p1,cool_stuff,58,598,4,650,28,9,14\n"
+    ),
+    "seller": (
+        "seller_id,seller_zip_code_prefix,seller_city,seller_state\n"
+        "s1,04195,sao paulo,SP\n"
+    ),
+    "product_category_name_translation": (
+        "product_category_name,product_category_name_english\n"
+        "cool_stuff,cool_stuff\n"
+    ),
+}
+
+
+@pytest.fixture
+def raw_dir(tmp_path):
+    directory = tmp_path / "raw"
+    directory.mkdir()
+    for table, file_name in RAW_FILES.items():
+        (directory / file_name).write_text(RAW_CSVS[table])
+    return directory
+
+
+def test_stage_csv_to_parquet_types_columns(raw_dir, tmp_path):
+    parquet_path = str(tmp_path / "customer.parquet")
+    rows = stage_csv_to_parquet(str(raw_dir / RAW_FILES["customer"]), parquet_path, RAW_SCHEMAS["customer"])
+    assert rows == 2
+    zips = duckdb.sql(f"SELECT customer_zip_code_prefix FROM read_parquet('{parquet_path}') ORDER BY 1").fetchall()
+    assert zips == [("01037",), ("22290",)]
+
+    parquet_path = str(tmp_path / "order.parquet")
+    stage_csv_to_parquet(str(raw_dir / RAW_FILES["order"]), parquet_path, RAW_SCHEMAS["order"])
+    types = dict(row[:2] for row in duckdb.sql(f"DESCRIBE SELECT * FROM read_parquet('{parquet_path}')").fetchall())
+    assert types["order_purchase_timestamp"] == "TIMESTAMP"
+    # Empty CSV fields arrive as NULL rather than ''
+    assert duckdb.sql(
+        f"SELECT count(*) FROM read_parquet('{parquet_path}') WHERE order_delivered_customer_date IS NULL"
+    ).fetchone()[0] == 1
+
+
+def test_stage_csv_to_parquet_normalizes_to_declared_schema(tmp_path):
+    csv_path = tmp_path / "translation.csv"
+    # BOM-prefixed, padded header and values, as in the Kaggle translation file
+    csv_path.write_bytes(
+        "\ufeffproduct_category_name , product_category_name_english\n  beleza_saude , health_beauty \n".encode()
+    )
+    parquet_path = str(tmp_path / "translation.parquet")
+    stage_csv_to_parquet(str(csv_path), parquet_path, RAW_SCHEMAS["product_category_name_translation"])
+    assert duckdb.sql(
+        f"SELECT product_category_name, product_category_name_english FROM read_parquet('{parquet_path}')"
+    ).fetchall() == [("beleza_saude", "health_beauty")]
+
+    parquet_path = str(tmp_path / "order_item.parquet")
+    csv_path = tmp_path / "order_item.csv"
+    csv_path.write_text(RAW_CSVS["order_item"] + "o2,1,p1,s1,not a date,,13.29\n")
+    stage_csv_to_parquet(str(csv_path), parquet_path, RAW_SCHEMAS["order_item"])
+    rows = duckdb.sql(
+        f"SELECT order_item_id, shipping_limit_date, price::VARCHAR FROM read_parquet('{parquet_path}') ORDER BY order_id"
+    ).fetchall()
+    assert rows[0][0] == 1 and rows[0][2] == "58.90"
+    assert rows[1][1:] == (None, None)
+
+    with pytest.raises(ValueError, match="expected"):
+        stage_csv_to_parquet(str(csv_path), parquet_path, RAW_SCHEMAS["order"])
+
+
+def test_raw_partitions_bulk_load_into_duckdb(raw_dir, tmp_path):
+    database = str(tmp_path / "olist.duckdb")
+    config = {"raw_dir": str(raw_dir), "staging_dir": str(tmp_path / "parquet")}
+    run_config = {"ops": {"raw_parquet_staging": {"config": config}, "raw_bulk_load": {"config": config}}}
+    resources = {"parquet_loader": DuckDBParquetLoader(database=database)}
+
+    # A single partition only touches its own entity
+    result = materialize([raw_parquet_staging, raw_bulk_load], partition_key="seller",
+                         resources=resources, run_config=run_config)
+    assert result.success
+    assert {name.split(".")[0] for name in os.listdir(tmp_path / "parquet")} == {"seller"}
+
+    for entity in RAW_PARTITIONS.get_partition_keys():
+        result = materialize([raw_parquet_staging, raw_bulk_load], partition_key=entity,
+                             resources=resources, run_config=run_config)
+        assert result.success
+
+    with duckdb.connect(database, read_only=True) as conn:
+        tables = {row[0] for row in conn.execute(
+            "SELECT table_name FROM information_schema.tables WHERE table_schema = 'm2_ingestion'"
+        ).fetchall()}
+        assert tables == set(RAW_FILES)
+        assert conn.execute('SELECT count(*) FROM m2_ingestion."order"').fetchone()[0] == 2
+        assert conn.execute("SELECT review_comment_message FROM m2_ingestion.order_review").fetchone()[0] == "bom, chegou\nno prazo"
+        assert conn.execute("SELECT seller_zip_code_prefix FROM m2_ingestion.seller").fetchone()[0] == "04195"
+
+
+def test_unchanged_csv_skips_staging_and_load(raw_dir, tmp_path):
+    config = {"raw_dir": str(raw_dir), "staging_dir": str(tmp_path / "parquet")}
+    run_config = {"ops": {"raw_parquet_staging": {"config": config}, "raw_bulk_load": {"config": config}}}
+    resources = {"parquet_loader": DuckDBParquetLoader(database=str(tmp_path / "olist.duckdb"))}
+    instance = DagsterInstance.ephemeral()
+
+    def loaded():
+        result = materialize([raw_parquet_staging, raw_bulk_load], partition_key="seller", instance=instance,
+                             resources=resources, run_config=run_config)
+        assert result.success
+        return [m.asset_key for m in result.get_asset_materialization_events()]
+
+    assert AssetKey("raw_bulk_load") in loaded()
+    assert loaded() == []
+
+    (raw_dir / RAW_FILES["seller"]).write_text(RAW_CSVS["seller"] + "s2,13023,campinas,SP\n")
+    assert AssetKey("raw_bulk_load") in loaded()
+
+
+def test_failed_load_is_staged_again_on_the_next_run(raw_dir, tmp_path):
+    database = str(tmp_path / "olist.duckdb")
+    config = {"raw_dir": str(raw_dir), "staging_dir": str(tmp_path / "parquet")}
+    resources = {"parquet_loader": DuckDBParquetLoader(database=database)}
+    instance = DagsterInstance.ephemeral()
+
+    def materialized(assets):
+        result = materialize(assets, partition_key="seller", instance=instance, resources=resources,
+                             run_config={"ops": {a.op.name: {"config": config} for a in assets}})
+        assert result.success
+        return [m.asset_key for m in result.get_asset_materialization_events()]
+
+    # What a failed load leaves behind: the file is staged but never loaded. A
+    # real failure would first sit through the retry policy's delays.
+    assert materialized([raw_parquet_staging]) == [AssetKey("raw_parquet_staging")]
+    assert not os.path.exists(database)
+
+    assert AssetKey("raw_bulk_load") in materialized([raw_parquet_staging, raw_bulk_load])
+    with duckdb.connect(database, read_only=True) as conn:
+        assert conn.execute("SELECT count(*) FROM m2_ingestion.seller").fetchone()[0] == 1
+    # Once loaded, the unchanged file is skipped
+    assert materialized([raw_parquet_staging, raw_bulk_load]) == []
+
+
+def test_changed_rows_are_merged_as_a_delta(raw_dir, tmp_path):
+    database = str(tmp_path / "olist.duckdb")
+    config = {"raw_dir": str(raw_dir), "staging_dir": str(tmp_path / "parquet")}
+    run_config = {"ops": {"raw_parquet_staging": {"config": config}, "raw_bulk_load": {"config": config}}}
+    resources = {"parquet_loader": DuckDBParquetLoader(database=database)}
+    instance = DagsterInstance.ephemeral()
+
+    def load_orders():
+        result = materialize([raw_parquet_staging, raw_bulk_load], partition_key="order", instance=instance,
+                             resources=resources, run_config=run_config)
+        assert result.success
+        return result.asset_materializations_for_node("raw_parquet_staging")[0].metadata
+
+    header, o1, o2 = RAW_CSVS["order"].splitlines()
+    o4 = "o4,c1,canceled,2017-10-03 10:00:00,,,,2017-10-23 00:00:00"
+    (raw_dir / RAW_FILES["order"]).write_text("\n".join([header, o1, o2, o4]) + "\n")
+    assert "inserts" not in load_orders()
+
+    # o1 unchanged, o2 delivered, o4 dropped, o3 new
+    (raw_dir / RAW_FILES["order"]).write_text("\n".join([
+        header,
+        o1,
+        o2.replace(",,2017-10-20", ",2017-10-09 10:00:00,2017-10-20").replace("shipped", "delivered"),
+        "o3,c2,processing,2017-10-05 10:00:00,,,,2017-10-25 00:00:00",
+    ]) + "\n")
+    metadata = load_orders()
+    assert (metadata["inserts"].value, metadata["updates"].value, metadata["deletes"].value) == (1, 1, 1)
+
+    with duckdb.connect(database, read_only=True) as conn:
+        rows = conn.execute(
+            'SELECT order_id, order_status, _loaded_at FROM m2_ingestion."order" ORDER BY 1'
+        ).fetchall()
+    assert [row[:2] for row in rows] == [("o1", "delivered"), ("o2", "delivered"), ("o3", "processing")]
+    # The untouched row keeps the stamp of the load that delivered it
+    assert rows[0][2] < rows[1][2] == rows[2][2]
+
+
+def load_table(database: str, table: str, parquet_path: str) -> int:
+    return DuckDBParquetLoader(database=database).load(table, parquet_path)
+
+
+def test_duckdb_loads_from_concurrent_processes_take_turns(tmp_path):
+    database = str(tmp_path / "olist.duckdb")
+    parquet_path = str(tmp_path / "rows.parquet")
+    duckdb.sql(f"COPY (SELECT range AS id FROM range(100000)) TO '{parquet_path}'")
+
+    # As partitions running in parallel do: each process opens the file for writing
+    with multiprocessing.get_context("spawn").Pool(4) as pool:
+        rows = pool.starmap(load_table, [(database, f"t{i}", parquet_path) for i in range(8)])
+    assert rows == [100000] * 8
+
+
+def test_raw_tables_feed_dbt_sources_one_partition_each():
+    translator = DagsterDbtTranslator()
+    for table, raw_table in zip(RAW_FILES, raw_tables):
+        source = {"resource_type": "source", "source_name": "raw", "name": table, "config": {}, "meta": {}}
+        assert raw_table.key == translator.get_asset_key(source)
+        mapping = raw_table.get_partition_mapping(AssetKey("raw_bulk_load"))
+        assert isinstance(mapping, SpecificPartitionsPartitionMapping)
+        assert list(mapping.partition_keys) == [table]
+
+
+def _manifest(sql_by_model, edges):
+    """A minimal dbt manifest: models with checksums, plus a test on each model."""
+    nodes, child_map = {}, {}
+    for name, sql in sql_by_model.items():
+        nodes[f"model.olist.{name}"] = {
+            "resource_type": "model", "checksum": {"name": "sha256", "checksum": sql},
+            "config": {"materialized": "table"}, "depends_on": {"macros": []},
+        }
+        nodes[f"test.olist.not_null_{name}"] = {
+            "resource_type": "test", "checksum": {"name": "none", "checksum": ""}, "config": {},
+        }
+        child_map[f"model.olist.{name}"] = [f"test.olist.not_null_{name}"]
+    for parent, child in edges:
+        child_map[f"model.olist.{parent}"].append(f"model.olist.{child}")
+    return {"nodes": nodes, "child_map": child_map, "macros": {}}
+
+
+def test_one_model_change_selects_it_and_its_descendants():
+    edges = [("stg", "dim"), ("dim", "fact")]
+    previous = _manifest({"stg": "1", "dim": "1", "fact": "1", "other": "1"}, edges)
+    assert modified_unique_ids(previous, previous) == set()
+
+    current = _manifest({"stg": "1", "dim": "2", "fact": "1", "other": "1"}, edges)
+    assert modified_unique_ids(current, previous) == {"model.olist.dim", "model.olist.fact"}
@@ -0,0 +1,60 @@
+import importlib.util
+import os
+import shutil
+
+import pytest
+
+SCRIPT_PATH = os.path.join(os.path.dirname(__file__), "../../scripts/check_mart_layout.py")
+spec = importlib.util.spec_from_file_location("check_mart_layout", SCRIPT_PATH)
+layout = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(layout)
+
+FACT_SQL = """
+-- year, customer_state as customer_state, seller_state,
+with orders as (
+    select order_id, extract(year from purchased_at) as year from raw.orders
+)
+select
+    md5(order_id) as order_item_key,
+    o.order_id,
+    date(o.purchased_at) as order_date,
+    c.customer_state,
+    s.seller_state,
+    current_timestamp as loaded_at
+from orders o
+"""
+
+
+def node(compiled_code="select 1 as x", **config):
+    return {"config": config, "compiled_code": compiled_code}
+
+
+def test_selected_columns_are_the_outer_select_list():
+    assert layout.selected_columns(FACT_SQL) == [
+        "order_item_key", "order_id", "order_date", "customer_state", "seller_state", "current_timestamp",
+    ]
+
+
+def test_check_layout_reports_every_difference():
+    nodes = {
+        "fact_order_items": node(
+            FACT_SQL,
+            partition_by={"field": "order_date", "data_type": "timestamp"},
+            cluster_by=["customer_state", "seller_state", "product_id"],
+        ),
+        "fact_order_cube": node(cluster_by="customer_state"),
+    }
+    assert layout.check_layout(nodes) == [
+        "fact_order_items: partition_by.data_type is 'timestamp', expected 'date'",
+        # Mentioned in a comment and a CTE only
+        "fact_order_items: filter column year is not selected",
+        "fact_order_cube: cluster_by is ['customer_state'], expected ['customer_state', 'seller_state', 'year']",
+        "customer_rfm: model not found",
+    ]
+
+
+@pytest.mark.skipif(shutil.which("dbt") is None, reason="dbt is not installed")
+def test_project_marts_keep_their_layout(tmp_path):
+    if not os.path.isdir(os.path.join(layout.project_dir, "dbt_packages")):
+        pytest.skip("dbt packages are not installed; run dbt deps in dbt_olist")
+    assert layout.check_layout(layout.compile_marts(str(tmp_path))) == []
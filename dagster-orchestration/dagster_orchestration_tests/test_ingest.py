@@ -0,0 +1,133 @@
+import importlib.util
+import io
+import json
+import os
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+SCRIPT_PATH = os.path.join(os.path.dirname(__file__), "../../scripts/ingest.py")
+spec = importlib.util.spec_from_file_location("ingest", SCRIPT_PATH)
+ingest = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(ingest)
+
+
+def make_zip(files: dict) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+class DatasetServer(ThreadingHTTPServer):
+    """Serves one zip with an ETag, honouring If-None-Match and Range/If-Range."""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), DatasetHandler)
+        self.requests = []
+        self.publish({"a.csv": "id\n1\n", "b.csv": "id\n2\n"})
+
+    def publish(self, files: dict) -> None:
+        self.body = make_zip(files)
+        self.etag = f'"v{len(self.requests)}-{len(self.body)}"'
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/dataset.zip"
+
+
+class DatasetHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        if self.headers.get("If-None-Match") == server.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body, status = server.body, 200
+        if self.headers.get("Range") and self.headers.get("If-Range") == server.etag:
+            start = int(self.headers["Range"].removeprefix("bytes=").rstrip("-"))
+            if start >= len(body):
+                self.send_response(416)
+                self.send_header("ETag", server.etag)
+                self.send_header("Content-Range", f"bytes */{len(body)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body, status = body[start:], 206
+        self.send_response(status)
+        self.send_header("ETag", server.etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = DatasetServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+
+
+def test_ingest_skips_unchanged_dataset_and_files(server, tmp_path):
+    dest = str(tmp_path)
+    assert sorted(ingest.main(["--url", server.url, "--dest", dest])) == ["a.csv", "b.csv"]
+    manifest = json.loads((tmp_path / ingest.MANIFEST_NAME).read_text())
+    assert set(manifest) == {"a.csv", "b.csv"}
+
+    # Same ETag: 304, nothing extracted
+    assert ingest.main(["--url", server.url, "--dest", dest]) == []
+    assert server.requests[-1]["If-None-Match"] == server.etag
+
+    # A new archive in which only b.csv changed
+    server.publish({"a.csv": "id\n1\n", "b.csv": "id\n2\n3\n"})
+    assert ingest.main(["--url", server.url, "--dest", dest]) == ["b.csv"]
+    assert (tmp_path / "b.csv").read_text() == "id\n2\n3\n"
+    assert json.loads((tmp_path / ingest.MANIFEST_NAME).read_text())["a.csv"] == manifest["a.csv"]
+
+
+def test_download_resumes_partial_file(server, tmp_path):
+    zip_path = str(tmp_path / ingest.ZIP_NAME)
+    (tmp_path / f"{ingest.ZIP_NAME}.part").write_bytes(server.body[:10])
+    (tmp_path / f"{ingest.ZIP_NAME}.http.json").write_text(json.dumps({"partial": server.etag}))
+
+    assert ingest.download(server.url, zip_path)
+    assert server.requests[-1]["Range"] == "bytes=10-"
+    assert open(zip_path, "rb").read() == server.body
+
+
+def test_download_keeps_a_complete_partial_file(server, tmp_path):
+    zip_path = str(tmp_path / ingest.ZIP_NAME)
+    (tmp_path / f"{ingest.ZIP_NAME}.part").write_bytes(server.body)
+    (tmp_path / f"{ingest.ZIP_NAME}.http.json").write_text(json.dumps({"partial": server.etag}))
+
+    # 416: nothing left to send, so the .part is the finished download
+    assert ingest.download(server.url, zip_path)
+    assert len(server.requests) == 1 and server.requests[0]["Range"] == f"bytes={len(server.body)}-"
+    assert open(zip_path, "rb").read() == server.body
+    assert not os.path.exists(zip_path + ".part")
+    assert ingest.extract(zip_path, str(tmp_path), str(tmp_path / ingest.MANIFEST_NAME)) == ["a.csv", "b.csv"]
+    assert not ingest.download(server.url, zip_path)
+
+
+@pytest.mark.parametrize("part", [
+    pytest.param(lambda body: body + b"extra", id="longer than the file"),
+    # A flipped byte in the data of a.csv, which follows its 35-byte local header
+    pytest.param(lambda body: body[:36] + bytes([body[36] ^ 0xFF]) + body[37:], id="same size, corrupt"),
+])
+def test_download_restarts_when_partial_file_is_not_the_file(server, tmp_path, part):
+    zip_path = str(tmp_path / ingest.ZIP_NAME)
+    (tmp_path / f"{ingest.ZIP_NAME}.part").write_bytes(part(server.body))
+    (tmp_path / f"{ingest.ZIP_NAME}.http.json").write_text(json.dumps({"partial": server.etag}))
+
+    assert ingest.download(server.url, zip_path)
+    assert "Range" in server.requests[0] and "Range" not in server.requests[1]
+    assert open(zip_path, "rb").read() == server.body
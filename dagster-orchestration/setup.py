@@ -5,7 +5,10 @@ setup(
     packages=find_packages(exclude=["dagster_orchestration_tests"]),
     install_requires=[
         "dagster",
-        "dagster-cloud"
+        "dagster-cloud",
+        "dagster-dbt",
+        "duckdb",
+        "filelock",
     ],
-    extras_require={"dev": ["dagster-webserver", "pytest"]},
+    extras_require={"dev": ["dagster-webserver", "pytest", "sqlparse"]},
 )
@@ -0,0 +1,34 @@
+{#
+    Cross-database helpers so the models build on both BigQuery (default) and
+    DuckDB (the `local` target). dbt's own cross-db macros (dbt.datediff,
+    dbt.type_*) are used where they exist; these cover the rest.
+#}
+
+{# format_date(format, date) with strftime-style format codes #}
+{% macro format_date_as(format, expr) %}
+    {{ return(adapter.dispatch('format_date_as')(format, expr)) }}
+{% endmacro %}
+
+{% macro default__format_date_as(format, expr) %}format_date('{{ format }}', {{ expr }}){% endmacro %}
+
+{% macro duckdb__format_date_as(format, expr) %}strftime({{ expr }}, '{{ format }}'){% endmacro %}
+
+
+{# timestamp minus a number of days, keeping the timestamp type #}
+{% macro timestamp_sub_days(expr, days) %}
+    {{ return(adapter.dispatch('timestamp_sub_days')(expr, days)) }}
+{% endmacro %}
+
+{% macro default__timestamp_sub_days(expr, days) %}timestamp_sub({{ expr }}, interval {{ days }} day){% endmacro %}
+
+{% macro duckdb__timestamp_sub_days(expr, days) %}({{ expr }} - interval ({{ days }}) day){% endmacro %}
+
+
+{# value from the row with the greatest order_by within a group #}
+{% macro latest_value(value, order_by) %}
+    {{ return(adapter.dispatch('latest_value')(value, order_by)) }}
+{% endmacro %}
+
+{% macro default__latest_value(value, order_by) %}array_agg({{ value }} order by {{ order_by }} desc limit 1)[offset(0)]{% endmacro %}
+
+{% macro duckdb__latest_value(value, order_by) %}arg_max({{ value }}, {{ order_by }}){% endmacro %}
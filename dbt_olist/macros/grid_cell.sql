@@ -0,0 +1,12 @@
+{#
+    Id of the square grid cell containing a lat/lon point, as '<row>:<col>'
+    with row = floor(lat / cell_deg) and col = floor(lon / cell_deg). The
+    streamlit app bins map points on the same grid (olist_report.grid_cell_degrees).
+#}
+{% macro grid_cell(lat, lon, cell_deg) %}
+    {{ dbt.concat([
+        "cast(cast(floor(" ~ lat ~ " / " ~ cell_deg ~ ") as " ~ dbt.type_int() ~ ") as " ~ dbt.type_string() ~ ")",
+        "':'",
+        "cast(cast(floor(" ~ lon ~ " / " ~ cell_deg ~ ") as " ~ dbt.type_int() ~ ") as " ~ dbt.type_string() ~ ")"
+    ]) }}
+{% endmacro %}
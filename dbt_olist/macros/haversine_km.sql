@@ -0,0 +1,11 @@
+{#
+    Great-circle distance in km between two lat/lon points (degrees).
+    Written with plain trig functions so it compiles on any warehouse.
+#}
+{% macro haversine_km(lat1, lon1, lat2, lon2) %}
+    2 * 6371 * asin(sqrt(
+        pow(sin(({{ lat2 }} - {{ lat1 }}) * acos(-1) / 360), 2)
+        + cos({{ lat1 }} * acos(-1) / 180) * cos({{ lat2 }} * acos(-1) / 180)
+        * pow(sin(({{ lon2 }} - {{ lon1 }}) * acos(-1) / 360), 2)
+    ))
+{% endmacro %}
@@ -0,0 +1,25 @@
+{#
+    Incremental staging. Every raw row carries _loaded_at, the time its current
+    version was staged by Dagster; rows a load leaves unchanged keep their stamp.
+    A staging model keeps that stamp as record_loaded_at, so each run only has
+    to read the raw rows loaded since its own latest one.
+#}
+
+{# Predicate on the source: rows loaded since this model last ran #}
+{% macro loaded_since_last_run() %}
+    {%- if is_incremental() -%}
+        _loaded_at > (select coalesce(max(record_loaded_at), timestamp '1900-01-01') from {{ this }})
+    {%- else -%}
+        true
+    {%- endif -%}
+{% endmacro %}
+
+
+{# Post-hook: drops rows whose key has been deleted from the source #}
+{% macro delete_removed_rows(source_relation, keys) %}
+    delete from {{ this }} as t
+    where not exists (
+        select 1 from {{ source_relation }} as s
+        where {% for key in keys %}s.{{ key }} = t.{{ key }}{% if not loop.last %} and {% endif %}{% endfor %}
+    )
+{% endmacro %}
@@ -0,0 +1,50 @@
+{{ config(
+    materialized='incremental',
+    unique_key='customer_unique_id',
+    incremental_strategy=('merge' if target.type == 'bigquery' else 'delete+insert')
+) }}
+
+-- Lifetime order totals per customer, the raw inputs of customer_rfm.
+-- Incremental runs only recompute customers that have fact rows loaded since
+-- the last run, aggregating their full history so the merge replaces the row.
+with customer_items as (
+    select
+        c.customer_unique_id,
+        c.customer_state,
+        f.order_id,
+        f.price,
+        d.full_date,
+        f.loaded_at
+    from {{ ref('fact_order_items') }} f
+    inner join {{ ref('dim_customers') }} c
+        on f.customer_id = c.customer_id
+    inner join {{ ref('dim_dates') }} d
+        on f.order_date_key = d.date_key
+)
+
+{% if is_incremental() %}
+, changed_customers as (
+    select distinct customer_unique_id
+    from customer_items
+    where loaded_at > (
+        select coalesce(max(record_loaded_at), timestamp '1900-01-01')
+        from {{ this }}
+    )
+)
+{% endif %}
+
+select
+    ci.customer_unique_id,
+    -- State of the most recent order, for customers who ordered from several states
+    {{ latest_value('ci.customer_state', 'ci.full_date') }} as customer_state,
+    min(ci.full_date) as first_order_date,
+    max(ci.full_date) as last_order_date,
+    count(distinct ci.order_id) as frequency,
+    sum(ci.price) as monetary,
+    current_timestamp as record_loaded_at
+from customer_items ci
+{% if is_incremental() %}
+inner join changed_customers cc
+    on ci.customer_unique_id = cc.customer_unique_id
+{% endif %}
+group by ci.customer_unique_id
@@ -0,0 +1,49 @@
+{{ config(
+    materialized='table',
+    cluster_by=['customer_state', 'segment']
+) }}
+
+-- Recency / Frequency / Monetary scores and segments per customer.
+-- Recency is measured against the latest order date in the data rather than
+-- current_date, so the values only change when new orders land.
+-- R and M are quintiles (5 = best); F uses fixed order-count buckets because
+-- most customers have a single order and quintiles would split ties arbitrarily.
+with summary as (
+    select
+        *,
+        {{ dbt.datediff('last_order_date', 'max(last_order_date) over ()', 'day') }} as recency_days
+    from {{ ref('customer_order_summary') }}
+),
+
+scored as (
+    select
+        *,
+        ntile(5) over (order by recency_days desc, customer_unique_id) as r_score,
+        least(frequency, 5) as f_score,
+        ntile(5) over (order by monetary, customer_unique_id) as m_score
+    from summary
+)
+
+select
+    customer_unique_id,
+    customer_state,
+    first_order_date,
+    last_order_date,
+    recency_days,
+    frequency,
+    monetary,
+    r_score,
+    f_score,
+    m_score,
+    concat(cast(r_score as string), cast(f_score as string), cast(m_score as string)) as rfm_score,
+    case
+        when r_score >= 4 and f_score >= 2 and m_score >= 4 then 'Champions'
+        when r_score >= 3 and f_score >= 2 then 'Loyal Customers'
+        when r_score <= 2 and (f_score >= 2 or m_score >= 4) then 'At Risk'
+        when r_score >= 4 and f_score = 1 then 'New Customers'
+        when m_score = 5 then 'Big Spenders'
+        when r_score <= 2 then 'Hibernating'
+        else 'Needs Attention'
+    end as segment,
+    current_timestamp as record_loaded_at
+from scored
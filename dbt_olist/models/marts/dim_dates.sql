@@ -12,10 +12,10 @@ with dates as (
       )
 )
 select
-    cast(format_date('%Y%m%d', full_date) as int64) as date_key,
+    cast({{ format_date_as('%Y%m%d', 'full_date') }} as int64) as date_key,
     full_date,
-    format_date('%A', full_date) as day_of_week,
-    format_date('%B', full_date) as month_name,
+    {{ format_date_as('%A', 'full_date') }} as day_of_week,
+    {{ format_date_as('%B', 'full_date') }} as month_name,
     extract(year from full_date) as year,
     extract(quarter from full_date) as quarter,
     current_timestamp as record_loaded_at
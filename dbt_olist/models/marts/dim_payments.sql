@@ -17,7 +17,7 @@ select distinct
         when payment_type = 'voucher' then 'Prepaid Credit'
         when payment_type = 'not_defined' then 'Unknown'
     end as payment_category,
-    current_timestamp() as loaded_at
+    current_timestamp as loaded_at
 from {{ ref('stg_order_payments') }}
 where payment_type is not null
 
@@ -29,7 +29,7 @@ UNION ALL
         'not_defined' as payment_type,
         'Not Defined' as payment_description,
         'Unknown' as payment_category,
-        current_timestamp() as loaded_at
+        current_timestamp as loaded_at
 )
 
 select * from payment_types
\ No newline at end of file
@@ -0,0 +1,36 @@
+{{ config(
+    materialized='table',
+    cluster_by=['customer_state', 'seller_state', 'year']
+) }}
+
+-- Pre-aggregated rollup of fact_order_items for the dashboard.
+-- Every measure is additive (sums and counts), so any grouping over a subset of
+-- these dimensions can be answered by re-summing the cube instead of the fact.
+select
+    c.customer_state,
+    s.seller_state,
+    d.year,
+    {{ format_date_as('%Y-%m', 'd.full_date') }} as month,
+    coalesce(p.product_category_name_english, 'untranslated') as product_category,
+    coalesce(pay.payment_type, 'not_defined') as payment_type,
+    sum(f.price) as revenue,
+    sum(f.freight_value) as freight,
+    count(*) as item_count,
+    count(distinct f.order_id) as order_count,      -- distinct within a cell only, not additive
+    sum(f.review_score) as review_sum,
+    count(f.review_score) as review_count,
+    sum(f.delivery_time_days) as delivery_days_sum,
+    count(f.delivery_time_days) as delivery_days_count,
+    current_timestamp as record_loaded_at
+from {{ ref('fact_order_items') }} f
+inner join {{ ref('dim_customers') }} c
+    on f.customer_id = c.customer_id
+inner join {{ ref('dim_dates') }} d
+    on f.order_date_key = d.date_key
+left join {{ ref('dim_sellers') }} s
+    on f.seller_id = s.seller_id
+left join {{ ref('dim_products') }} p
+    on f.product_id = p.product_id
+left join {{ ref('dim_payments') }} pay
+    on f.payment_type_key = pay.payment_type_key
+group by 1, 2, 3, 4, 5, 6
@@ -1,9 +1,21 @@
 
 {{ config(
     materialized='incremental',
-    unique_key='order_item_id'
+    unique_key='order_item_key',
+    incremental_strategy=('merge' if target.type == 'bigquery' else 'delete+insert'),
+    on_schema_change='append_new_columns',
+    partition_by={'field': 'order_date', 'data_type': 'date', 'granularity': 'month'},
+    cluster_by=['customer_state', 'seller_state', 'product_id']
 ) }}
 
+-- Incremental runs re-process every order with source activity (purchase,
+-- approval, shipping, delivery or a review) inside the lookback window before
+-- the current watermark, so late-arriving deliveries and reviews are merged
+-- into existing rows. Override with --vars '{fact_lookback_days: N}'.
+-- Payments carry no business timestamp: orders whose payment rows were loaded
+-- after the last run (payments_loaded_at) are re-processed as well.
+{% set lookback_days = var('fact_lookback_days', 3) %}
+
 with order_payments as (
     select
         order_id,
@@ -33,10 +45,48 @@ with order_payments as (
 order_reviews as (
     select
         order_id,
-        max(review_score) as review_score
+        max(review_score) as review_score,
+        max(review_creation_date) as last_review_at
     from {{ ref('stg_order_reviews') }}
     where review_score is not null
     group by order_id
+),
+
+payment_loads as (
+    -- When the current version of an order's payment rows was loaded
+    select
+        order_id,
+        max(record_loaded_at) as payments_loaded_at
+    from {{ ref('stg_order_payments') }}
+    group by order_id
+),
+
+order_activity as (
+    -- Latest source activity per order, and the latest payment load; the incremental watermarks
+    select
+        o.order_id,
+        greatest(
+            o.order_purchase_timestamp,
+            coalesce(o.order_approved_at, o.order_purchase_timestamp),
+            coalesce(o.order_delivered_carrier_date, o.order_purchase_timestamp),
+            coalesce(o.order_delivered_customer_date, o.order_purchase_timestamp),
+            coalesce(r.last_review_at, o.order_purchase_timestamp)
+        ) as source_updated_at,
+        pl.payments_loaded_at
+    from {{ ref('stg_orders') }} o
+    left join order_reviews r
+        on o.order_id = r.order_id
+    left join payment_loads pl
+        on o.order_id = pl.order_id
+),
+
+zip_centroids as (
+    -- The centroids the dashboard maps draw routes between, so map and distances agree
+    select
+        geolocation_zip_code_prefix,
+        latitude,
+        longitude
+    from {{ ref('zip_spatial_index') }}
 )
 
 select
@@ -47,12 +97,21 @@ select
     oi.product_id,
     oi.seller_id,
     o.customer_id,
-    cast(format_date('%Y%m%d', date(o.order_purchase_timestamp)) as int64) as order_date_key,
+    cast({{ format_date_as('%Y%m%d', 'date(o.order_purchase_timestamp)') }} as int64) as order_date_key,
+    -- Denormalized filter columns so dashboard predicates prune partitions and clusters without joins
+    date(o.order_purchase_timestamp) as order_date,
+    extract(year from o.order_purchase_timestamp) as year,
+    c.customer_state,
+    s.seller_state,
     coalesce(op.payment_type_key, '-1') as payment_type_key,
     oi.price,
     oi.freight_value,
     r.review_score,  
-    date_diff(date(o.order_delivered_customer_date), date(o.order_purchase_timestamp), day) as delivery_time_days,
+    {{ dbt.datediff('date(o.order_purchase_timestamp)', 'date(o.order_delivered_customer_date)', 'day') }} as delivery_time_days,
+    -- Seller zip centroid to customer zip centroid; null when either zip has no geolocation
+    {{ haversine_km('sg.latitude', 'sg.longitude', 'cg.latitude', 'cg.longitude') }} as delivery_distance_km,
+    oa.source_updated_at,
+    oa.payments_loaded_at,
     current_timestamp as loaded_at
 from {{ ref('stg_order_items') }} oi
 inner join {{ ref('stg_orders') }} o
@@ -61,12 +120,34 @@ left join order_payments op
     on oi.order_id = op.order_id
 left join order_reviews r
     on oi.order_id = r.order_id
+inner join order_activity oa
+    on oi.order_id = oa.order_id
+left join {{ ref('stg_sellers') }} s
+    on oi.seller_id = s.seller_id
+left join zip_centroids sg
+    on s.seller_zip_code_prefix = sg.geolocation_zip_code_prefix
+left join {{ ref('stg_customers') }} c
+    on o.customer_id = c.customer_id
+left join zip_centroids cg
+    on c.customer_zip_code_prefix = cg.geolocation_zip_code_prefix
 where o.order_purchase_timestamp is not null
 
 {% if is_incremental() %}
-    -- Filters for new records since the last run
-    and o.order_purchase_timestamp > (
-        select coalesce(max(loaded_at), timestamp('1900-01-01'))
-        from {{ this }}
+    and (
+        -- Orders with any source activity since the watermark minus the lookback window
+        oa.source_updated_at >= (
+            select {{ timestamp_sub_days("coalesce(max(source_updated_at), timestamp '1900-01-01')", lookback_days) }}
+            from {{ this }}
+        )
+        -- Orders whose payments were loaded since the last run; on the first run
+        -- after payments_loaded_at was added, every order with payments
+        {%- if 'payments_loaded_at' in adapter.get_columns_in_relation(this) | map(attribute='name') | map('lower') %}
+        or oa.payments_loaded_at > (
+            select coalesce(max(t.payments_loaded_at), timestamp '1900-01-01')
+            from {{ this }} t
+        )
+        {%- else %}
+        or oa.payments_loaded_at is not null
+        {%- endif %}
     )
 {% endif %}
\ No newline at end of file
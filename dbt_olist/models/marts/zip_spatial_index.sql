@@ -0,0 +1,31 @@
+{{ config(materialized='table') }}
+
+-- One row per zip code prefix: the centroid of all its geolocation points and
+-- the grid cell containing it at three map zoom levels. A cell at zoom z is
+-- 11.25 / 2^z degrees wide, the size the dashboards bin points at; the eight
+-- neighbours of cell 'r:c' are the cells 'r±1:c±1', so proximity searches and
+-- regional rollups become lookups on these ids (streamlit/zip_index.py).
+with zips as (
+    select
+        geolocation_zip_code_prefix,
+        -- weighted by the points behind each city average: the true centroid
+        sum(latitude * point_count) / sum(point_count) as latitude,
+        sum(longitude * point_count) / sum(point_count) as longitude,
+        {{ latest_value('city', 'point_count') }} as city,
+        {{ latest_value('state', 'point_count') }} as state,
+        sum(point_count) as point_count
+    from {{ ref('stg_geolocation') }}
+    group by geolocation_zip_code_prefix
+)
+
+select
+    geolocation_zip_code_prefix,
+    latitude,
+    longitude,
+    city,
+    state,
+    point_count,
+    {{ grid_cell('latitude', 'longitude', 0.703125) }} as cell_z4,
+    {{ grid_cell('latitude', 'longitude', 0.17578125) }} as cell_z6,
+    {{ grid_cell('latitude', 'longitude', 0.0439453125) }} as cell_z8
+from zips
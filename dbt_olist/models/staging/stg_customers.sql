@@ -1,9 +1,14 @@
-{{ config(materialized='view') }}
+{{ config(
+    materialized='incremental',
+    unique_key='customer_id',
+    post_hook="{{ delete_removed_rows(source('raw', 'customer'), ['customer_id']) }}"
+) }}
 
 WITH ranked AS (
     SELECT *,
            ROW_NUMBER() OVER (PARTITION BY customer_id ORDER BY customer_id) AS rn
     FROM {{ source('raw', 'customer') }}
+    WHERE {{ loaded_since_last_run() }}
 )
 SELECT
     customer_id,
@@ -11,6 +16,6 @@ SELECT
     customer_zip_code_prefix,
     customer_city,
     UPPER(customer_state) AS customer_state,
-    CURRENT_TIMESTAMP AS record_loaded_at
+    _loaded_at AS record_loaded_at
 FROM ranked
-WHERE rn = 1
\ No newline at end of file
+WHERE rn = 1
@@ -1,14 +1,23 @@
-{{ config(materialized='view') }}
+{{ config(
+    materialized='incremental',
+    unique_key=['geolocation_zip_code_prefix', 'city', 'state'],
+    post_hook="delete from {{ this }} where record_loaded_at < (select max(record_loaded_at) from {{ this }})"
+) }}
 
+-- geolocation has no row key, so every load replaces the whole file: a run
+-- after a new load re-aggregates all of it and the post-hook drops the groups
+-- of older loads. Without a new load the run reads no rows.
 select
     geolocation_zip_code_prefix,
-    avg(cast(geolocation_lat as float64)) as latitude,
-    avg(cast(geolocation_lng as float64)) as longitude,
-    trim(geolocation_city) as city,
-    trim(upper(geolocation_state)) as state,
-    current_timestamp as record_loaded_at
+    avg(geolocation_lat) as latitude,
+    avg(geolocation_lng) as longitude,
+    geolocation_city as city,
+    upper(geolocation_state) as state,
+    count(*) as point_count,
+    max(_loaded_at) as record_loaded_at
 from {{ source('raw', 'geolocation') }}
+where {{ loaded_since_last_run() }}
 group by
     geolocation_zip_code_prefix,
     city,
-    state
\ No newline at end of file
+    state
@@ -1,12 +1,17 @@
-{{ config(materialized='view') }}
+{{ config(
+    materialized='incremental',
+    unique_key=['order_id', 'order_item_id'],
+    post_hook="{{ delete_removed_rows(source('raw', 'order_item'), ['order_id', 'order_item_id']) }}"
+) }}
 
 select
     order_id,
     order_item_id,
     product_id,
     seller_id,
-    safe_cast(shipping_limit_date as timestamp) as shipping_limit_timestamp,
-    safe_cast(price as numeric) as price,
-    safe_cast(freight_value as numeric) as freight_value,
-    current_timestamp as record_loaded_at
-from {{ source('raw', 'order_item') }}
\ No newline at end of file
+    shipping_limit_date as shipping_limit_timestamp,
+    price,
+    freight_value,
+    _loaded_at as record_loaded_at
+from {{ source('raw', 'order_item') }}
+where {{ loaded_since_last_run() }}
@@ -1,10 +1,15 @@
-{{ config(materialized='view') }}
+{{ config(
+    materialized='incremental',
+    unique_key=['order_id', 'payment_sequential'],
+    post_hook="{{ delete_removed_rows(source('raw', 'order_payment'), ['order_id', 'payment_sequential']) }}"
+) }}
 
 select
     order_id,
     payment_sequential,
-    trim(lower(payment_type)) as payment_type,
-    safe_cast(payment_installments as int) as payment_installments,
-    safe_cast(payment_value as numeric) as payment_value,
-    current_timestamp as record_loaded_at  
-from {{ source('raw', 'order_payment') }}
\ No newline at end of file
+    lower(payment_type) as payment_type,
+    payment_installments,
+    payment_value,
+    _loaded_at as record_loaded_at  
+from {{ source('raw', 'order_payment') }}
+where {{ loaded_since_last_run() }}
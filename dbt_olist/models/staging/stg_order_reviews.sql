@@ -1,10 +1,15 @@
-{{ config(materialized='view') }}
+{{ config(
+    materialized='incremental',
+    unique_key=['review_id', 'order_id'],
+    post_hook="{{ delete_removed_rows(source('raw', 'order_review'), ['review_id', 'order_id']) }}"
+) }}
 
 select
     review_id,
     order_id,
-    safe_cast(review_score as int) as review_score,
-    safe_cast(review_creation_date as timestamp) as review_creation_date,
-    safe_cast(review_answer_timestamp as timestamp) as review_answer_timestamp,
-    current_timestamp as record_loaded_at  
-from {{ source('raw', 'order_review') }}
\ No newline at end of file
+    review_score,
+    review_creation_date,
+    review_answer_timestamp,
+    _loaded_at as record_loaded_at  
+from {{ source('raw', 'order_review') }}
+where {{ loaded_since_last_run() }}
@@ -1,7 +1,12 @@
-{{ config(materialized='view') }}
+{{ config(
+    materialized='incremental',
+    unique_key='product_category_name',
+    post_hook="{{ delete_removed_rows(source('raw', 'product_category_name_translation'), ['product_category_name']) }}"
+) }}
 
 select
-    trim(product_category_name) as product_category_name,
-    trim(product_category_name_english) as product_category_name_english,
-    current_timestamp as record_loaded_at
-from {{ source('raw', 'product_category_name_translation') }}
\ No newline at end of file
+    product_category_name,
+    product_category_name_english,
+    _loaded_at as record_loaded_at
+from {{ source('raw', 'product_category_name_translation') }}
+where {{ loaded_since_last_run() }}
@@ -1,11 +1,16 @@
-{{ config(materialized='view') }}
+{{ config(
+    materialized='incremental',
+    unique_key='product_id',
+    post_hook="{{ delete_removed_rows(source('raw', 'product'), ['product_id']) }}"
+) }}
 
 select
     product_id,
-    trim(product_category_name) as product_category_name,
-    safe_cast(product_weight_g as numeric) as product_weight_g,
-    safe_cast(product_length_cm as numeric) as product_length_cm,
-    safe_cast(product_height_cm as numeric) as product_height_cm,
-    safe_cast(product_width_cm as numeric) as product_width_cm,
-    current_timestamp as record_loaded_at
-from {{ source('raw', 'product') }}
\ No newline at end of file
+    product_category_name,
+    product_weight_g,
+    product_length_cm,
+    product_height_cm,
+    product_width_cm,
+    _loaded_at as record_loaded_at
+from {{ source('raw', 'product') }}
+where {{ loaded_since_last_run() }}
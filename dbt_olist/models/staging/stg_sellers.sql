@@ -1,15 +1,20 @@
-{{ config(materialized='view') }}
+{{ config(
+    materialized='incremental',
+    unique_key='seller_id',
+    post_hook="{{ delete_removed_rows(source('raw', 'seller'), ['seller_id']) }}"
+) }}
 
 WITH ranked AS (
     SELECT *,
            ROW_NUMBER() OVER (PARTITION BY seller_id ORDER BY seller_id) AS rn
     FROM {{ source('raw', 'seller') }}
+    WHERE {{ loaded_since_last_run() }}
 )
 SELECT
     seller_id,
     seller_zip_code_prefix,
-    TRIM(LOWER(seller_city)) AS seller_city,
-    TRIM(UPPER(seller_state)) AS seller_state,
-    CURRENT_TIMESTAMP AS record_loaded_at
+    LOWER(seller_city) AS seller_city,
+    UPPER(seller_state) AS seller_state,
+    _loaded_at AS record_loaded_at
 FROM ranked
-WHERE rn = 1
\ No newline at end of file
+WHERE rn = 1
@@ -0,0 +1,20 @@
+-- Orders whose payment rows were reloaded must have been re-processed by the
+-- incremental fact: its payments_loaded_at is the latest load of the order's
+-- payments. Returns the orders still carrying an older payment version.
+with staged_payments as (
+    select
+        order_id,
+        max(record_loaded_at) as payments_loaded_at
+    from {{ ref('stg_order_payments') }}
+    group by order_id
+)
+
+select distinct
+    f.order_id,
+    f.payments_loaded_at,
+    sp.payments_loaded_at as staged_payments_loaded_at
+from {{ ref('fact_order_items') }} f
+inner join staged_payments sp
+    on f.order_id = sp.order_id
+where f.payments_loaded_at is null
+    or f.payments_loaded_at < sp.payments_loaded_at
@@ -0,0 +1,81 @@
+import hashlib, io, json, os, zipfile
+import requests
+import shapefile  # pyshp
+import shapely
+from shapely.geometry import MultiPolygon, mapping, shape
+
+# Builds the Brazil state boundaries bundled with the dashboard
+# (streamlit/assets/brazil_states.geojson). The source is IBGE's municipal mesh
+# (55mu2500gsd), shipped inside the django-gis-brasil sdist on PyPI. Municipalities
+# are dissolved into states, the states are simplified together so neighbouring
+# borders stay shared, small islands are dropped and coordinates are rounded,
+# so the asset is small and never fetched at runtime.
+#
+#     pip install requests pyshp shapely>=2.1
+source_url = "https://files.pythonhosted.org/packages/34/44/d591dc94b4d6809348222fce62c80e7f56a18916985cb34beed36ed98d3d/django-gis-brasil-0.3.zip"
+source_sha256 = "43693d73c43d0962e92b5da15e295201512d8e360718b673ca222d1e4d08a953"
+source_member = "django-gis-brasil-0.3/gisbrasil/data/brasil/55mu2500gsd"
+out_path = os.path.join(os.path.dirname(__file__), "..", "streamlit", "assets", "brazil_states.geojson")
+tolerance = float(os.getenv("GEOMETRY_TOLERANCE", "0.02"))  # degrees, ~2 km
+precision = int(os.getenv("GEOMETRY_PRECISION", "3"))  # decimal places, ~100 m
+min_area = float(os.getenv("GEOMETRY_MIN_AREA", "0.005"))  # square degrees, ~60 km2
+
+STATE_NAMES = {
+    "AC": "Acre", "AL": "Alagoas", "AP": "Amapá", "AM": "Amazonas", "BA": "Bahia",
+    "CE": "Ceará", "DF": "Distrito Federal", "ES": "Espírito Santo", "GO": "Goiás",
+    "MA": "Maranhão", "MT": "Mato Grosso", "MS": "Mato Grosso do Sul", "MG": "Minas Gerais",
+    "PA": "Pará", "PB": "Paraíba", "PR": "Paraná", "PE": "Pernambuco", "PI": "Piauí",
+    "RJ": "Rio de Janeiro", "RN": "Rio Grande do Norte", "RS": "Rio Grande do Sul",
+    "RO": "Rondônia", "RR": "Roraima", "SC": "Santa Catarina", "SP": "São Paulo",
+    "SE": "Sergipe", "TO": "Tocantins",
+}
+
+
+def read_municipalities(archive):
+    """Yields (state abbreviation, geometry) for every municipality of the mesh."""
+    members = {ext: io.BytesIO(archive.read(f"{source_member}.{ext}")) for ext in ("shp", "shx", "dbf")}
+    reader = shapefile.Reader(**members, encoding="latin-1")
+    for record in reader.iterShapeRecords():
+        geometry = shape(record.shape.__geo_interface__)
+        # Lagoons (Lagoa dos Patos, Lagoa Mirim) have no state
+        if record.record["Sigla"]:
+            yield record.record["Sigla"], shapely.make_valid(geometry)
+
+
+def drop_small_parts(geometry, area):
+    """Removes polygons smaller than area from a multipolygon, keeping at least the largest."""
+    parts = sorted(getattr(geometry, "geoms", [geometry]), key=lambda p: p.area, reverse=True)
+    parts = [parts[0]] + [p for p in parts[1:] if p.area >= area]
+    return MultiPolygon(parts) if len(parts) > 1 else parts[0]
+
+
+response = requests.get(source_url, timeout=120)
+response.raise_for_status()
+if hashlib.sha256(response.content).hexdigest() != source_sha256:
+    raise ValueError(f"Unexpected checksum for {source_url}")
+
+municipalities = {}
+with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+    for sigla, geometry in read_municipalities(archive):
+        municipalities.setdefault(sigla, []).append(geometry)
+
+siglas = sorted(municipalities)
+states = [shapely.union_all(municipalities[sigla]) for sigla in siglas]
+# Simplifying the states as one coverage keeps each shared border identical on both sides
+states = shapely.coverage_simplify(states, tolerance)
+
+features = []
+for sigla, geometry in zip(siglas, states):
+    geometry = shapely.set_precision(drop_small_parts(geometry, min_area), 10 ** -precision)
+    geometry = shapely.orient_polygons(geometry)  # RFC 7946: exterior rings counterclockwise
+    features.append({
+        "type": "Feature",
+        "properties": {"sigla": sigla, "name": STATE_NAMES[sigla]},
+        "geometry": mapping(geometry),
+    })
+
+os.makedirs(os.path.dirname(out_path), exist_ok=True)
+with open(out_path, "w", encoding="utf-8") as f:
+    json.dump({"type": "FeatureCollection", "features": features}, f, separators=(",", ":"), ensure_ascii=False)
+
+print(f"Wrote {len(features)} states ({len(response.content):,} -> {os.path.getsize(out_path):,} bytes) to: {out_path}")
@@ -0,0 +1,91 @@
+import json, os, subprocess, sys
+import sqlparse  # installed with dbt-core
+from sqlparse.sql import Identifier, IdentifierList
+from sqlparse.tokens import DML
+
+# Compiles the marts and checks that they keep the partitioning, clustering and
+# denormalized filter columns the dashboard predicates rely on. Compiles against
+# an in-memory DuckDB (the local target) unless DBT_TARGET says otherwise, so no
+# warehouse connection is needed. Exits non-zero listing every violation.
+#
+#     pip install dbt-core dbt-duckdb sqlparse
+#     (cd dbt_olist && dbt deps) && python scripts/check_mart_layout.py
+project_dir = os.getenv("DBT_PROJECT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "dbt_olist"))
+profiles_dir = os.getenv("DBT_PROFILES_DIR", project_dir)
+expected = {
+    "fact_order_items": {
+        "partition_by": {"field": "order_date", "data_type": "date"},
+        "cluster_by": ["customer_state", "seller_state", "product_id"],
+        "columns": ["order_date", "year", "customer_state", "seller_state"],
+    },
+    "fact_order_cube": {"cluster_by": ["customer_state", "seller_state", "year"]},
+    "customer_rfm": {"cluster_by": ["customer_state", "segment"]},
+}
+
+
+def selected_columns(sql):
+    """Returns the output column names of the outermost select of a compiled model."""
+    statement = sqlparse.parse(sqlparse.format(sql, strip_comments=True))[0]
+    tokens = [t for t in statement.tokens if not t.is_whitespace]
+    select = max(i for i, t in enumerate(tokens) if t.ttype is DML and t.normalized == "SELECT")
+    items = tokens[select + 1]
+    items = items.get_identifiers() if isinstance(items, IdentifierList) else [items]
+    return [item.get_name() if isinstance(item, Identifier) else str(item) for item in items]
+
+
+def compile_marts(target_path=None):
+    """Compiles the checked marts and returns the manifest's model nodes by name."""
+    target_path = target_path or os.path.join(project_dir, "target")
+    env = {"DBT_TARGET": "local", "OLIST_DUCKDB_PATH": ":memory:", **os.environ}
+    result = subprocess.run(
+        ["dbt", "compile", "--project-dir", project_dir, "--profiles-dir", profiles_dir,
+         "--target-path", target_path, "--select", *expected],
+        capture_output=True, text=True, env=env
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"dbt compile failed:\n{result.stdout}{result.stderr}")
+    with open(os.path.join(target_path, "manifest.json")) as f:
+        return {n["name"]: n for n in json.load(f)["nodes"].values() if n["resource_type"] == "model"}
+
+
+def check_layout(nodes):
+    """Returns a message for every way the compiled marts differ from expected."""
+    errors = []
+    for model, spec in expected.items():
+        node = nodes.get(model)
+        if node is None:
+            errors.append(f"{model}: model not found")
+            continue
+        config = node["config"]
+        for key, value in spec.get("partition_by", {}).items():
+            actual = (config.get("partition_by") or {}).get(key)
+            if actual != value:
+                errors.append(f"{model}: partition_by.{key} is {actual!r}, expected {value!r}")
+        if "cluster_by" in spec:
+            cluster_by = config.get("cluster_by")
+            cluster_by = [cluster_by] if isinstance(cluster_by, str) else cluster_by
+            if cluster_by != spec["cluster_by"]:
+                errors.append(f"{model}: cluster_by is {cluster_by!r}, expected {spec['cluster_by']!r}")
+        columns = selected_columns(node["compiled_code"])
+        for column in spec.get("columns", []):
+            if column not in columns:
+                errors.append(f"{model}: filter column {column} is not selected")
+    return errors
+
+
+def main():
+    try:
+        nodes = compile_marts()
+    except RuntimeError as e:
+        print(e)
+        sys.exit("dbt compile failed")
+    errors = check_layout(nodes)
+    for error in errors:
+        print(error)
+    if errors:
+        sys.exit(f"{len(errors)} mart layout check(s) failed")
+    print(f"Mart layout OK for: {', '.join(expected)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+import os
+from google.cloud import bigquery
+
+# Exports the tables the dashboard reads into <out_dir>/<dataset>/<table>.parquet,
+# the layout expected by the Streamlit parquet backend (OLIST_BACKEND=parquet).
+project_id = os.getenv("PROJECT_ID")
+out_dir = os.getenv("OLIST_PARQUET_DIR", "extracts")
+tables = {
+    "m2_prod": [
+        "fact_order_items", "fact_order_cube", "customer_rfm", "dim_customers", "dim_products", "dim_sellers",
+        "dim_payments", "dim_geolocation", "zip_spatial_index", "dim_dates",
+    ],
+    "m2_ingestion": ["order", "customer", "seller"],
+}
+
+client = bigquery.Client(project=project_id, location="US")
+for dataset, names in tables.items():
+    os.makedirs(os.path.join(out_dir, dataset), exist_ok=True)
+    for name in names:
+        path = os.path.join(out_dir, dataset, f"{name}.parquet")
+        df = client.query(f"SELECT * FROM `{project_id}.{dataset}.{name}`").to_arrow(create_bqstorage_client=True).to_pandas()
+        df.to_parquet(path, index=False)
+        print(f"Exported {dataset}.{name} ({len(df):,} rows) to: {path}")
@@ -1,21 +1,155 @@
-import requests, zipfile, os
-
-url = "https://www.kaggle.com/api/v1/datasets/download/olistbr/brazilian-ecommerce"
-save_path = "/Users/alexfoo/Documents/NTU_DSAI/5m-data-m2-project/assets/"
-zip_file = os.path.join(save_path, "brazilian-ecommerce.zip")
-
-# Download file
-response = requests.get(url, stream=True)
-if response.status_code == 200:
-    with open(zip_file, "wb") as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            f.write(chunk)
-    print(f"Downloaded zip to: {zip_file}")
-else:
-    print("Download failed:", response.status_code)
-
-# Unzip
-with zipfile.ZipFile(zip_file, "r") as zip_ref:
-    zip_ref.extractall(save_path)
-
-print(f"Files extracted to: {save_path}")
\ No newline at end of file
+"""Downloads the Olist dataset and extracts the CSVs that changed.
+
+The download is conditional (ETag / If-Modified-Since) and resumes an
+interrupted transfer with a Range request. Zip members are streamed straight to
+their target files, and ingest_manifest.json records the sha256 of each one so
+downstream steps can skip files whose content did not change.
+
+    python scripts/ingest.py [--url URL] [--dest DIR]
+"""
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+import zlib
+
+import requests
+
+URL = "https://www.kaggle.com/api/v1/datasets/download/olistbr/brazilian-ecommerce"
+# Same default as the Dagster staging assets (OLIST_RAW_DIR, else <repo>/assets)
+DEST_DIR = os.getenv("OLIST_RAW_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "assets"))
+ZIP_NAME = "brazilian-ecommerce.zip"
+MANIFEST_NAME = "ingest_manifest.json"
+CHUNK_SIZE = 1 << 20
+
+
+def read_json(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_json(path: str, data: dict) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def download(url: str, zip_path: str, session: requests.Session = None) -> bool:
+    """Fetches url into zip_path unless the server reports it unchanged; returns whether it changed.
+
+    The validators of the last download are kept in <zip>.http.json. A partial
+    download stays in <zip>.part and is resumed while its validator still holds.
+    A .part the server reports as already whole (416) is kept if it is a sound
+    zip; otherwise it is discarded and the file downloaded again.
+    """
+    session = session or requests.Session()
+    http_path = zip_path + ".http.json"
+    part_path = zip_path + ".part"
+    http = read_json(http_path)
+
+    headers = {}
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    if offset and http.get("partial"):
+        # If-Range: the server sends the whole file instead if it changed meanwhile
+        headers.update({"Range": f"bytes={offset}-", "If-Range": http["partial"]})
+    elif os.path.exists(zip_path):
+        if http.get("etag"):
+            headers["If-None-Match"] = http["etag"]
+        if http.get("last_modified"):
+            headers["If-Modified-Since"] = http["last_modified"]
+
+    with session.get(url, headers=headers, stream=True, timeout=60) as response:
+        if response.status_code == 304:
+            return False
+        if response.status_code == 416 and "Range" in headers:
+            # Resumed past the end: the .part is the whole file, unless the file changed size
+            total = response.headers.get("Content-Range", "").rpartition("/")[2]
+            if total != str(offset) or not is_complete_zip(part_path):
+                os.remove(part_path)
+                return download(url, zip_path, session)
+            validators = {"ETag": response.headers.get("ETag"), "Last-Modified": response.headers.get("Last-Modified")}
+            if not any(validators.values()):
+                # The validator the .part was resumed under, which the server just honoured
+                validators["ETag" if http["partial"].startswith(('"', "W/")) else "Last-Modified"] = http["partial"]
+        else:
+            response.raise_for_status()
+            validators = response.headers
+            write_json(http_path, {**http, "partial": validators.get("ETag") or validators.get("Last-Modified")})
+            with open(part_path, "ab" if response.status_code == 206 else "wb") as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    f.write(chunk)
+
+    os.replace(part_path, zip_path)
+    write_json(http_path, {"etag": validators.get("ETag"), "last_modified": validators.get("Last-Modified")})
+    return True
+
+
+def is_complete_zip(path: str) -> bool:
+    """Whether path is a readable zip whose members all match their CRC-32."""
+    try:
+        with zipfile.ZipFile(path) as archive:
+            return archive.testzip() is None
+    except (zipfile.BadZipFile, zlib.error):
+        return False
+
+
+def extract(zip_path: str, dest_dir: str, manifest_path: str) -> list[str]:
+    """Streams every changed zip member into dest_dir; returns the names of the files replaced.
+
+    A member whose CRC-32 and size match the manifest is not decompressed at all;
+    one that decompresses to the recorded sha256 leaves its file untouched.
+    """
+    manifest = read_json(manifest_path)
+    changed = []
+    with zipfile.ZipFile(zip_path) as archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            # The dataset is flat; basename also keeps members inside dest_dir
+            name = os.path.basename(info.filename)
+            target = os.path.join(dest_dir, name)
+            entry = manifest.get(name)
+            if entry and os.path.exists(target) and (entry["crc32"], entry["bytes"]) == (info.CRC, info.file_size):
+                continue
+
+            digest = hashlib.sha256()
+            fd, tmp_path = tempfile.mkstemp(dir=dest_dir, suffix=".tmp")
+            with archive.open(info) as source, os.fdopen(fd, "wb") as out:
+                for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    out.write(chunk)
+            sha256 = digest.hexdigest()
+            if entry and os.path.exists(target) and entry["sha256"] == sha256:
+                os.remove(tmp_path)
+            else:
+                os.replace(tmp_path, target)
+                changed.append(name)
+            manifest[name] = {"sha256": sha256, "crc32": info.CRC, "bytes": info.file_size}
+    write_json(manifest_path, manifest)
+    return changed
+
+
+def main(argv: list[str] = None) -> list[str]:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default=URL)
+    parser.add_argument("--dest", default=DEST_DIR)
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.dest, exist_ok=True)
+    zip_path = os.path.join(args.dest, ZIP_NAME)
+    manifest_path = os.path.join(args.dest, MANIFEST_NAME)
+    if not download(args.url, zip_path) and os.path.exists(manifest_path):
+        print("Dataset unchanged since the last download")
+        return []
+    changed = extract(zip_path, args.dest, manifest_path)
+    print(f"Extracted {len(changed)} changed file(s) to {args.dest}: {', '.join(changed) or 'none'}")
+    return changed
+
+
+if __name__ == "__main__":
+    main()
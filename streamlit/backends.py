@@ -0,0 +1,247 @@
+# streamlit/backends.py
+
+import os
+import re
+import numbers
+import numpy as np
+import pandas as pd
+from query_builder import mask_literals, unmask_literals
+
+# -------------------------
+# Backend Configuration
+# -------------------------
+# OLIST_BACKEND selects where dashboard SQL is executed:
+#   bigquery - the m2_prod / m2_ingestion datasets in BigQuery (default)
+#   duckdb   - a local DuckDB database with m2_prod / m2_ingestion schemas
+#   parquet  - a directory of Parquet extracts laid out as <dataset>/<table>.parquet
+BACKEND_BIGQUERY = "bigquery"
+BACKEND_DUCKDB = "duckdb"
+BACKEND_PARQUET = "parquet"
+BACKENDS = (BACKEND_BIGQUERY, BACKEND_DUCKDB, BACKEND_PARQUET)
+
+DEFAULT_DUCKDB_PATH = "olist.duckdb"
+DEFAULT_PARQUET_DIR = "extracts"
+
+
+def get_backend_name() -> str:
+    """Returns the configured backend name, defaulting to BigQuery."""
+    name = os.getenv("OLIST_BACKEND", BACKEND_BIGQUERY).strip().lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown OLIST_BACKEND '{name}'. Expected one of: {', '.join(BACKENDS)}")
+    return name
+
+
+# -------------------------
+# BigQuery -> DuckDB SQL Translation
+# -------------------------
+# The pages are written in BigQuery SQL. Only the handful of constructs they
+# actually use are rewritten here, so the same page SQL runs on both engines.
+# String literals and comments are masked first and left exactly as written.
+_TABLE_REF = re.compile(r"`([^`]+)`")
+_TYPE_NAMES = {"FLOAT64": "DOUBLE", "INT64": "BIGINT"}
+
+
+def _split_args(args: str) -> list[str]:
+    """Splits a function argument string on top-level commas."""
+    parts, depth, in_quote, start = [], 0, False, 0
+    for i, ch in enumerate(args):
+        if ch == "'":
+            in_quote = not in_quote
+        elif in_quote:
+            continue
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "," and depth == 0:
+            parts.append(args[start:i].strip())
+            start = i + 1
+    parts.append(args[start:].strip())
+    return parts
+
+
+def _rewrite_calls(sql: str, name: str, rewrite) -> str:
+    """Rewrites every NAME(...) call using rewrite(args) -> replacement SQL."""
+    pattern = re.compile(rf"\b{name}\s*\(", re.IGNORECASE)
+    out, pos = [], 0
+    while True:
+        match = pattern.search(sql, pos)
+        if not match:
+            out.append(sql[pos:])
+            return "".join(out)
+        depth, end = 1, match.end()
+        while depth:
+            if sql[end] == "(":
+                depth += 1
+            elif sql[end] == ")":
+                depth -= 1
+            end += 1
+        inner = _rewrite_calls(sql[match.end():end - 1], name, rewrite)
+        out.append(sql[pos:match.start()])
+        out.append(rewrite(_split_args(inner)))
+        pos = end
+
+
+def bigquery_to_duckdb(sql: str) -> str:
+    """Translates the BigQuery dialect used by the dashboard pages to DuckDB."""
+    sql, literals = mask_literals(sql)
+    # `project.dataset.table` -> dataset.table (the project has no local meaning)
+    sql = _TABLE_REF.sub(lambda m: ".".join(m.group(1).split(".")[-2:]), sql)
+    sql = re.sub(r"\bSAFE_CAST\s*\(", "TRY_CAST(", sql, flags=re.IGNORECASE)
+    for bq_type, duck_type in _TYPE_NAMES.items():
+        sql = re.sub(rf"\b{bq_type}\b", duck_type, sql, flags=re.IGNORECASE)
+    # FORMAT_DATE(fmt, d) -> strftime(d, fmt)
+    sql = _rewrite_calls(sql, "FORMAT_DATE", lambda a: f"strftime({a[1]}, {a[0]})")
+    # DATE_DIFF(end, start, PART) -> date_diff('part', start, end)
+    sql = _rewrite_calls(sql, "DATE_DIFF", lambda a: f"date_diff('{a[2].lower()}', {a[1]}, {a[0]})")
+    # Array parameters: IN UNNEST(@name) -> IN (SELECT UNNEST($name)); scalars: @name -> $name
+    sql = re.sub(r"\bIN\s+UNNEST\s*\(\s*@(\w+)\s*\)", r"IN (SELECT UNNEST($\1))", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"@(\w+)", r"$\1", sql)
+    return unmask_literals(sql, literals)
+
+
+def _bq_type(value) -> str:
+    """Maps a Python value to the BigQuery parameter type."""
+    if isinstance(value, bool):
+        return "BOOL"
+    if isinstance(value, numbers.Integral):
+        return "INT64"
+    if isinstance(value, numbers.Real):
+        return "FLOAT64"
+    return "STRING"
+
+
+# -------------------------
+# Arrow Result Conversion
+# -------------------------
+# Results are fetched as Arrow tables. In large results low-cardinality
+# strings become categoricals before they reach pandas; small aggregates are
+# left as-is. Numerics keep the engine's types: narrow integers overflow
+# silently in later arithmetic, so callers that keep a frame around opt in to
+# downcast_numerics for the columns where that is safe.
+COMPACT_MIN_ROWS = 10_000
+CATEGORY_MAX_RATIO = 0.5
+
+
+def arrow_to_frame(table) -> pd.DataFrame:
+    """Converts an Arrow table to a DataFrame, with categoricals for repetitive strings."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    encoded = []
+    if table.num_rows >= COMPACT_MIN_ROWS:
+        for i, field in enumerate(table.schema):
+            if not (pa.types.is_string(field.type) or pa.types.is_large_string(field.type)):
+                continue
+            column = table.column(i)
+            if pc.count_distinct(column).as_py() <= CATEGORY_MAX_RATIO * table.num_rows:
+                table = table.set_column(i, field.name, pc.dictionary_encode(column))
+                encoded.append(field.name)
+    df = table.to_pandas()
+    # Dictionaries list values in order of first appearance; sorted categories
+    # make sort_values and groupby on the column follow the values themselves
+    for col in encoded:
+        df[col] = df[col].cat.reorder_categories(sorted(df[col].cat.categories))
+    return df
+
+
+def downcast_numerics(df: pd.DataFrame) -> pd.DataFrame:
+    """Narrows integer columns, and float columns that survive a float32 round trip."""
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_integer_dtype(series) and not isinstance(series.dtype, pd.CategoricalDtype):
+            df[col] = pd.to_numeric(series, downcast="integer")
+        elif pd.api.types.is_float_dtype(series) and series.dtype != np.float32:
+            narrowed = series.astype(np.float32)
+            if np.array_equal(narrowed.to_numpy(dtype=np.float64), series.to_numpy(), equal_nan=True):
+                df[col] = narrowed
+    return df
+
+
+# -------------------------
+# Backends
+# -------------------------
+class BigQueryBackend:
+    """Runs page SQL unchanged against BigQuery."""
+
+    name = BACKEND_BIGQUERY
+
+    def __init__(self, client):
+        self.client = client
+
+    def query(self, sql: str, params: tuple = ()) -> pd.DataFrame:
+        from google.cloud import bigquery
+        query_parameters = []
+        for name, value in params:
+            if isinstance(value, (list, tuple)):
+                element_type = _bq_type(value[0]) if value else "STRING"
+                query_parameters.append(bigquery.ArrayQueryParameter(name, element_type, list(value)))
+            else:
+                query_parameters.append(bigquery.ScalarQueryParameter(name, _bq_type(value), value))
+        job_config = bigquery.QueryJobConfig(query_parameters=query_parameters)
+        # The Storage Read API streams Arrow record batches instead of paging JSON rows
+        table = self.client.query(sql, job_config=job_config).to_arrow(create_bqstorage_client=True)
+        return arrow_to_frame(table)
+
+    def data_version(self, table_ref: str) -> str:
+        """Last modification time of a table, read from metadata without running a query."""
+        return self.client.get_table(table_ref).modified.isoformat()
+
+
+class DuckDBBackend:
+    """Runs page SQL against a local DuckDB database holding the marts."""
+
+    name = BACKEND_DUCKDB
+
+    def __init__(self, database: str = DEFAULT_DUCKDB_PATH, read_only: bool = True):
+        import duckdb
+        self.database = database
+        self.conn = duckdb.connect(database, read_only=read_only)
+
+    def query(self, sql: str, params: tuple = ()) -> pd.DataFrame:
+        # A cursor per query keeps concurrent Streamlit sessions off a shared connection
+        with self.conn.cursor() as cursor:
+            bound = {name: list(value) if isinstance(value, tuple) else value for name, value in params}
+            return arrow_to_frame(cursor.execute(bigquery_to_duckdb(sql), bound or None).fetch_arrow_table())
+
+    def data_version(self, table_ref: str) -> str:
+        """Modification time of the database file (every table changes with it)."""
+        return str(os.path.getmtime(self.database))
+
+
+class ParquetBackend(DuckDBBackend):
+    """Runs page SQL in-memory over Parquet extracts of the marts."""
+
+    name = BACKEND_PARQUET
+
+    def __init__(self, directory: str = DEFAULT_PARQUET_DIR):
+        super().__init__(":memory:", read_only=False)
+        self.directory = directory
+        # Expose <directory>/<dataset>/<table>.parquet as the view dataset.table
+        for dataset in sorted(os.listdir(directory)):
+            dataset_dir = os.path.join(directory, dataset)
+            if not os.path.isdir(dataset_dir):
+                continue
+            self.conn.execute(f'CREATE SCHEMA IF NOT EXISTS "{dataset}"')
+            for file_name in sorted(os.listdir(dataset_dir)):
+                table, ext = os.path.splitext(file_name)
+                if ext != ".parquet":
+                    continue
+                path = os.path.join(dataset_dir, file_name).replace("'", "''")
+                self.conn.execute(
+                    f'CREATE VIEW "{dataset}"."{table}" AS SELECT * FROM read_parquet(\'{path}\')'
+                )
+
+    def data_version(self, table_ref: str) -> str:
+        """Modification time of the extract backing dataset.table."""
+        dataset, table = table_ref.split(".")[-2:]
+        return str(os.path.getmtime(os.path.join(self.directory, dataset, f"{table}.parquet")))
+
+
+def create_backend(name: str, bq_client_factory=None):
+    """Builds the backend selected by name; BigQuery needs a client factory."""
+    if name == BACKEND_DUCKDB:
+        return DuckDBBackend(os.getenv("OLIST_DUCKDB_PATH", DEFAULT_DUCKDB_PATH))
+    if name == BACKEND_PARQUET:
+        return ParquetBackend(os.getenv("OLIST_PARQUET_DIR", DEFAULT_PARQUET_DIR))
+    return BigQueryBackend(bq_client_factory())
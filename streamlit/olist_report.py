@@ -1,10 +1,19 @@
 # olist_report.py
 
 import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+import numpy as np
 import pandas as pd
-from google.cloud import bigquery
-from math import radians, cos, sin, asin, sqrt
+import plotly.graph_objects as go
+from backends import BACKEND_BIGQUERY, create_backend, downcast_numerics, get_backend_name
+from query_builder import QueryParams, normalize_selection, normalize_sql, query_cache_key
+from result_cache import create_result_cache
+# haversine is defined next to the zip index that uses it and is still importable from here
+from zip_index import ZipSpatialIndex, grid_cell_degrees, haversine
 
 # -------------------------
 # Page Setup & Shared Functions
@@ -29,57 +38,461 @@ if 'selected_years' not in st.session_state:
 PROJECT_ID = st.session_state.project_id
 DATASET = st.session_state.dataset
 TABLE_FACT = f"{PROJECT_ID}.{DATASET}.fact_order_items"
+TABLE_CUBE = f"{PROJECT_ID}.{DATASET}.fact_order_cube"
+TABLE_CUSTOMER_RFM = f"{PROJECT_ID}.{DATASET}.customer_rfm"
 TABLE_CUSTOMERS = f"{PROJECT_ID}.{DATASET}.dim_customers"
 TABLE_PRODUCTS = f"{PROJECT_ID}.{DATASET}.dim_products"
 TABLE_SELLERS = f"{PROJECT_ID}.{DATASET}.dim_sellers"
 TABLE_PAYMENTS = f"{PROJECT_ID}.{DATASET}.dim_payments"
 TABLE_GEOLOCATION = f"{PROJECT_ID}.{DATASET}.dim_geolocation"
+TABLE_ZIP_INDEX = f"{PROJECT_ID}.{DATASET}.zip_spatial_index"
 TABLE_DATES = f"{PROJECT_ID}.{DATASET}.dim_dates"
 TABLE_STG_ORDERS = f"{PROJECT_ID}.m2_ingestion.order"
 TABLE_STG_CUSTOMERS = f"{PROJECT_ID}.m2_ingestion.customer"
 TABLE_STG_SELLERS = f"{PROJECT_ID}.m2_ingestion.seller"
 
+BACKEND = get_backend_name()
+
 @st.cache_resource
 def get_bq_client():
     """Initializes and caches the BigQuery client."""
+    from google.cloud import bigquery
     KEY_PATH = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
     if not KEY_PATH or not os.path.exists(KEY_PATH):
         st.error("Please set the GOOGLE_APPLICATION_CREDENTIALS environment variable.")
         st.stop()
     return bigquery.Client.from_service_account_json(KEY_PATH, location="US")
 
+@st.cache_resource
+def get_backend(name: str = BACKEND):
+    """Initializes and caches the query backend selected by OLIST_BACKEND."""
+    return create_backend(name, bq_client_factory=get_bq_client)
+
+QUERY_WORKERS = int(os.getenv("OLIST_QUERY_WORKERS", "8"))
+
+@st.cache_resource
+def get_result_cache():
+    """Initializes the on-disk result cache shared by all sessions (None if disabled)."""
+    return create_result_cache()
+
 @st.cache_data(ttl=3600)
-def run_query(sql: str) -> pd.DataFrame:
-    """Runs a SQL query and caches the result."""
-    client = get_bq_client()
+def _run_cached_query(sql: str, params: tuple, data_version: str) -> pd.DataFrame:
+    """Runs a normalized SQL query on the configured backend and caches the result.
+
+    Results are also persisted to the disk cache, so they survive restarts.
+    Both caches are keyed by the data version, so a rebuild of the marts is
+    never answered from results of the previous build.
+    """
+    disk_cache = get_result_cache()
+    key = query_cache_key(f"{BACKEND}:{data_version}:{sql}", params)
+    if disk_cache is not None:
+        df = disk_cache.get(key)
+        if df is not None:
+            return df
+    df = get_backend().query(sql, params)
+    if disk_cache is not None:
+        disk_cache.put(key, df)
+    return df
+
+def run_query(sql: str, params: tuple = ()) -> pd.DataFrame:
+    """Runs a SQL query with frozen QueryParams; equal queries share one cache entry."""
     try:
-        return client.query(sql).to_dataframe()
+        return _run_cached_query(normalize_sql(sql), tuple(params), get_data_version())
     except Exception as e:
         st.error(f"An error occurred while running a query: {e}")
         st.stop()
         return pd.DataFrame()
 
+def run_queries(queries: dict) -> dict:
+    """Runs a page's independent queries concurrently and returns their frames by name.
+
+    Each value is either a SQL string or a (sql, frozen params) tuple. A failing
+    query is reported on its own and returns an empty frame, so the rest of the
+    page still renders. Latency is roughly that of the slowest query.
+    """
+    ctx = get_script_run_ctx()
+    data_version = get_data_version()
+
+    def fetch(query):
+        add_script_run_ctx(ctx=ctx)
+        sql, params = (query, ()) if isinstance(query, str) else query
+        return _run_cached_query(normalize_sql(sql), tuple(params), data_version)
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(QUERY_WORKERS, len(queries)))) as pool:
+        futures = {name: pool.submit(fetch, query) for name, query in queries.items()}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                st.error(f"An error occurred while running query '{name}': {e}")
+                results[name] = pd.DataFrame()
+    return results
+
+# -------------------------
+# Data Layer
+# -------------------------
+FACT_SLICE_CATEGORIES = ["customer_state", "seller_state", "product_category", "payment_type", "month"]
+
+@st.cache_data(ttl=3600)
+def load_fact_slice(selected_states: tuple, selected_years: tuple) -> pd.DataFrame:
+    """Loads the pre-joined fact rows for one (states, years) selection.
+
+    Pages aggregate this frame in-process instead of sending one warehouse
+    query per chart. Pass normalized tuples so equal selections share a cache entry.
+    """
+    params = QueryParams()
+    # Filter on the fact's own partition/cluster columns so the warehouse can prune
+    state_filter = get_state_filter_sql_clause("f", selected_states, params)
+    year_filter = get_year_filter_sql_clause("f", selected_years, params)
+    sql = f"""
+    SELECT
+        f.order_id,
+        f.order_item_id,
+        c.customer_unique_id,
+        c.customer_state,
+        s.seller_id,
+        s.seller_state,
+        COALESCE(p.product_category_name_english, 'untranslated') AS product_category,
+        SAFE_CAST(p.product_weight_g AS FLOAT64) AS product_weight_g,
+        COALESCE(pay.payment_type, 'not_defined') AS payment_type,
+        d.full_date,
+        d.year,
+        FORMAT_DATE('%Y-%m', d.full_date) AS month,
+        SAFE_CAST(f.price AS FLOAT64) AS price,
+        SAFE_CAST(f.freight_value AS FLOAT64) AS freight_value,
+        SAFE_CAST(f.review_score AS FLOAT64) AS review_score,
+        f.delivery_time_days
+    FROM `{TABLE_FACT}` f
+    JOIN `{TABLE_CUSTOMERS}` c ON f.customer_id = c.customer_id
+    JOIN `{TABLE_DATES}` d ON f.order_date_key = d.date_key
+    LEFT JOIN `{TABLE_SELLERS}` s ON f.seller_id = s.seller_id
+    LEFT JOIN `{TABLE_PRODUCTS}` p ON f.product_id = p.product_id
+    LEFT JOIN `{TABLE_PAYMENTS}` pay ON f.payment_type_key = pay.payment_type_key
+    WHERE TRUE {state_filter} {year_filter}
+    """
+    df = run_query(sql, params.freeze())
+    if df.empty:
+        return df
+
+    # Compact columnar layout: low-cardinality strings as categoricals, and
+    # numerics narrowed only where lossless. Money stays float64 so sums match the warehouse.
+    for col in FACT_SLICE_CATEGORIES:
+        df[col] = df[col].astype("category")
+    narrow = ["year", "product_weight_g", "review_score", "delivery_time_days"]
+    df[narrow] = downcast_numerics(df[narrow].copy())
+    return df
+
+def get_fact_slice(selected_states, selected_years) -> pd.DataFrame:
+    """Returns the shared filtered fact working set for the current page."""
+    return load_fact_slice(normalize_selection(selected_states), normalize_selection(selected_years))
+
+# Rollups are answered from the fact_order_cube mart when every requested
+# dimension, measure and filter exists there, and from the raw fact otherwise.
+# State, year and month read the fact's denormalized columns so filters prune
+# its date partitions and state clusters.
+ROLLUP_DIMENSIONS = {
+    "customer_state": "f.customer_state",
+    "seller_state": "f.seller_state",
+    "year": "f.year",
+    "month": "FORMAT_DATE('%Y-%m', f.order_date)",
+    "product_category": "COALESCE(p.product_category_name_english, 'untranslated')",
+    "payment_type": "COALESCE(pay.payment_type, 'not_defined')",
+    "review_score": "SAFE_CAST(f.review_score AS INT64)",
+}
+CUBE_DIMENSIONS = {"customer_state", "seller_state", "year", "month", "product_category", "payment_type"}
+
+# measure -> (cube expression or None if not additive, fact expression)
+ROLLUP_MEASURES = {
+    "revenue": ("SUM(revenue)", "SUM(SAFE_CAST(f.price AS FLOAT64))"),
+    "freight": ("SUM(freight)", "SUM(SAFE_CAST(f.freight_value AS FLOAT64))"),
+    "item_count": ("SUM(item_count)", "COUNT(f.order_id)"),
+    "review_count": ("SUM(review_count)", "COUNT(f.review_score)"),
+    "avg_review_score": (
+        "SUM(review_sum) / NULLIF(SUM(review_count), 0)",
+        "AVG(SAFE_CAST(f.review_score AS FLOAT64))",
+    ),
+    "avg_delivery_days": (
+        "SUM(delivery_days_sum) / NULLIF(SUM(delivery_days_count), 0)",
+        "AVG(f.delivery_time_days)",
+    ),
+    "order_count": (None, "COUNT(DISTINCT f.order_id)"),
+}
+
+def can_use_cube(dimensions, measures, filters) -> bool:
+    """Checks whether fact_order_cube can answer a rollup exactly."""
+    return (
+        set(dimensions) <= CUBE_DIMENSIONS
+        and {k for k, v in filters.items() if v} <= CUBE_DIMENSIONS
+        and all(ROLLUP_MEASURES[m][0] is not None for m in measures)
+    )
+
+def build_rollup_sql(dimensions, measures, filters=None, params=None) -> str:
+    """Builds the SQL for a rollup, routed to the cube when it can answer it."""
+    filters = filters or {}
+    params = params if params is not None else QueryParams()
+    use_cube = can_use_cube(dimensions, measures, filters)
+    select_dims = [
+        f"{dim if use_cube else ROLLUP_DIMENSIONS[dim]} AS {dim}" for dim in dimensions
+    ]
+    select_measures = [f"{ROLLUP_MEASURES[m][0 if use_cube else 1]} AS {m}" for m in measures]
+    where = "".join(
+        params.in_filter(dim if use_cube else ROLLUP_DIMENSIONS[dim], dim, values)
+        for dim, values in sorted(filters.items())
+    )
+    if use_cube:
+        source = f"`{TABLE_CUBE}`"
+    else:
+        source = f"""`{TABLE_FACT}` f
+    JOIN `{TABLE_CUSTOMERS}` c ON f.customer_id = c.customer_id
+    JOIN `{TABLE_DATES}` d ON f.order_date_key = d.date_key
+    LEFT JOIN `{TABLE_SELLERS}` s ON f.seller_id = s.seller_id
+    LEFT JOIN `{TABLE_PRODUCTS}` p ON f.product_id = p.product_id
+    LEFT JOIN `{TABLE_PAYMENTS}` pay ON f.payment_type_key = pay.payment_type_key"""
+    group_by = f"GROUP BY {', '.join(str(i + 1) for i in range(len(dimensions)))}" if dimensions else ""
+    order_by = f"ORDER BY {', '.join(str(i + 1) for i in range(len(dimensions)))}" if dimensions else ""
+    return f"""
+    SELECT
+        {', '.join(select_dims + select_measures)}
+    FROM {source}
+    WHERE TRUE {where}
+    {group_by}
+    {order_by}
+    """
+
+def rollup_query(dimensions, measures, filters=None) -> tuple:
+    """Returns the (sql, frozen params) of a rollup, for use with run_queries."""
+    params = QueryParams()
+    sql = build_rollup_sql(list(dimensions), list(measures), filters, params)
+    return sql, params.freeze()
+
+def run_rollup(dimensions, measures, filters=None) -> pd.DataFrame:
+    """Aggregates measures by dimensions, reading the cube whenever possible.
+
+    filters maps a dimension to its selected values; an empty selection means no filter.
+    """
+    return run_query(*rollup_query(dimensions, measures, filters))
+
+# Distribution charts are bucketed in the warehouse so only the bins are
+# transferred. Buckets are equal-width over [min, max] of the value, or of
+# LN(value) for log bins (non-positive values are excluded from log bins).
+def histogram_query(values_sql: str, params: tuple, column: str, bins: int = 20,
+                    log: bool = False, bin_width=None) -> tuple:
+    """Returns (sql, params) bucketing values_sql.column into bins.
+
+    bin_width fixes the bucket width (in value units, linear bins only) instead
+    of splitting the range into a fixed number of bins.
+    """
+    value = f"LN({column})" if log else f"CAST({column} AS FLOAT64)"
+    positive = f" AND {column} > 0" if log else ""
+    if bin_width:
+        bucket = f"CAST(FLOOR((v.x - b.lo) / {float(bin_width)}) AS INT64)"
+    else:
+        bucket = (
+            f"LEAST(CAST(FLOOR(COALESCE((v.x - b.lo) / NULLIF(b.hi - b.lo, 0), 0) * {int(bins)}) AS INT64), {int(bins) - 1})"
+        )
+    sql = f"""
+    WITH v AS (
+        SELECT {value} AS x
+        FROM ({values_sql}) AS src
+        WHERE {column} IS NOT NULL{positive}
+    ),
+    b AS (
+        SELECT MIN(x) AS lo, MAX(x) AS hi FROM v
+    )
+    SELECT
+        {bucket} AS bucket,
+        COUNT(*) AS count,
+        MIN(b.lo) AS lo,
+        MIN(b.hi) AS hi
+    FROM v CROSS JOIN b
+    GROUP BY 1
+    ORDER BY 1
+    """
+    return sql, params
+
+def histogram_bins(df: pd.DataFrame, bins: int = 20, log: bool = False, bin_width=None) -> pd.DataFrame:
+    """Turns bucket counts into bin_start, bin_end, bin_label and count columns."""
+    if df.empty:
+        return pd.DataFrame(columns=["bin_start", "bin_end", "bin_label", "count"])
+    lo, hi = float(df["lo"].iloc[0]), float(df["hi"].iloc[0])
+    width = float(bin_width) if bin_width else ((hi - lo) / bins or 1.0)
+    bucket = df["bucket"].to_numpy(dtype=np.float64)
+    start, end = lo + bucket * width, lo + (bucket + 1) * width
+    if log:
+        start, end = np.exp(start), np.exp(end)
+    if bin_width == 1 and not log:
+        labels = [f"{s:,.0f}" for s in start]
+    else:
+        labels = [f"{s:,.4g}-{e:,.4g}" for s, e in zip(start, end)]
+    return pd.DataFrame({"bin_start": start, "bin_end": end, "bin_label": labels, "count": df["count"].to_numpy()})
+
+def run_histogram(values_sql: str, params: tuple, column: str, bins: int = 20,
+                  log: bool = False, bin_width=None) -> pd.DataFrame:
+    """Histogram of one column of a query, computed by the query engine."""
+    df = run_query(*histogram_query(values_sql, params, column, bins, log, bin_width))
+    return histogram_bins(df, bins, log, bin_width)
+
+# Map layers are aggregated in the warehouse into the grid cells of the chosen
+# zoom level (zip_index.grid_cell_degrees). Raw points are only returned for
+# small selections.
+MAX_MAP_POINTS = 5000
+# Delivery route maps draw at most this many routes, fetched as a sample
+MAX_MAP_ROUTES = 5000
+
+def spatial_bin_query(points_sql: str, params: tuple, zoom: int, value_column=None) -> tuple:
+    """Wraps a query returning lat/lon rows into a per-cell count (and sum) query.
+
+    Returns (sql, params) with the cell centroid as lat/lon, point_count and,
+    when value_column is given, its sum under the same name.
+    """
+    value_sum = f", SUM({value_column}) AS {value_column}" if value_column else ""
+    sql = f"""
+    SELECT
+        FLOOR(lat / @cell_deg) AS cell_y,
+        FLOOR(lon / @cell_deg) AS cell_x,
+        AVG(lat) AS lat,
+        AVG(lon) AS lon,
+        COUNT(*) AS point_count{value_sum}
+    FROM ({points_sql}) AS points
+    WHERE lat IS NOT NULL AND lon IS NOT NULL
+    GROUP BY 1, 2
+    """
+    return sql, tuple(sorted(params + (("cell_deg", grid_cell_degrees(zoom)),)))
+
+def run_spatial_bins(points_sql: str, params: tuple, zoom: int, value_column=None,
+                     max_points: int = MAX_MAP_POINTS) -> tuple:
+    """Returns (frame, binned): grid cells for the zoom level, or the raw points
+    themselves (with point_count = 1) when the selection has at most max_points."""
+    df_bins = run_query(*spatial_bin_query(points_sql, params, zoom, value_column))
+    if df_bins.empty or df_bins["point_count"].sum() > max_points:
+        return df_bins, True
+    df_points = run_query(points_sql, params)
+    df_points["point_count"] = 1
+    return df_points, False
+
 # -------------------------
 # Utility Functions
 # -------------------------
-def haversine(lon1, lat1, lon2, lat2):
-    """Calculate the great circle distance in km between two points."""
-    lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
-    dlon = lon2 - lon1
-    dlat = lat2 - lat1
-    a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
-    c = 2 * asin(sqrt(a))
-    r = 6371  # Earth radius in km
-    return c * r
+# Simplified state boundaries bundled with the app (see scripts/build_state_geometry.py)
+STATE_GEOMETRY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "brazil_states.geojson")
+
+
+@st.cache_resource
+def _read_state_geometry() -> dict:
+    with open(STATE_GEOMETRY_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+def load_state_geometry():
+    """Loads the bundled Brazil states GeoJSON once per process; None if the asset is missing.
+
+    Failures raise inside the cached reader and are therefore not cached, so a
+    build of the asset is picked up without restarting the app.
+    """
+    try:
+        return _read_state_geometry()
+    except (OSError, ValueError):
+        return None
+
+# Distance bands (km) and colors used to draw delivery routes
+ROUTE_DISTANCE_BINS = [0, 100, 500, 1000, 2000, float("inf")]
+ROUTE_BIN_COLORS = ["#fdd49e", "#fdbb84", "#fc8d59", "#e34a33", "#b30000"]
+
+
+def route_traces(df, bins=ROUTE_DISTANCE_BINS, colors=ROUTE_BIN_COLORS, max_routes: int = MAX_MAP_ROUTES):
+    """Builds one line trace per distance band instead of one trace per route.
+
+    Each route contributes its two endpoints followed by a gap (NaN, sent to
+    the browser as null), so a single trace draws many disconnected segments.
+    Only the first max_routes routes are drawn. Expects seller_lon/lat,
+    cust_lon/lat, distance_km and order_id columns.
+    """
+    df = df.head(max_routes)
+    labels = [
+        f"{lo:,.0f}+ km" if hi == float("inf") else f"{lo:,.0f}-{hi:,.0f} km"
+        for lo, hi in zip(bins[:-1], bins[1:])
+    ]
+    bands = pd.cut(df["distance_km"], bins=bins, labels=labels, include_lowest=True)
+    traces = []
+    for label, color in zip(labels, colors):
+        band = df[(bands == label).to_numpy()]
+        if band.empty:
+            continue
+        gap = np.full(len(band), np.nan)
+        lon = np.column_stack([band["seller_lon"], band["cust_lon"], gap]).ravel()
+        lat = np.column_stack([band["seller_lat"], band["cust_lat"], gap]).ravel()
+        hover = (
+            "Order ID: " + band["order_id"].astype(str)
+            + "<br>Distance: " + band["distance_km"].map("{:.1f} km".format)
+        ).to_numpy()
+        text = np.column_stack([hover, hover, np.full(len(band), "")]).ravel()
+        traces.append(go.Scattermapbox(
+            mode="lines",
+            lon=lon,
+            lat=lat,
+            line=dict(width=2, color=color),
+            name=f"{label} ({len(band):,})",
+            hoverinfo="text",
+            text=text,
+        ))
+    return traces
 
 # -------------------------
 # Filters
 # -------------------------
-def create_state_filter(table_customers_path):
+# Every filter domain is fetched by one query and kept in process memory for
+# the current data version, so filter widgets never query the warehouse.
+# The version is the fact table's modification time, re-checked every minute.
+DATA_VERSION_TTL = 60
+FILTER_DOMAINS_SQL = f"""
+SELECT 'customer_state' AS domain, customer_state AS value FROM `{TABLE_CUSTOMERS}` GROUP BY 2
+UNION ALL
+SELECT 'seller_state', seller_state FROM `{TABLE_SELLERS}` GROUP BY 2
+UNION ALL
+SELECT 'year', CAST(year AS STRING) FROM `{TABLE_DATES}` WHERE year BETWEEN 2016 AND 2025 GROUP BY 2
+UNION ALL
+SELECT 'product_category', COALESCE(product_category_name_english, 'untranslated') FROM `{TABLE_PRODUCTS}` GROUP BY 2
+UNION ALL
+SELECT 'payment_type', payment_type FROM `{TABLE_PAYMENTS}` GROUP BY 2
+"""
+
+@st.cache_data(ttl=DATA_VERSION_TTL)
+def get_data_version() -> str:
+    """Returns the data version of the marts; falls back to the current hour when
+    the backend cannot report one, so domains still refresh like query results."""
+    try:
+        return get_backend().data_version(TABLE_FACT)
+    except Exception:
+        return f"hour-{int(time.time() // 3600)}"
+
+@st.cache_resource(max_entries=2)
+def load_filter_domains(data_version: str, sql: str) -> dict:
+    """Loads all filter domains for a data version as {domain: sorted tuple of values}."""
+    df = run_query(sql)
+    domains = {}
+    for domain, values in df.dropna().groupby("domain", observed=True)["value"]:
+        if domain == "year":
+            values = values.astype(int)
+        domains[domain] = tuple(sorted(values.tolist()))
+    return domains
+
+@st.cache_resource(max_entries=2)
+def load_zip_index(data_version: str) -> ZipSpatialIndex:
+    """Loads the zip prefix spatial index for a data version."""
+    return ZipSpatialIndex(run_query(f"SELECT * FROM `{TABLE_ZIP_INDEX}`"))
+
+def get_zip_index() -> ZipSpatialIndex:
+    """Returns the zip prefix spatial index of the current data version."""
+    return load_zip_index(get_data_version())
+
+def get_filter_domain(name: str) -> list:
+    """Returns the options of one filter domain (customer_state, seller_state, year,
+    product_category or payment_type)."""
+    return list(load_filter_domains(get_data_version(), FILTER_DOMAINS_SQL).get(name, ()))
+
+def create_state_filter():
     """Creates a multiselect filter for customer states."""
-    sql = f"SELECT DISTINCT customer_state FROM `{table_customers_path}` ORDER BY customer_state"
-    df_states = run_query(sql)
-    all_states = df_states['customer_state'].tolist()
+    all_states = get_filter_domain("customer_state")
 
     selected_states = st.multiselect(
         "Filter by Customer State:",
@@ -87,20 +500,15 @@ def create_state_filter(table_customers_path):
         default=all_states,
         help="Select one or more states to filter the reports."
     )
-    return selected_states
+    return normalize_selection(selected_states, all_states)
 
-def get_state_filter_sql_clause(alias, selected_states):
-    """Generates the SQL WHERE clause for state filters."""
-    if selected_states:
-        states = ", ".join([f"'{s}'" for s in selected_states])
-        return f" AND {alias}.customer_state IN ({states})"
-    return ""
+def get_state_filter_sql_clause(alias, selected_states, params):
+    """Generates the parameterized SQL WHERE clause for state filters."""
+    return params.in_filter(f"{alias}.customer_state", "customer_states", selected_states)
 
-def create_year_filter(table_dates_path):
+def create_year_filter():
     """Creates a multiselect filter for order years (2016–2025)."""
-    sql = f"SELECT DISTINCT year FROM `{table_dates_path}` WHERE year BETWEEN 2016 AND 2025 ORDER BY year"
-    df_years = run_query(sql)
-    all_years = df_years['year'].tolist()
+    all_years = get_filter_domain("year")
 
     selected_years = st.multiselect(
         "Filter by Year:",
@@ -108,14 +516,26 @@ def create_year_filter(table_dates_path):
         default=all_years,
         help="Select one or more years to filter the reports."
     )
-    return selected_years
+    return normalize_selection(selected_years, all_years)
+
+def get_year_filter_sql_clause(alias, selected_years, params):
+    """Generates the parameterized SQL WHERE clause for year filters."""
+    return params.in_filter(f"{alias}.year", "years", selected_years)
+
+def create_seller_state_filter():
+    """Creates a multiselect filter for seller states."""
+    all_states = get_filter_domain("seller_state")
+
+    selected_states = st.multiselect(
+        "Filter by Seller State",
+        options=all_states,
+        default=all_states
+    )
+    return normalize_selection(selected_states, all_states)
 
-def get_year_filter_sql_clause(alias, selected_years):
-    """Generates the SQL WHERE clause for year filters."""
-    if selected_years:
-        years = ", ".join([str(y) for y in selected_years])
-        return f" AND {alias}.year IN ({years})"
-    return ""
+def get_seller_state_filter_sql_clause(alias, selected_states, params):
+    """Generates the parameterized SQL WHERE clause for seller state filters."""
+    return params.in_filter(f"{alias}.seller_state", "seller_states", selected_states)
 
 # -------------------------
 # Main Page Content
@@ -128,6 +548,8 @@ st.markdown("### Choose a report from the sidebar to begin your analysis.")
 # -------------------------
 with st.sidebar:
     st.header("BigQuery Connection Settings")
+    if BACKEND != BACKEND_BIGQUERY:
+        st.info(f"Queries run on the local **{BACKEND}** backend (OLIST_BACKEND).")
 
     project_id_input = st.text_input(
         "Enter your Google Cloud Project ID:",
@@ -148,13 +570,21 @@ with st.sidebar:
         st.session_state.dataset = dataset_input
         st.rerun()
 
-    if st.session_state.project_id:
-        st.success(f"Connected to **{st.session_state.project_id}** and dataset **{st.session_state.dataset}**.")
+    if st.session_state.project_id or BACKEND != BACKEND_BIGQUERY:
+        st.success(f"Connected to **{st.session_state.project_id or BACKEND}** and dataset **{st.session_state.dataset}**.")
 
         # Filters
         st.subheader("Filters")
-        st.session_state.selected_states = create_state_filter(TABLE_CUSTOMERS)
-        st.session_state.selected_years = create_year_filter(TABLE_DATES)
+        st.session_state.selected_states = create_state_filter()
+        st.session_state.selected_years = create_year_filter()
 
     else:
-        st.warning("Please enter your Google Cloud Project ID in the sidebar to proceed.")
\ No newline at end of file
+        st.warning("Please enter your Google Cloud Project ID in the sidebar to proceed.")
+
+    disk_cache = get_result_cache()
+    if disk_cache is not None:
+        cache_stats = disk_cache.stats()
+        st.caption(
+            f"Query cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses, "
+            f"{cache_stats['entries']} entries ({cache_stats['bytes'] / 1024 / 1024:.1f} MB)"
+        )
\ No newline at end of file
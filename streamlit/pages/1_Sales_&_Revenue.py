@@ -3,7 +3,7 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from olist_report import run_query, TABLE_FACT, TABLE_PAYMENTS, TABLE_DATES, TABLE_CUSTOMERS, create_state_filter, get_state_filter_sql_clause, create_year_filter, get_year_filter_sql_clause
+from olist_report import create_state_filter, create_year_filter, get_fact_slice
 
 # -------------------------
 # Page Content
@@ -11,32 +11,28 @@ from olist_report import run_query, TABLE_FACT, TABLE_PAYMENTS, TABLE_DATES, TAB
 st.title("Sales & Revenue Insights")
 
 # Create the customer state filter UI
-selected_states = create_state_filter(TABLE_CUSTOMERS)
-selected_years = create_year_filter(TABLE_DATES)
+selected_states = create_state_filter()
+selected_years = create_year_filter()
 st.session_state.selected_states = selected_states
 st.session_state.selected_years = selected_years
 
+# All charts on this page aggregate the same filtered fact slice in-process
+df_fact = get_fact_slice(selected_states, selected_years)
+
 # Use tabs to organize content within this page
 tab1, tab2 = st.tabs(["Trends & KPIs", "Analysis by Channel"])
 
 with tab1:
     st.header("Overall Sales Performance")
 
-    state_filter = get_state_filter_sql_clause("c", selected_states)
-    year_filter = get_year_filter_sql_clause("d", st.session_state.selected_years)
-    sql_trends = f"""
-    SELECT
-        FORMAT_DATE('%Y-%m', d.full_date) AS month,
-        SUM(SAFE_CAST(f.price AS FLOAT64)) AS total_revenue,
-        COUNT(DISTINCT f.order_id) AS total_orders
-    FROM `{TABLE_FACT}` f
-    JOIN `{TABLE_DATES}` d ON f.order_date_key = d.date_key
-    JOIN `{TABLE_CUSTOMERS}` c ON f.customer_id = c.customer_id
-    WHERE TRUE {state_filter} {year_filter}
-    GROUP BY month
-    ORDER BY month
-    """
-    df_trends = run_query(sql_trends)
+    if df_fact.empty:
+        df_trends = pd.DataFrame(columns=["month", "total_revenue", "total_orders"])
+    else:
+        df_trends = df_fact.groupby("month", observed=True).agg(
+            total_revenue=("price", "sum"),
+            total_orders=("order_id", "nunique")
+        ).reset_index().sort_values("month")
+        df_trends["month"] = df_trends["month"].astype(str)
 
     if not df_trends.empty:
         # Filter out the incomplete latest month for trend analysis
@@ -83,24 +79,12 @@ with tab1:
 with tab2:
     st.header("Revenue by Payment Type")
     
-    state_filter = get_state_filter_sql_clause("c", selected_states)
-    year_filter = get_year_filter_sql_clause("d", st.session_state.selected_years)
-    sql_payments = f"""
-    SELECT
-        p.payment_type,
-        SUM(SAFE_CAST(f.price AS FLOAT64)) AS total_revenue
-    FROM `{TABLE_FACT}` f
-    JOIN `{TABLE_PAYMENTS}` p
-        ON f.payment_type_key = p.payment_type_key
-    JOIN `{TABLE_CUSTOMERS}` c
-        ON f.customer_id = c.customer_id
-    JOIN `{TABLE_DATES}` d
-        ON f.order_date_key = d.date_key
-    WHERE TRUE {state_filter} {year_filter}
-    GROUP BY p.payment_type
-    ORDER BY total_revenue DESC
-    """
-    df_payments = run_query(sql_payments)
+    if df_fact.empty:
+        df_payments = pd.DataFrame(columns=["payment_type", "total_revenue"])
+    else:
+        df_payments = df_fact.groupby("payment_type", observed=True).agg(
+            total_revenue=("price", "sum")
+        ).reset_index().sort_values("total_revenue", ascending=False)
     
     if not df_payments.empty:
         fig_payments = px.pie(df_payments, values='total_revenue', names='payment_type',
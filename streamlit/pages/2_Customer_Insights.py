@@ -3,7 +3,8 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from olist_report import run_query, TABLE_FACT, TABLE_CUSTOMERS, TABLE_DATES, create_state_filter, get_state_filter_sql_clause, create_year_filter, get_year_filter_sql_clause
+from query_builder import QueryParams
+from olist_report import run_queries, histogram_query, histogram_bins, TABLE_FACT, TABLE_CUSTOMER_RFM, TABLE_CUSTOMERS, TABLE_DATES, create_state_filter, get_state_filter_sql_clause, create_year_filter, get_year_filter_sql_clause
 
 # -------------------------
 # Page Content
@@ -11,23 +12,22 @@ from olist_report import run_query, TABLE_FACT, TABLE_CUSTOMERS, TABLE_DATES, cr
 st.title("Customer Insights")
 
 # Create the customer state filter UI
-selected_states = create_state_filter(TABLE_CUSTOMERS)
-selected_years = create_year_filter(TABLE_DATES)
+selected_states = create_state_filter()
+selected_years = create_year_filter()
 st.session_state.selected_states = selected_states
 st.session_state.selected_years = selected_years
 
 # Use tabs for different sections of analysis
 tab1, tab2 = st.tabs(["Customer Overview", "Customer Segmentation"])
 
-# Query for RFM, which is used in both tabs
-state_filter = get_state_filter_sql_clause("c", selected_states)
-year_filter = get_year_filter_sql_clause("d", st.session_state.selected_years)
-sql_rfm = f"""
+# Queries for the overview tab (state and year filters apply)
+params = QueryParams()
+state_filter = get_state_filter_sql_clause("c", selected_states, params)
+year_filter = get_year_filter_sql_clause("d", st.session_state.selected_years, params)
+sql_customer_orders = f"""
 SELECT
     c.customer_unique_id,
-    DATE_DIFF(CURRENT_DATE(), MAX(d.full_date), DAY) AS Recency,
-    COUNT(DISTINCT f.order_id) AS Frequency,
-    SUM(SAFE_CAST(f.price AS FLOAT64)) AS Monetary
+    COUNT(DISTINCT f.order_id) AS Frequency
 FROM `{TABLE_FACT}` f
 JOIN `{TABLE_CUSTOMERS}` c
     ON f.customer_id = c.customer_id
@@ -36,15 +36,48 @@ JOIN `{TABLE_DATES}` d
 WHERE TRUE {state_filter} {year_filter}
 GROUP BY c.customer_unique_id
 """
-df_rfm = run_query(sql_rfm)
+sql_overview = f"""
+SELECT
+    COUNT(DISTINCT c.customer_unique_id) AS total_customers,
+    COUNT(DISTINCT f.order_id) AS total_orders
+FROM `{TABLE_FACT}` f
+JOIN `{TABLE_CUSTOMERS}` c
+    ON f.customer_id = c.customer_id
+JOIN `{TABLE_DATES}` d
+    ON f.order_date_key = d.date_key
+WHERE TRUE {state_filter} {year_filter}
+"""
+
+# Query for RFM segments, precomputed per customer in the customer_rfm mart
+rfm_params = QueryParams()
+rfm_state_filter = get_state_filter_sql_clause("r", selected_states, rfm_params)
+sql_rfm_segments = f"""
+SELECT
+    r.segment,
+    COUNT(*) AS customers,
+    AVG(r.recency_days) AS avg_recency_days,
+    AVG(r.frequency) AS avg_frequency,
+    AVG(r.monetary) AS avg_monetary,
+    SUM(r.monetary) AS total_monetary
+FROM `{TABLE_CUSTOMER_RFM}` r
+WHERE TRUE {rfm_state_filter}
+GROUP BY r.segment
+ORDER BY customers DESC
+"""
+frames = run_queries({
+    "overview": (sql_overview, params.freeze()),
+    "frequency": histogram_query(sql_customer_orders, params.freeze(), "Frequency", bin_width=1),
+    "rfm_segments": (sql_rfm_segments, rfm_params.freeze()),
+})
 
 with tab1:
     st.header("Overall Customer Metrics")
     
     # Calculate and display metrics
-    total_customers = df_rfm.shape[0] if not df_rfm.empty else 0
-    total_orders = df_rfm['Frequency'].sum() if not df_rfm.empty else 0
-    avg_orders_per_customer = df_rfm['Frequency'].mean() if not df_rfm.empty else 0
+    df_overview = frames["overview"]
+    total_customers = int(df_overview['total_customers'].iloc[0]) if not df_overview.empty else 0
+    total_orders = int(df_overview['total_orders'].iloc[0]) if not df_overview.empty else 0
+    avg_orders_per_customer = total_orders / total_customers if total_customers else 0
     
     # Use st.columns to display metrics in a row
     col1, col2, col3 = st.columns(3)
@@ -59,11 +92,12 @@ with tab1:
         st.metric("Average Orders per Customer", f"{avg_orders_per_customer:.2f}")
 
     # Add the bar chart for order frequency
-    if not df_rfm.empty:
+    df_frequency = histogram_bins(frames["frequency"], bin_width=1)
+    if not df_frequency.empty:
         st.subheader("Frequency of Unique Orders Per Customer")
-        fig_frequency = px.histogram(df_rfm, x="Frequency",
-                                     title="Distribution of Order Frequency",
-                                     labels={"Frequency": "Number of Unique Orders"})
+        fig_frequency = px.bar(df_frequency, x="bin_label", y="count",
+                               title="Distribution of Order Frequency",
+                               labels={"bin_label": "Number of Unique Orders", "count": "Customers"})
         st.plotly_chart(fig_frequency, use_container_width=True)
     else:
         st.warning("No data found for the customer overview.")
@@ -71,19 +105,23 @@ with tab1:
 with tab2:
     st.header("Customer Segmentation (RFM)")
     
-    if not df_rfm.empty:
-        # Create RFM segments (simplified for this example)
-        # Using .rank(method='first', pct=True) to avoid issues with duplicates
-        df_rfm['R_Score'] = df_rfm['Recency'].rank(method='first', pct=True, ascending=False)
-        df_rfm['F_Score'] = df_rfm['Frequency'].rank(method='first', pct=True)
-        df_rfm['M_Score'] = df_rfm['Monetary'].rank(method='first', pct=True)
+    df_segments = frames["rfm_segments"]
+    if not df_segments.empty:
+        st.caption("Segments are scored on each customer's full order history; the year filter does not apply.")
 
-        # Plot the distribution of RFM scores
-        st.subheader("RFM Score Distribution")
-        fig_rfm = px.scatter(df_rfm, x='Frequency', y='Monetary', color='R_Score',
-                             labels={'Frequency': 'Frequency (Orders)', 'Monetary': 'Monetary (Revenue)', 'R_Score': 'Recency Score'},
-                             hover_name='customer_unique_id',
-                             title="RFM Analysis Scatter Plot")
+        # Plot the RFM segments: average frequency vs. spend, sized by customer count
+        st.subheader("RFM Segments")
+        fig_rfm = px.scatter(df_segments, x='avg_frequency', y='avg_monetary', size='customers', color='segment',
+                             labels={'avg_frequency': 'Avg. Frequency (Orders)', 'avg_monetary': 'Avg. Monetary (Revenue)',
+                                     'segment': 'Segment', 'customers': 'Customers'},
+                             hover_data={'avg_recency_days': ':.0f'},
+                             size_max=60,
+                             title="RFM Analysis by Segment")
         st.plotly_chart(fig_rfm, use_container_width=True)
+
+        fig_segments = px.bar(df_segments, x='segment', y='customers', color='segment',
+                              labels={'segment': 'Segment', 'customers': 'Customers'},
+                              title="Customers per Segment")
+        st.plotly_chart(fig_segments, use_container_width=True)
     else:
-        st.warning("No data found for RFM analysis with the current filter selection.")
\ No newline at end of file
+        st.warning("No data found for RFM analysis with the current filter selection.")
@@ -3,7 +3,8 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from olist_report import run_query, TABLE_FACT, TABLE_PRODUCTS, TABLE_DATES, TABLE_CUSTOMERS, create_state_filter, get_state_filter_sql_clause, create_year_filter, get_year_filter_sql_clause
+from query_builder import normalize_selection
+from olist_report import run_rollup, create_state_filter, create_year_filter, get_filter_domain
 
 # -------------------------
 # Page Content
@@ -11,57 +12,34 @@ from olist_report import run_query, TABLE_FACT, TABLE_PRODUCTS, TABLE_DATES, TAB
 st.title("Product Performance")
 
 # Create the filters UI
-selected_states = create_state_filter(TABLE_CUSTOMERS)
-selected_years = create_year_filter(TABLE_DATES)
+selected_states = create_state_filter()
+selected_years = create_year_filter()
 
-# Query for product categories to populate the filter
-sql_categories = f"""
-    SELECT DISTINCT COALESCE(product_category_name_english, 'untranslated') AS product_category
-    FROM `{TABLE_PRODUCTS}`
-    ORDER BY product_category
-"""
-df_categories = run_query(sql_categories)
-all_categories = df_categories['product_category'].tolist()
-selected_categories = st.multiselect("Select Product Category", all_categories, default=all_categories)
-
-# Helper function for the new product category filter
-def get_category_filter_sql_clause(alias, selected_categories):
-    if not selected_categories:
-        return ""
-    category_list = ', '.join([f"'{cat}'" for cat in selected_categories])
-    return f"AND COALESCE({alias}.product_category_name_english, 'untranslated') IN ({category_list})"
+# Product categories for the filter come from the shared filter domains
+all_categories = get_filter_domain("product_category")
+selected_categories = normalize_selection(
+    st.multiselect("Select Product Category", all_categories, default=all_categories),
+    all_categories
+)
 
 st.session_state.selected_states = selected_states
 st.session_state.selected_years = selected_years
 
+rollup_filters = {
+    "customer_state": selected_states,
+    "year": selected_years,
+    "product_category": selected_categories,
+}
+
 # Use tabs to organize content
 tab1, tab2 = st.tabs(["Sales Trends", "Top Products"])
 
 with tab1:
     st.header("Monthly Sales Trends by Product Category")
 
-    state_filter = get_state_filter_sql_clause("c", selected_states)
-    year_filter = get_year_filter_sql_clause("d", st.session_state.selected_years)
-    category_filter = get_category_filter_sql_clause("p", selected_categories)
-
-    sql_trends = f"""
-    SELECT
-        FORMAT_DATE('%Y-%m', d.full_date) AS month,
-        COALESCE(p.product_category_name_english, 'untranslated') AS product_category,
-        SUM(SAFE_CAST(f.price AS FLOAT64)) AS total_revenue,
-        COUNT(DISTINCT f.order_id) AS total_orders
-    FROM `{TABLE_FACT}` f
-    JOIN `{TABLE_PRODUCTS}` p
-        ON f.product_id = p.product_id
-    JOIN `{TABLE_DATES}` d
-        ON f.order_date_key = d.date_key
-    JOIN `{TABLE_CUSTOMERS}` c
-        ON f.customer_id = c.customer_id
-    WHERE TRUE {state_filter} {year_filter} {category_filter}
-    GROUP BY 1, 2
-    ORDER BY 1, 3 DESC
-    """
-    df_trends = run_query(sql_trends)
+    # Distinct order counts are not additive, so this rollup is served by the fact table
+    df_trends = run_rollup(["month", "product_category"], ["revenue", "order_count"], rollup_filters)
+    df_trends = df_trends.rename(columns={"revenue": "total_revenue", "order_count": "total_orders"})
 
     if not df_trends.empty:
         # Filter out the incomplete latest month for trend analysis
@@ -90,49 +68,15 @@ with tab1:
 with tab2:
     st.header("Top 10 Product Categories")
     
-    # Query for top products by revenue
-    state_filter = get_state_filter_sql_clause("c", selected_states)
-    year_filter = get_year_filter_sql_clause("d", st.session_state.selected_years)
-    category_filter = get_category_filter_sql_clause("p", selected_categories)
-    sql_top_revenue = f"""
-    SELECT
-        COALESCE(p.product_category_name_english, 'untranslated') AS product_category,
-        SUM(SAFE_CAST(f.price AS FLOAT64)) AS total_revenue
-    FROM `{TABLE_FACT}` f
-    JOIN `{TABLE_PRODUCTS}` p
-        ON f.product_id = p.product_id
-    JOIN `{TABLE_DATES}` d
-        ON f.order_date_key = d.date_key
-    JOIN `{TABLE_CUSTOMERS}` c
-        ON f.customer_id = c.customer_id
-    WHERE TRUE {state_filter} {year_filter} {category_filter}
-    GROUP BY 1
-    ORDER BY 2 DESC
-    LIMIT 10
-    """
-    df_top_revenue = run_query(sql_top_revenue)
+    # Top products by revenue
+    df_top_revenue = run_rollup(["product_category"], ["revenue"], rollup_filters)
+    df_top_revenue = df_top_revenue.rename(columns={"revenue": "total_revenue"})
+    df_top_revenue = df_top_revenue.sort_values("total_revenue", ascending=False).head(10)
 
-    # Query for top products by units sold
-    state_filter = get_state_filter_sql_clause("c", selected_states)
-    year_filter = get_year_filter_sql_clause("d", st.session_state.selected_years)
-    category_filter = get_category_filter_sql_clause("p", selected_categories)
-    sql_top_units = f"""
-    SELECT
-        COALESCE(p.product_category_name_english, 'untranslated') AS product_category,
-        COUNT(f.order_id) AS total_units_sold
-    FROM `{TABLE_FACT}` f
-    JOIN `{TABLE_PRODUCTS}` p
-        ON f.product_id = p.product_id
-    JOIN `{TABLE_DATES}` d
-        ON f.order_date_key = d.date_key
-    JOIN `{TABLE_CUSTOMERS}` c
-        ON f.customer_id = c.customer_id
-    WHERE TRUE {state_filter} {year_filter} {category_filter}
-    GROUP BY 1
-    ORDER BY 2 DESC
-    LIMIT 10
-    """
-    df_top_units = run_query(sql_top_units)
+    # Top products by units sold
+    df_top_units = run_rollup(["product_category"], ["item_count"], rollup_filters)
+    df_top_units = df_top_units.rename(columns={"item_count": "total_units_sold"})
+    df_top_units = df_top_units.sort_values("total_units_sold", ascending=False).head(10)
     
     col1, col2 = st.columns(2)
     
@@ -3,10 +3,10 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
+from query_builder import QueryParams
 from olist_report import (
-    run_query,
-    TABLE_FACT,
-    TABLE_CUSTOMERS,
+    run_queries,
+    rollup_query,
     TABLE_STG_ORDERS,
     TABLE_STG_CUSTOMERS,
     TABLE_DATES,
@@ -22,34 +22,74 @@ from olist_report import (
 st.title("Order Fulfillment & Delivery")
 
 # Create the customer state and year filter UI
-selected_states = create_state_filter(TABLE_CUSTOMERS)
-selected_years = create_year_filter(TABLE_DATES)
+selected_states = create_state_filter()
+selected_years = create_year_filter()
 st.session_state.selected_states = selected_states
 st.session_state.selected_years = selected_years
 
+# -------------------------
+# Queries
+# -------------------------
+# All queries use the customer state and year filter and are submitted together.
+rollup_filters = {"customer_state": selected_states, "year": selected_years}
+
+# We must query the raw staging table for this, as the `order_estimated_delivery_date`
+# is not available in the fact table.
+params = QueryParams()
+state_filter = get_state_filter_sql_clause("c", selected_states, params)
+year_filter = get_year_filter_sql_clause("d", selected_years, params)
+sql_late_delivery = f"""
+SELECT
+    CAST(SUM(CASE WHEN DATE(o.order_delivered_customer_date) > DATE(o.order_estimated_delivery_date) THEN 1 ELSE 0 END) AS FLOAT64) / COUNT(o.order_id) AS late_rate
+FROM `{TABLE_STG_ORDERS}` o
+JOIN `{TABLE_STG_CUSTOMERS}` c
+    ON o.customer_id = c.customer_id
+JOIN `{TABLE_DATES}` d
+    ON DATE(o.order_purchase_timestamp) = d.full_date
+WHERE o.order_status = 'delivered'
+AND o.order_delivered_customer_date IS NOT NULL
+AND o.order_estimated_delivery_date IS NOT NULL
+{state_filter} {year_filter}
+"""
+sql_late_breakdown = f"""
+SELECT
+    FORMAT_DATE('%Y-%m', DATE(o.order_delivered_customer_date)) AS month,
+    CASE
+        WHEN DATE_DIFF(DATE(o.order_delivered_customer_date), DATE(o.order_estimated_delivery_date), DAY) <= 5 THEN '1-5 days late'
+        WHEN DATE_DIFF(DATE(o.order_delivered_customer_date), DATE(o.order_estimated_delivery_date), DAY) <= 10 THEN '6-10 days late'
+        WHEN DATE_DIFF(DATE(o.order_delivered_customer_date), DATE(o.order_estimated_delivery_date), DAY) <= 15 THEN '11-15 days late'
+        WHEN DATE_DIFF(DATE(o.order_delivered_customer_date), DATE(o.order_estimated_delivery_date), DAY) <= 20 THEN '16-20 days late'
+        ELSE '>20 days late'
+    END AS days_late_category,
+    COUNT(o.order_id) AS num_late_orders
+FROM `{TABLE_STG_ORDERS}` o
+JOIN `{TABLE_STG_CUSTOMERS}` c
+    ON o.customer_id = c.customer_id
+JOIN `{TABLE_DATES}` d
+    ON DATE(o.order_purchase_timestamp) = d.full_date
+WHERE
+    o.order_status = 'delivered'
+    AND o.order_delivered_customer_date IS NOT NULL
+    AND o.order_estimated_delivery_date IS NOT NULL
+    AND DATE(o.order_delivered_customer_date) > DATE(o.order_estimated_delivery_date)
+    {state_filter} {year_filter}
+GROUP BY 1, 2
+ORDER BY 1, 2
+"""
+frames = run_queries({
+    "delivery_trend": rollup_query(["month"], ["avg_delivery_days"], rollup_filters),
+    "delivery_by_state": rollup_query(["customer_state"], ["avg_delivery_days"], rollup_filters),
+    "late_delivery": (sql_late_delivery, params.freeze()),
+    "late_breakdown": (sql_late_breakdown, params.freeze()),
+})
+
 # Use tabs to organize content
 tab1, tab2, tab3 = st.tabs(["Delivery Times", "Performance by Location", "Delivery Rates"])
 
 with tab1:
     st.header("Overall Delivery Time Trend")
 
-    # This query uses the customer state and year filter.
-    state_filter = get_state_filter_sql_clause("c", selected_states)
-    year_filter = get_year_filter_sql_clause("d", st.session_state.selected_years)
-    sql_delivery_trend = f"""
-    SELECT
-        FORMAT_DATE('%Y-%m', d.full_date) AS month,
-        AVG(f.delivery_time_days) AS avg_delivery_days
-    FROM `{TABLE_FACT}` f
-    JOIN `{TABLE_DATES}` d
-        ON f.order_date_key = d.date_key
-    JOIN `{TABLE_CUSTOMERS}` c
-        ON f.customer_id = c.customer_id
-    WHERE TRUE {state_filter} {year_filter}
-    GROUP BY 1
-    ORDER BY 1
-    """
-    df_delivery_trend = run_query(sql_delivery_trend)
+    df_delivery_trend = frames["delivery_trend"]
     
     if not df_delivery_trend.empty:
         fig_trend = px.line(df_delivery_trend, x="month", y="avg_delivery_days",
@@ -62,25 +102,10 @@ with tab1:
 with tab2:
     st.header("Average Delivery Time by Customer State")
 
-    # This query uses the customer state and year filter.
-    state_filter = get_state_filter_sql_clause("c", selected_states)
-    year_filter = get_year_filter_sql_clause("d", st.session_state.selected_years)
-    sql_delivery_by_state = f"""
-    SELECT
-        c.customer_state,
-        AVG(f.delivery_time_days) AS avg_delivery_days
-    FROM `{TABLE_FACT}` f
-    JOIN `{TABLE_DATES}` d
-        ON f.order_date_key = d.date_key
-    JOIN `{TABLE_CUSTOMERS}` c
-        ON f.customer_id = c.customer_id
-    WHERE TRUE {state_filter} {year_filter}
-    GROUP BY 1
-    ORDER BY 2 DESC
-    """
-    df_delivery_by_state = run_query(sql_delivery_by_state)
+    df_delivery_by_state = frames["delivery_by_state"]
     
     if not df_delivery_by_state.empty:
+        df_delivery_by_state = df_delivery_by_state.sort_values("avg_delivery_days", ascending=False)
         fig_state = px.bar(df_delivery_by_state, x="avg_delivery_days", y="customer_state", orientation="h",
                            title="Average Delivery Time by State",
                            labels={"avg_delivery_days": "Avg. Delivery Days", "customer_state": "Customer State"})
@@ -91,26 +116,7 @@ with tab2:
 with tab3:
     st.header("Late Delivery Rate")
     
-    # We must query the raw staging table for this, as the `order_estimated_delivery_date`
-    # is not available in the fact table.
-    state_filter = get_state_filter_sql_clause("c", selected_states)
-    year_filter = get_year_filter_sql_clause("d", st.session_state.selected_years)
-    sql_late_delivery = f"""
-    SELECT
-        CAST(SUM(CASE WHEN DATE(o.order_delivered_customer_date) > DATE(o.order_estimated_delivery_date) THEN 1 ELSE 0 END) AS FLOAT64) / COUNT(o.order_id) AS late_rate
-    FROM `{TABLE_STG_ORDERS}` o
-    JOIN `{TABLE_STG_CUSTOMERS}` c
-        ON o.customer_id = c.customer_id
-    JOIN `{TABLE_DATES}` d
-        ON DATE(o.order_purchase_timestamp) = d.full_date
-    WHERE o.order_status = 'delivered'
-    AND o.order_delivered_customer_date IS NOT NULL
-    AND TRIM(o.order_delivered_customer_date) != ''
-    AND o.order_estimated_delivery_date IS NOT NULL
-    AND TRIM(o.order_estimated_delivery_date) != ''
-    {state_filter} {year_filter}
-    """
-    df_late_delivery = run_query(sql_late_delivery)
+    df_late_delivery = frames["late_delivery"]
 
     if not df_late_delivery.empty and 'late_rate' in df_late_delivery.columns:
         late_rate = df_late_delivery.iloc[0]['late_rate']
@@ -121,34 +127,7 @@ with tab3:
     # New section for late orders breakdown
     st.subheader("Late Orders Breakdown")
     
-    sql_late_breakdown = f"""
-    SELECT
-        FORMAT_DATE('%Y-%m', DATE(o.order_delivered_customer_date)) AS month,
-        CASE
-            WHEN DATE_DIFF(DATE(o.order_delivered_customer_date), DATE(o.order_estimated_delivery_date), DAY) <= 5 THEN '1-5 days late'
-            WHEN DATE_DIFF(DATE(o.order_delivered_customer_date), DATE(o.order_estimated_delivery_date), DAY) <= 10 THEN '6-10 days late'
-            WHEN DATE_DIFF(DATE(o.order_delivered_customer_date), DATE(o.order_estimated_delivery_date), DAY) <= 15 THEN '11-15 days late'
-            WHEN DATE_DIFF(DATE(o.order_delivered_customer_date), DATE(o.order_estimated_delivery_date), DAY) <= 20 THEN '16-20 days late'
-            ELSE '>20 days late'
-        END AS days_late_category,
-        COUNT(o.order_id) AS num_late_orders
-    FROM `{TABLE_STG_ORDERS}` o
-    JOIN `{TABLE_STG_CUSTOMERS}` c
-        ON o.customer_id = c.customer_id
-    JOIN `{TABLE_DATES}` d
-        ON DATE(o.order_purchase_timestamp) = d.full_date
-    WHERE
-        o.order_status = 'delivered'
-        AND o.order_delivered_customer_date IS NOT NULL
-        AND TRIM(o.order_delivered_customer_date) != ''
-        AND o.order_estimated_delivery_date IS NOT NULL
-        AND TRIM(o.order_estimated_delivery_date) != ''
-        AND DATE(o.order_delivered_customer_date) > DATE(o.order_estimated_delivery_date)
-        {state_filter} {year_filter}
-    GROUP BY 1, 2
-    ORDER BY 1, 2
-    """
-    df_late_breakdown = run_query(sql_late_breakdown)
+    df_late_breakdown = frames["late_breakdown"]
 
     if not df_late_breakdown.empty:
         category_order = ['1-5 days late', '6-10 days late', '11-15 days late', '16-20 days late', '>20 days late']
@@ -5,11 +5,11 @@ import pandas as pd
 import plotly.express as px
 import os
 import plotly.graph_objects as go
-import requests
 
+from query_builder import QueryParams
 from olist_report import (
-    run_query, TABLE_FACT, TABLE_CUSTOMERS, TABLE_SELLERS, TABLE_GEOLOCATION,
-    TABLE_STG_CUSTOMERS, TABLE_STG_SELLERS, haversine,
+    run_query, run_queries, run_rollup, run_spatial_bins, get_zip_index, TABLE_FACT, TABLE_CUSTOMERS, TABLE_SELLERS, TABLE_GEOLOCATION,
+    TABLE_STG_CUSTOMERS, TABLE_STG_SELLERS, MAX_MAP_ROUTES, route_traces, load_state_geometry,
     create_state_filter, get_state_filter_sql_clause,
     create_year_filter, get_year_filter_sql_clause,
     TABLE_DATES, TABLE_STG_ORDERS
@@ -21,8 +21,8 @@ from olist_report import (
 st.title("Geospatial Analytics")
 
 # Create filters
-selected_states = create_state_filter(TABLE_CUSTOMERS)
-selected_years = create_year_filter(TABLE_DATES)
+selected_states = create_state_filter()
+selected_years = create_year_filter()
 st.session_state.selected_states = selected_states
 st.session_state.selected_years = selected_years
 
@@ -40,29 +40,15 @@ tab1, tab2, tab3, tab4 = st.tabs([
 with tab1:
     st.header("State Spending Distribution")
     
-    state_filter = get_state_filter_sql_clause("c", st.session_state.selected_states)
-    year_filter = get_year_filter_sql_clause("d", st.session_state.selected_years)
-    sql_state_spending = f"""
-    SELECT
-        c.customer_state,
-        SUM(SAFE_CAST(f.price AS FLOAT64)) AS total_spent
-    FROM `{TABLE_FACT}` f
-    JOIN `{TABLE_CUSTOMERS}` c
-        ON f.customer_id = c.customer_id
-    JOIN `{TABLE_DATES}` d
-        ON f.order_date_key = d.date_key
-    WHERE TRUE {state_filter} {year_filter}
-    GROUP BY 1
-    """
-    df_state_spending = run_query(sql_state_spending)
+    df_state_spending = run_rollup(
+        ["customer_state"], ["revenue"],
+        {"customer_state": st.session_state.selected_states, "year": st.session_state.selected_years}
+    ).rename(columns={"revenue": "total_spent"})
 
     if not df_state_spending.empty:
         df_state_spending['customer_state'] = df_state_spending['customer_state'].str.upper()
 
-        # Load Brazil states geojson
-        geojson_url = "https://raw.githubusercontent.com/codeforamerica/click_that_hood/master/public/data/brazil-states.geojson"
-        response = requests.get(geojson_url)
-        geojson = response.json() if response.status_code == 200 else None
+        geojson = load_state_geometry()
 
         if geojson:
             # Custom color scale: transparent for 0, then a darker red for low values
@@ -103,7 +89,7 @@ with tab1:
             )
             st.plotly_chart(fig_map, use_container_width=True)
         else:
-            st.error("Failed to load Brazil states geojson file.")
+            st.error("Brazil states geometry not found. Run scripts/build_state_geometry.py to create streamlit/assets/brazil_states.geojson.")
     else:
         st.warning("No data found for state spending with the current filter selection.")
 
@@ -114,8 +100,10 @@ with tab1:
 with tab2:
     st.header("Customer Spending Distribution")
 
-    state_filter = get_state_filter_sql_clause("c", st.session_state.selected_states)
-    year_filter = get_year_filter_sql_clause("d", st.session_state.selected_years)
+    params = QueryParams()
+
+    state_filter = get_state_filter_sql_clause("c", st.session_state.selected_states, params)
+    year_filter = get_year_filter_sql_clause("d", st.session_state.selected_years, params)
     sql_customer_locations = f"""
     SELECT
         c.customer_unique_id,
@@ -134,20 +122,25 @@ with tab2:
     WHERE TRUE {state_filter} {year_filter}
     GROUP BY 1
     """
-    df_customers = run_query(sql_customer_locations)
+    zoom = st.select_slider("Map detail (zoom level)", options=list(range(3, 11)), value=4, key="customer_map_zoom")
+    df_customers, binned = run_spatial_bins(sql_customer_locations, params.freeze(), zoom, "total_spent")
     
     if not df_customers.empty:
         st.subheader("Customer Locations by Total Spending")
+        if binned:
+            st.caption(f"{df_customers['point_count'].sum():,} customers grouped into {len(df_customers):,} map cells.")
         fig_cust_loc = px.scatter_mapbox(
             df_customers,
             lat="lat",
             lon="lon",
             size="total_spent",
             size_max=15,
-            hover_name="customer_unique_id",
-            hover_data={"total_spent": ':.2f'},
+            hover_name=None if binned else "customer_unique_id",
+            hover_data={"total_spent": ':.2f', "point_count": binned},
+            labels={"point_count": "Customers"},
             color_continuous_scale=px.colors.sequential.Viridis,
-            zoom=3,
+            zoom=zoom,
+            center={"lat": df_customers["lat"].mean(), "lon": df_customers["lon"].mean()},
             height=500
         )
         fig_cust_loc.update_layout(mapbox_style="carto-positron")
@@ -162,18 +155,18 @@ with tab2:
 with tab3:
     st.header("Geographic Distribution")
 
-    state_filter = get_state_filter_sql_clause("c", st.session_state.selected_states)
-    year_filter = get_year_filter_sql_clause("d", st.session_state.selected_years)
-    sql_customer_locations = f"""
+    params = QueryParams()
+
+    state_filter = get_state_filter_sql_clause("c", st.session_state.selected_states, params)
+    year_filter = get_year_filter_sql_clause("d", st.session_state.selected_years, params)
+    # Per-zip counts only: the zip index places them on the map grid
+    sql_customer_zips = f"""
     SELECT
-        c.customer_unique_id,
-        AVG(g.latitude) as lat,
-        AVG(g.longitude) as lon
+        sc.customer_zip_code_prefix AS zip_code_prefix,
+        COUNT(DISTINCT c.customer_unique_id) AS point_count
     FROM `{TABLE_CUSTOMERS}` c
     JOIN `{TABLE_STG_CUSTOMERS}` sc
         ON c.customer_id = sc.customer_id
-    JOIN `{TABLE_GEOLOCATION}` g
-        ON sc.customer_zip_code_prefix = g.geolocation_zip_code_prefix
     JOIN `{TABLE_FACT}` f
         ON c.customer_id = f.customer_id
     JOIN `{TABLE_DATES}` d
@@ -181,26 +174,31 @@ with tab3:
     WHERE TRUE {state_filter} {year_filter}
     GROUP BY 1
     """
-    df_customers = run_query(sql_customer_locations)
+    zoom = st.select_slider("Map detail (zoom level)", options=list(range(3, 11)), value=4, key="distribution_map_zoom")
 
-    sql_seller_locations = f"""
+    seller_params = QueryParams()
+    seller_year_filter = get_year_filter_sql_clause("d", st.session_state.selected_years, seller_params)
+    sql_seller_zips = f"""
     SELECT
-        s.seller_id,
-        AVG(g.latitude) as lat,
-        AVG(g.longitude) as lon
+        ss.seller_zip_code_prefix AS zip_code_prefix,
+        COUNT(DISTINCT s.seller_id) AS point_count
     FROM `{TABLE_SELLERS}` s
     JOIN `{TABLE_STG_SELLERS}` ss
         ON s.seller_id = ss.seller_id
-    JOIN `{TABLE_GEOLOCATION}` g
-        ON ss.seller_zip_code_prefix = g.geolocation_zip_code_prefix
     JOIN `{TABLE_FACT}` f
         ON s.seller_id = f.seller_id
     JOIN `{TABLE_DATES}` d
         ON f.order_date_key = d.date_key
-    WHERE TRUE {year_filter}
+    WHERE TRUE {seller_year_filter}
     GROUP BY 1
     """
-    df_sellers = run_query(sql_seller_locations)
+    zip_results = run_queries({
+        "customers": (sql_customer_zips, params.freeze()),
+        "sellers": (sql_seller_zips, seller_params.freeze()),
+    })
+    zip_index = get_zip_index()
+    df_customers = zip_index.rollup(zip_results["customers"], zoom)
+    df_sellers = zip_index.rollup(zip_results["sellers"], zoom)
 
     if not df_customers.empty and not df_sellers.empty:
         df_customers['type'] = 'Customer'
@@ -212,9 +210,11 @@ with tab3:
             lat="lat",
             lon="lon",
             color="type",
-            zoom=3,
+            hover_data={"point_count": True},
+            zoom=zoom,
+            center={"lat": df_map_data["lat"].mean(), "lon": df_map_data["lon"].mean()},
             height=500,
-            labels={"type": "Location Type"},
+            labels={"type": "Location Type", "point_count": "Locations"},
             category_orders={"type": ["Customer", "Seller"]}
         )
         fig_map.update_layout(mapbox_style="open-street-map")
@@ -229,65 +229,75 @@ with tab3:
 with tab4:
     st.header("Delivery Routes")
 
-    state_filter = get_state_filter_sql_clause("t6", st.session_state.selected_states)
-    year_filter = get_year_filter_sql_clause("d", st.session_state.selected_years)
-    sql_delivery_routes = f"""
+    params = QueryParams()
+
+    # The fact carries the customer state, year and distance, so the summary needs no joins
+    state_filter = get_state_filter_sql_clause("f", st.session_state.selected_states, params)
+    year_filter = get_year_filter_sql_clause("f", st.session_state.selected_years, params)
+    route_filter = f"f.delivery_distance_km IS NOT NULL AND f.price > 0 {state_filter} {year_filter}"
+    sql_route_summary = f"""
     SELECT
-        t1.order_id,
-        t1.seller_id,
-        t1.customer_id,
-        t2.latitude AS seller_lat,
-        t2.longitude AS seller_lon,
-        t3.latitude AS cust_lat,
-        t3.longitude AS cust_lon
-    FROM `{TABLE_FACT}` AS t1
-    JOIN `{TABLE_SELLERS}` AS t4 ON t1.seller_id = t4.seller_id
-    JOIN `{TABLE_STG_SELLERS}` AS t5 ON t4.seller_id = t5.seller_id
-    JOIN `{TABLE_GEOLOCATION}` AS t2 ON t5.seller_zip_code_prefix = t2.geolocation_zip_code_prefix
-    JOIN `{TABLE_CUSTOMERS}` AS t6 ON t1.customer_id = t6.customer_id
-    JOIN `{TABLE_STG_CUSTOMERS}` AS t7 ON t6.customer_id = t7.customer_id
-    JOIN `{TABLE_GEOLOCATION}` AS t3 ON t7.customer_zip_code_prefix = t3.geolocation_zip_code_prefix
-    JOIN `{TABLE_DATES}` AS d ON t1.order_date_key = d.date_key
-    WHERE t1.order_id IS NOT NULL AND t1.price > 0 {state_filter} {year_filter}
-    LIMIT 1000
+        COUNT(*) AS routes,
+        MIN(f.delivery_distance_km) AS min_distance,
+        MAX(f.delivery_distance_km) AS max_distance
+    FROM `{TABLE_FACT}` AS f
+    WHERE {route_filter}
     """
-    df_routes = run_query(sql_delivery_routes)
-    
-    if not df_routes.empty:
-        df_routes['distance_km'] = df_routes.apply(
-            lambda x: haversine(x.seller_lat, x.seller_lon, x.cust_lat, x.cust_lon), axis=1
-        )
+    df_summary = run_query(sql_route_summary, params.freeze())
+    route_count = int(df_summary["routes"].iloc[0]) if not df_summary.empty else 0
 
-        # Get nearest and furthest routes
-        min_distance = df_routes['distance_km'].min()
-        max_distance = df_routes['distance_km'].max()
-        
+    if route_count:
         # Display the distances
-        st.info(f"The nearest delivery route is **{min_distance:.1f} km**.")
-        st.info(f"The furthest delivery route is **{max_distance:.1f} km**.")
+        st.info(f"The nearest delivery route is **{df_summary['min_distance'].iloc[0]:.1f} km**.")
+        st.info(f"The furthest delivery route is **{df_summary['max_distance'].iloc[0]:.1f} km**.")
 
         st.subheader("Interactive Map of Delivery Routes")
-        sample_size = st.slider("Max Routes to Display", min_value=50, max_value=len(df_routes), value=200, step=50)
-        df_sample = df_routes.head(sample_size).copy()
+        max_routes = min(route_count, MAX_MAP_ROUTES)
+        if max_routes > 50:
+            sample_size = st.slider(
+                "Max Routes to Display", min_value=50, max_value=max_routes,
+                value=min(2000, max_routes), step=50
+            )
+        else:
+            sample_size = max_routes
 
-        fig_routes = go.Figure()
-        for _, row in df_sample.iterrows():
-            fig_routes.add_trace(go.Scattermapbox(
-                mode="lines",
-                lon=[row.seller_lon, row.cust_lon],
-                lat=[row.seller_lat, row.cust_lat],
-                line=dict(width=2, color="orange"),
-                hoverinfo="text",
-                text=f"Order ID: {row.order_id}<br>Distance: {row.distance_km:.1f} km"
-            ))
-        fig_routes.update_layout(
-            mapbox=dict(
-                style="open-street-map",
-                zoom=3,
-                center={"lat": df_routes.cust_lat.mean(), "lon": df_routes.cust_lon.mean()}
-            ),
-            margin={"r":0,"t":0,"l":0,"b":0}
-        )
-        st.plotly_chart(fig_routes, use_container_width=True)
+        # Only the sample is fetched. Order ids are hashes, so ordering by them
+        # gives a stable sample spread over the whole selection.
+        sql_route_sample = f"""
+        SELECT
+            f.order_id,
+            ss.seller_zip_code_prefix AS seller_zip,
+            sc.customer_zip_code_prefix AS customer_zip,
+            f.delivery_distance_km AS distance_km
+        FROM `{TABLE_FACT}` AS f
+        JOIN `{TABLE_STG_SELLERS}` AS ss ON f.seller_id = ss.seller_id
+        JOIN `{TABLE_STG_CUSTOMERS}` AS sc ON f.customer_id = sc.customer_id
+        WHERE {route_filter}
+        ORDER BY f.order_id, f.order_item_id
+        LIMIT {int(sample_size)}
+        """
+        df_sample = run_query(sql_route_sample, params.freeze())
+        # Endpoints are the zip_spatial_index centroids delivery_distance_km is measured between
+        zip_index = get_zip_index()
+        sellers = zip_index.locate(df_sample["seller_zip"])
+        customers = zip_index.locate(df_sample["customer_zip"])
+        df_sample["seller_lat"], df_sample["seller_lon"] = sellers["lat"].to_numpy(), sellers["lon"].to_numpy()
+        df_sample["cust_lat"], df_sample["cust_lon"] = customers["lat"].to_numpy(), customers["lon"].to_numpy()
+        df_routes = df_sample.dropna(subset=["seller_lat", "cust_lat"])
+
+        if df_routes.empty:
+            st.warning("None of the sampled delivery routes have located zip codes to draw.")
+        else:
+            # All routes are packed into one trace per distance band
+            fig_routes = go.Figure(route_traces(df_routes))
+            fig_routes.update_layout(
+                mapbox=dict(
+                    style="open-street-map",
+                    zoom=3,
+                    center={"lat": df_routes.cust_lat.mean(), "lon": df_routes.cust_lon.mean()}
+                ),
+                margin={"r":0,"t":0,"l":0,"b":0}
+            )
+            st.plotly_chart(fig_routes, use_container_width=True)
     else:
         st.warning("No data found for delivery routes with the current filter selection.")
\ No newline at end of file
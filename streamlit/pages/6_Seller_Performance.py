@@ -2,10 +2,11 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-import requests
+from query_builder import QueryParams
 from olist_report import (
-    run_query, TABLE_FACT, TABLE_SELLERS, TABLE_DATES,
-    create_year_filter, get_year_filter_sql_clause
+    run_queries, rollup_query, TABLE_FACT, TABLE_SELLERS, TABLE_DATES,
+    create_year_filter, get_year_filter_sql_clause,
+    create_seller_state_filter, get_seller_state_filter_sql_clause, load_state_geometry
 )
 
 # -------------------------
@@ -13,34 +14,79 @@ from olist_report import (
 # -------------------------
 st.title("Seller Performance & Reviews")
 
-# Define state filter function within the app
-def create_seller_state_filter():
-    """Creates a multiselect filter for seller states."""
-    sql_states = f"SELECT DISTINCT seller_state FROM `{TABLE_SELLERS}` ORDER BY seller_state"
-    df_states = run_query(sql_states)
-    all_states = df_states['seller_state'].tolist()
-    return st.multiselect(
-        "Filter by Seller State",
-        all_states,
-        default=all_states
-    )
-
-def get_seller_state_filter_sql_clause(alias, selected_states):
-    """Generates the SQL WHERE clause for seller states."""
-    if selected_states:
-        states_tuple = tuple(selected_states)
-        if len(states_tuple) == 1:
-            return f"AND {alias}.seller_state = '{states_tuple[0]}'"
-        else:
-            return f"AND {alias}.seller_state IN {states_tuple}"
-    return ""
-
 # State and Year Filters (moved directly under the header)
 selected_seller_states = create_seller_state_filter()
-selected_years = create_year_filter(TABLE_DATES)
+selected_years = create_year_filter()
 st.session_state.selected_seller_states = selected_seller_states
 st.session_state.selected_years = selected_years
 
+# --------------------------------
+# Queries
+# --------------------------------
+# The page's queries are independent, so they are submitted together and
+# the page waits only for the slowest one.
+params = QueryParams()
+rollup_filters = {"seller_state": selected_seller_states, "year": selected_years}
+sql_seller_state_dist = f"""
+SELECT
+    s.seller_state,
+    COUNT(DISTINCT s.seller_id) AS num_sellers,
+    AVG(SAFE_CAST(f.review_score AS FLOAT64)) AS avg_review_score,
+    SUM(SAFE_CAST(f.price AS FLOAT64)) AS total_revenue
+FROM `{TABLE_SELLERS}` s
+LEFT JOIN `{TABLE_FACT}` f
+    ON s.seller_id = f.seller_id
+LEFT JOIN `{TABLE_DATES}` d
+    ON f.order_date_key = d.date_key
+WHERE 1=1
+{get_seller_state_filter_sql_clause("s", selected_seller_states, params)}
+{get_year_filter_sql_clause("d", selected_years, params)}
+GROUP BY 1
+ORDER BY num_sellers DESC
+"""
+sql_seller_kpis = f"""
+SELECT
+    f.seller_id,
+    s.seller_city,
+    s.seller_state,
+    COUNT(DISTINCT f.order_id) AS total_orders,
+    SUM(SAFE_CAST(f.price AS FLOAT64)) AS total_revenue,
+    AVG(SAFE_CAST(f.review_score AS FLOAT64)) AS avg_review_score
+FROM `{TABLE_FACT}` f
+JOIN `{TABLE_SELLERS}` s
+    ON f.seller_id = s.seller_id
+JOIN `{TABLE_DATES}` d
+    ON f.order_date_key = d.date_key
+WHERE 1=1
+{get_seller_state_filter_sql_clause("s", selected_seller_states, params)}
+{get_year_filter_sql_clause("d", selected_years, params)}
+GROUP BY 1, 2, 3
+ORDER BY total_revenue DESC
+LIMIT 100
+"""
+sql_review_dist = f"""
+SELECT
+    SAFE_CAST(f.review_score AS INT64) AS review_score,
+    COUNT(f.review_score) AS num_reviews
+FROM `{TABLE_FACT}` f
+JOIN `{TABLE_DATES}` d
+    ON f.order_date_key = d.date_key
+JOIN `{TABLE_SELLERS}` s
+    ON f.seller_id = s.seller_id
+WHERE f.review_score IS NOT NULL
+{get_seller_state_filter_sql_clause("s", selected_seller_states, params)}
+{get_year_filter_sql_clause("d", selected_years, params)}
+GROUP BY 1
+ORDER BY 1
+"""
+frames = run_queries({
+    "seller_revenue": rollup_query(["seller_state"], ["revenue"], rollup_filters),
+    "seller_state_dist": (sql_seller_state_dist, params.freeze()),
+    "seller_kpis": (sql_seller_kpis, params.freeze()),
+    "review_dist": (sql_review_dist, params.freeze()),
+    "review_by_state": rollup_query(["seller_state"], ["avg_review_score"], rollup_filters),
+})
+
 # Tabs
 tab_insights, tab_top_sellers, tab_reviews = st.tabs(["Seller Insights", "Top Sellers", "Review Analysis"])
 
@@ -53,29 +99,12 @@ with tab_insights:
     # Geospatial Heatmap for Total Revenue by Seller State
     st.subheader("Total Revenue by Seller State")
 
-    state_filter = get_seller_state_filter_sql_clause("s", st.session_state.selected_seller_states)
-    year_filter = get_year_filter_sql_clause("d", st.session_state.selected_years)
-    sql_seller_revenue = f"""
-    SELECT
-        s.seller_state,
-        SUM(SAFE_CAST(f.price AS FLOAT64)) AS total_revenue
-    FROM `{TABLE_SELLERS}` s
-    JOIN `{TABLE_FACT}` f
-        ON s.seller_id = f.seller_id
-    JOIN `{TABLE_DATES}` d
-        ON f.order_date_key = d.date_key
-    WHERE TRUE {state_filter} {year_filter}
-    GROUP BY 1
-    """
-    df_seller_revenue = run_query(sql_seller_revenue)
+    df_seller_revenue = frames["seller_revenue"].rename(columns={"revenue": "total_revenue"})
 
     if not df_seller_revenue.empty:
         df_seller_revenue['seller_state'] = df_seller_revenue['seller_state'].str.upper()
 
-        # Load Brazil states geojson
-        geojson_url = "https://raw.githubusercontent.com/codeforamerica/click_that_hood/master/public/data/brazil-states.geojson"
-        response = requests.get(geojson_url)
-        geojson = response.json() if response.status_code == 200 else None
+        geojson = load_state_geometry()
 
         if geojson:
             custom_colorscale = [
@@ -112,31 +141,14 @@ with tab_insights:
             )
             st.plotly_chart(fig_map, use_container_width=True)
         else:
-            st.error("Failed to load Brazil states geojson file.")
+            st.error("Brazil states geometry not found. Run scripts/build_state_geometry.py to create streamlit/assets/brazil_states.geojson.")
     else:
         st.warning("No data found for seller revenue with the current filter selection.")
 
 
     # Seller Distribution by State
     st.subheader("Seller Distribution & Performance by State")
-    sql_seller_state_dist = f"""
-    SELECT
-        s.seller_state,
-        COUNT(DISTINCT s.seller_id) AS num_sellers,
-        AVG(SAFE_CAST(f.review_score AS FLOAT64)) AS avg_review_score,
-        SUM(SAFE_CAST(f.price AS FLOAT64)) AS total_revenue
-    FROM `{TABLE_SELLERS}` s
-    LEFT JOIN `{TABLE_FACT}` f
-        ON s.seller_id = f.seller_id
-    LEFT JOIN `{TABLE_DATES}` d
-        ON f.order_date_key = d.date_key
-    WHERE 1=1
-    {get_seller_state_filter_sql_clause("s", st.session_state.selected_seller_states)}
-    {get_year_filter_sql_clause("d", st.session_state.selected_years)}
-    GROUP BY 1
-    ORDER BY num_sellers DESC
-    """
-    df_seller_state_dist = run_query(sql_seller_state_dist)
+    df_seller_state_dist = frames["seller_state_dist"]
 
     if not df_seller_state_dist.empty:
         fig_state_dist = px.pie(
@@ -167,27 +179,7 @@ with tab_insights:
 with tab_top_sellers:
     st.header("Top Performing Sellers")
 
-    sql_seller_kpis = f"""
-    SELECT
-        f.seller_id,
-        s.seller_city,
-        s.seller_state,
-        COUNT(DISTINCT f.order_id) AS total_orders,
-        SUM(SAFE_CAST(f.price AS FLOAT64)) AS total_revenue,
-        AVG(SAFE_CAST(f.review_score AS FLOAT64)) AS avg_review_score
-    FROM `{TABLE_FACT}` f
-    JOIN `{TABLE_SELLERS}` s
-        ON f.seller_id = s.seller_id
-    JOIN `{TABLE_DATES}` d
-        ON f.order_date_key = d.date_key
-    WHERE 1=1
-    {get_seller_state_filter_sql_clause("s", st.session_state.selected_seller_states)}
-    {get_year_filter_sql_clause("d", st.session_state.selected_years)}
-    GROUP BY 1, 2, 3
-    ORDER BY total_revenue DESC
-    LIMIT 100
-    """
-    df_seller_kpis = run_query(sql_seller_kpis)
+    df_seller_kpis = frames["seller_kpis"]
 
     if not df_seller_kpis.empty:
         st.subheader("By Revenue")
@@ -226,22 +218,7 @@ with tab_reviews:
     st.header("Customer Review Analysis")
 
     # Review score distribution
-    sql_review_dist = f"""
-    SELECT
-        SAFE_CAST(f.review_score AS INT64) AS review_score,
-        COUNT(f.review_score) AS num_reviews
-    FROM `{TABLE_FACT}` f
-    JOIN `{TABLE_DATES}` d
-        ON f.order_date_key = d.date_key
-    JOIN `{TABLE_SELLERS}` s
-        ON f.seller_id = s.seller_id
-    WHERE f.review_score IS NOT NULL
-    {get_seller_state_filter_sql_clause("s", st.session_state.selected_seller_states)}
-    {get_year_filter_sql_clause("d", st.session_state.selected_years)}
-    GROUP BY 1
-    ORDER BY 1
-    """
-    df_review_dist = run_query(sql_review_dist)
+    df_review_dist = frames["review_dist"]
 
     if not df_review_dist.empty:
         st.subheader("Review Score Distribution")
@@ -254,30 +231,15 @@ with tab_reviews:
         st.warning("No data found for review distribution.")
 
     # Average review score by seller state bar chart
-    sql_review_by_state = f"""
-    SELECT
-        s.seller_state,
-        AVG(SAFE_CAST(f.review_score AS FLOAT64)) AS avg_review_score
-    FROM `{TABLE_FACT}` f
-    JOIN `{TABLE_SELLERS}` s
-        ON f.seller_id = s.seller_id
-    JOIN `{TABLE_DATES}` d
-        ON f.order_date_key = d.date_key
-    WHERE f.review_score IS NOT NULL
-    {get_seller_state_filter_sql_clause("s", st.session_state.selected_seller_states)}
-    {get_year_filter_sql_clause("d", st.session_state.selected_years)}
-    GROUP BY 1
-    ORDER BY 2 DESC
-    """
-    df_review_by_state = run_query(sql_review_by_state)
+    df_review_by_state = frames["review_by_state"]
+    if not df_review_by_state.empty:
+        df_review_by_state = df_review_by_state[df_review_by_state["avg_review_score"].notna()]
+        df_review_by_state = df_review_by_state.sort_values("avg_review_score", ascending=False)
 
     if not df_review_by_state.empty:
         st.subheader("Average Review Score by Seller State")
 
-        # Geomap with transparent heatmap on average review score
-        geojson_url = "https://raw.githubusercontent.com/codeforamerica/click_that_hood/master/public/data/brazil-states.geojson"
-        response = requests.get(geojson_url)
-        geojson = response.json() if response.status_code == 200 else None
+        geojson = load_state_geometry()
         
         if geojson:
             # Custom colorscale for reviews using a distinct, non-blue palette
@@ -315,7 +277,7 @@ with tab_reviews:
             )
             st.plotly_chart(fig_review_map, use_container_width=True)
         else:
-            st.error("Failed to load Brazil states geojson file.")
+            st.error("Brazil states geometry not found. Run scripts/build_state_geometry.py to create streamlit/assets/brazil_states.geojson.")
 
         # Bar chart for review scores by state
         fig_state_rev = px.bar(
@@ -2,7 +2,7 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from olist_report import run_query, TABLE_FACT, TABLE_PRODUCTS, TABLE_CUSTOMERS, create_state_filter, get_state_filter_sql_clause, create_year_filter, get_year_filter_sql_clause, TABLE_DATES
+from olist_report import create_state_filter, create_year_filter, get_fact_slice
 
 # -------------------------
 # Page Content
@@ -10,37 +10,29 @@ from olist_report import run_query, TABLE_FACT, TABLE_PRODUCTS, TABLE_CUSTOMERS,
 st.title("Product Analytics")
 
 # Create the customer state and year filters UI
-selected_states = create_state_filter(TABLE_CUSTOMERS)
-selected_years = create_year_filter(TABLE_DATES)
+selected_states = create_state_filter()
+selected_years = create_year_filter()
 st.session_state.selected_states = selected_states
 st.session_state.selected_years = selected_years
 
+# All charts on this page aggregate the same filtered fact slice in-process
+df_fact = get_fact_slice(selected_states, selected_years)
+
 # Use tabs to organize content
 tab1, tab2 = st.tabs(["Category Performance", "Reviews & Dimensions"])
 
 with tab1:
     st.header("Top Performing Product Categories")
 
-    # Query for product category performance, including customer state
-    state_filter = get_state_filter_sql_clause("c", selected_states)
-    year_filter = get_year_filter_sql_clause("d", st.session_state.selected_years)
-    sql_category_performance = f"""
-    SELECT
-        pr.product_category_name_english AS category,
-        c.customer_state,
-        SUM(SAFE_CAST(f.price AS FLOAT64)) AS total_revenue,
-        COUNT(DISTINCT f.order_id) AS total_orders
-    FROM `{TABLE_FACT}` f
-    JOIN `{TABLE_PRODUCTS}` pr
-        ON f.product_id = pr.product_id
-    JOIN `{TABLE_CUSTOMERS}` c
-        ON f.customer_id = c.customer_id
-    JOIN `{TABLE_DATES}` d
-        ON f.order_date_key = d.date_key
-    WHERE TRUE {state_filter} {year_filter}
-    GROUP BY 1, 2
-    """
-    df_category_performance = run_query(sql_category_performance)
+    # Product category performance, including customer state
+    if df_fact.empty:
+        df_category_performance = pd.DataFrame(columns=["category", "customer_state", "total_revenue", "total_orders"])
+    else:
+        df_category_performance = df_fact.groupby(["product_category", "customer_state"], observed=True).agg(
+            total_revenue=("price", "sum"),
+            total_orders=("order_id", "nunique")
+        ).reset_index().rename(columns={"product_category": "category"})
+        df_category_performance[["category", "customer_state"]] = df_category_performance[["category", "customer_state"]].astype(str)
     
     if not df_category_performance.empty:
         # --- Treemap of Revenue by Category ---
@@ -129,27 +121,15 @@ with tab1:
 with tab2:
     st.header("Product Insights")
     
-    # Query for review score by product category
-    state_filter = get_state_filter_sql_clause("c", selected_states)
-    year_filter = get_year_filter_sql_clause("d", st.session_state.selected_years)
-    sql_reviews_by_category = f"""
-    SELECT
-        pr.product_category_name_english AS category,
-        AVG(SAFE_CAST(f.review_score AS FLOAT64)) AS avg_review_score
-    FROM `{TABLE_FACT}` f
-    JOIN `{TABLE_PRODUCTS}` pr
-        ON f.product_id = pr.product_id
-    JOIN `{TABLE_CUSTOMERS}` c
-        ON f.customer_id = c.customer_id
-    JOIN `{TABLE_DATES}` d
-        ON f.order_date_key = d.date_key
-    WHERE f.review_score IS NOT NULL
-        AND TRUE {state_filter} {year_filter}
-    GROUP BY 1
-    ORDER BY avg_review_score DESC
-    LIMIT 20
-    """
-    df_reviews_by_category = run_query(sql_reviews_by_category)
+    # Review score by product category
+    df_reviewed = df_fact[df_fact["review_score"].notna()] if not df_fact.empty else df_fact
+    if df_reviewed.empty:
+        df_reviews_by_category = pd.DataFrame(columns=["category", "avg_review_score"])
+    else:
+        df_reviews_by_category = df_reviewed.groupby("product_category", observed=True).agg(
+            avg_review_score=("review_score", "mean")
+        ).reset_index().rename(columns={"product_category": "category"})
+        df_reviews_by_category = df_reviews_by_category.sort_values("avg_review_score", ascending=False).head(20)
     
     if not df_reviews_by_category.empty:
         st.subheader("Average Review Score by Category")
@@ -159,27 +139,14 @@ with tab2:
     else:
         st.warning("No data found for reviews by category.")
         
-    # Query for product weight vs. review score
-    state_filter = get_state_filter_sql_clause("c", selected_states)
-    year_filter = get_year_filter_sql_clause("d", st.session_state.selected_years)
-    sql_weight_vs_review = f"""
-    SELECT
-        SAFE_CAST(pr.product_weight_g AS FLOAT64) AS weight_g,
-        AVG(SAFE_CAST(f.review_score AS FLOAT64)) AS avg_review_score
-    FROM `{TABLE_FACT}` f
-    JOIN `{TABLE_PRODUCTS}` pr
-        ON f.product_id = pr.product_id
-    JOIN `{TABLE_CUSTOMERS}` c
-        ON f.customer_id = c.customer_id
-    JOIN `{TABLE_DATES}` d
-        ON f.order_date_key = d.date_key
-    WHERE
-        pr.product_weight_g IS NOT NULL
-        AND f.review_score IS NOT NULL
-        AND TRUE {state_filter} {year_filter}
-    GROUP BY 1
-    """
-    df_weight_vs_review = run_query(sql_weight_vs_review)
+    # Product weight vs. review score
+    df_weighted = df_reviewed[df_reviewed["product_weight_g"].notna()] if not df_reviewed.empty else df_reviewed
+    if df_weighted.empty:
+        df_weight_vs_review = pd.DataFrame(columns=["weight_g", "avg_review_score"])
+    else:
+        df_weight_vs_review = df_weighted.groupby("product_weight_g").agg(
+            avg_review_score=("review_score", "mean")
+        ).reset_index().rename(columns={"product_weight_g": "weight_g"})
 
     if not df_weight_vs_review.empty:
         st.subheader("Product Weight vs. Review Score")
@@ -3,8 +3,11 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
+from query_builder import QueryParams
 from olist_report import (
-    run_query,
+    run_queries,
+    histogram_query,
+    histogram_bins,
     TABLE_CUSTOMERS,
     TABLE_FACT,
     create_state_filter,
@@ -20,32 +23,67 @@ from olist_report import (
 st.title("Customer Analytics")
 
 # Create the customer state and year filters UI
-selected_states = create_state_filter(TABLE_CUSTOMERS)
-selected_years = create_year_filter(TABLE_DATES)
+selected_states = create_state_filter()
+selected_years = create_year_filter()
 st.session_state.selected_states = selected_states
 st.session_state.selected_years = selected_years
 
+# Queries (all use the customer state and year filter; submitted together)
+params = QueryParams()
+state_filter = get_state_filter_sql_clause("c", selected_states, params)
+year_filter = get_year_filter_sql_clause("d", selected_years, params)
+# Query for unique customers by state (with year filter)
+sql_customers_by_state = f"""
+SELECT
+    c.customer_state,
+    COUNT(DISTINCT c.customer_unique_id) AS total_customers
+FROM `{TABLE_CUSTOMERS}` c
+JOIN `{TABLE_FACT}` f ON c.customer_id = f.customer_id
+JOIN `{TABLE_DATES}` d ON f.order_date_key = d.date_key
+WHERE TRUE {state_filter} {year_filter}
+GROUP BY 1
+ORDER BY total_customers DESC
+"""
+# Query for orders per customer (with year filter)
+sql_orders_per_customer = f"""
+SELECT
+    c.customer_unique_id,
+    COUNT(DISTINCT f.order_id) AS total_orders
+FROM `{TABLE_CUSTOMERS}` c
+JOIN `{TABLE_FACT}` f ON c.customer_id = f.customer_id
+JOIN `{TABLE_DATES}` d ON f.order_date_key = d.date_key
+WHERE TRUE {state_filter} {year_filter}
+GROUP BY 1
+"""
+# Query for average spending per customer (with year filter)
+sql_avg_spending = f"""
+SELECT
+    c.customer_unique_id,
+    SUM(SAFE_CAST(f.price AS FLOAT64)) AS total_spent
+FROM `{TABLE_CUSTOMERS}` c
+JOIN `{TABLE_FACT}` f ON c.customer_id = f.customer_id
+JOIN `{TABLE_DATES}` d ON f.order_date_key = d.date_key
+WHERE TRUE {state_filter} {year_filter}
+GROUP BY 1
+"""
+# Per-customer values are bucketed in the query; spend is long-tailed, so its bins are log-scaled
+ORDERS_BIN_WIDTH = 1
+SPENDING_BINS = 40
+frames = run_queries({
+    "customers_by_state": (sql_customers_by_state, params.freeze()),
+    "orders_per_customer": histogram_query(sql_orders_per_customer, params.freeze(), "total_orders",
+                                           bin_width=ORDERS_BIN_WIDTH),
+    "avg_spending": histogram_query(sql_avg_spending, params.freeze(), "total_spent",
+                                    bins=SPENDING_BINS, log=True),
+})
+
 # Use tabs to organize content
 tab1, tab2 = st.tabs(["Customer Demographics", "Order Behavior"])
 
 with tab1:
     st.header("Customer Demographics")
 
-    # Query for unique customers by state (with year filter)
-    state_filter = get_state_filter_sql_clause("c", selected_states)
-    year_filter = get_year_filter_sql_clause("d", st.session_state.selected_years)
-    sql_customers_by_state = f"""
-    SELECT
-        c.customer_state,
-        COUNT(DISTINCT c.customer_unique_id) AS total_customers
-    FROM `{TABLE_CUSTOMERS}` c
-    JOIN `{TABLE_FACT}` f ON c.customer_id = f.customer_id
-    JOIN `{TABLE_DATES}` d ON f.order_date_key = d.date_key
-    WHERE TRUE {state_filter} {year_filter}
-    GROUP BY 1
-    ORDER BY total_customers DESC
-    """
-    df_customers_by_state = run_query(sql_customers_by_state)
+    df_customers_by_state = frames["customers_by_state"]
 
     if not df_customers_by_state.empty:
         st.subheader("Total Unique Customers by State")
@@ -58,48 +96,22 @@ with tab1:
 with tab2:
     st.header("Customer Order Behavior")
     
-    # Query for orders per customer (with year filter)
-    state_filter = get_state_filter_sql_clause("c", selected_states)
-    year_filter = get_year_filter_sql_clause("d", st.session_state.selected_years)
-    sql_orders_per_customer = f"""
-    SELECT
-        c.customer_unique_id,
-        COUNT(DISTINCT f.order_id) AS total_orders
-    FROM `{TABLE_CUSTOMERS}` c
-    JOIN `{TABLE_FACT}` f ON c.customer_id = f.customer_id
-    JOIN `{TABLE_DATES}` d ON f.order_date_key = d.date_key
-    WHERE TRUE {state_filter} {year_filter}
-    GROUP BY 1
-    """
-    df_orders_per_customer = run_query(sql_orders_per_customer)
+    df_orders_per_customer = histogram_bins(frames["orders_per_customer"], bin_width=ORDERS_BIN_WIDTH)
     
     if not df_orders_per_customer.empty:
         st.subheader("Orders Per Customer")
-        fig_orders_dist = px.histogram(df_orders_per_customer, x="total_orders", nbins=20,
-                                       labels={"total_orders": "Number of Orders"})
+        fig_orders_dist = px.bar(df_orders_per_customer, x="bin_label", y="count",
+                                 labels={"bin_label": "Number of Orders", "count": "Customers"})
         st.plotly_chart(fig_orders_dist, use_container_width=True)
     else:
         st.warning("No data found for orders per customer with the current filter selection.")
 
-    # Query for average spending per customer (with year filter)
-    state_filter = get_state_filter_sql_clause("c", selected_states)
-    year_filter = get_year_filter_sql_clause("d", st.session_state.selected_years)
-    sql_avg_spending = f"""
-    SELECT
-        c.customer_unique_id,
-        SUM(SAFE_CAST(f.price AS FLOAT64)) AS total_spent
-    FROM `{TABLE_CUSTOMERS}` c
-    JOIN `{TABLE_FACT}` f ON c.customer_id = f.customer_id
-    JOIN `{TABLE_DATES}` d ON f.order_date_key = d.date_key
-    WHERE TRUE {state_filter} {year_filter}
-    GROUP BY 1
-    """
-    df_avg_spending = run_query(sql_avg_spending)
+    df_avg_spending = histogram_bins(frames["avg_spending"], bins=SPENDING_BINS, log=True)
 
     if not df_avg_spending.empty:
         st.subheader("Total Spending Per Customer")
-        fig_spending_dist = px.histogram(df_avg_spending, x="total_spent", nbins=50,
-                                         labels={"total_spent": "Total Spending"})
+        fig_spending_dist = px.bar(df_avg_spending, x="bin_label", y="count",
+                                   labels={"bin_label": "Total Spending (log-scaled bins)", "count": "Customers"})
         st.plotly_chart(fig_spending_dist, use_container_width=True)
     else:
         st.warning("No data found for customer spending with the current filter selection.")
\ No newline at end of file
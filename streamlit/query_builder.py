@@ -0,0 +1,93 @@
+# streamlit/query_builder.py
+
+import hashlib
+import json
+import re
+
+# -------------------------
+# Filter Normalization
+# -------------------------
+def normalize_selection(selected, options=None) -> tuple:
+    """Returns a sorted, de-duplicated tuple for a multiselect selection.
+
+    Selecting every option is the same query as selecting none, so both
+    normalize to the empty tuple, which means "no predicate".
+    """
+    values = tuple(sorted(set(selected or []), key=lambda v: (v is None, v)))
+    if options is not None and set(values) >= set(options):
+        return ()
+    return values
+
+
+# -------------------------
+# Parameterized Query Builder
+# -------------------------
+class QueryParams:
+    """Collects named query parameters while a page builds its SQL.
+
+    Filters are emitted as `column IN UNNEST(@name)` (BigQuery syntax; the
+    DuckDB backend rewrites it), so the SQL text no longer depends on the
+    selected values and equal selections produce equal queries.
+    """
+
+    def __init__(self):
+        self.values = {}
+
+    def add(self, name: str, value) -> str:
+        """Registers a scalar or list parameter and returns its placeholder."""
+        if isinstance(value, (list, tuple, set, frozenset)):
+            value = normalize_selection(value)
+        if name in self.values and self.values[name] != value:
+            raise ValueError(f"Query parameter '{name}' is already bound to a different value")
+        self.values[name] = value
+        return f"@{name}"
+
+    def in_filter(self, column: str, name: str, selected) -> str:
+        """Returns ' AND column IN UNNEST(@name)', or '' when nothing is filtered."""
+        values = normalize_selection(selected)
+        if not values:
+            return ""
+        return f" AND {column} IN UNNEST({self.add(name, values)})"
+
+    def freeze(self) -> tuple:
+        """Returns the parameters as a hashable, name-sorted tuple of (name, value)."""
+        return tuple(sorted(self.values.items()))
+
+
+# -------------------------
+# SQL Text
+# -------------------------
+# String literals, quoted identifiers and comments are swapped for numbered
+# placeholders while SQL text is normalized or rewritten, so their contents
+# are never changed and never mistaken for SQL. A line comment keeps its
+# newline, which ends it.
+_LITERALS = re.compile(r"""'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*"|--[^\n]*\n?|/\*.*?\*/""", re.DOTALL)
+_PLACEHOLDER = re.compile(r"\x00(\d+)\x00")
+
+
+def mask_literals(sql: str) -> tuple[str, list]:
+    """Returns sql with literals and comments replaced by placeholders, and the replaced texts."""
+    literals = []
+
+    def placeholder(match):
+        literals.append(match.group())
+        return f"\x00{len(literals) - 1}\x00"
+
+    return _LITERALS.sub(placeholder, sql), literals
+
+
+def unmask_literals(sql: str, literals: list) -> str:
+    """Puts the texts removed by mask_literals back in place of their placeholders."""
+    return _PLACEHOLDER.sub(lambda m: literals[int(m.group(1))], sql)
+
+
+def normalize_sql(sql: str) -> str:
+    """Collapses whitespace outside literals so formatting differences do not split cache entries."""
+    masked, literals = mask_literals(sql)
+    return unmask_literals(re.sub(r"\s+", " ", masked).strip(), literals)
+
+
+def query_cache_key(sql: str, params: tuple = ()) -> str:
+    """Returns a canonical hash for a query and its frozen parameters."""
+    payload = json.dumps([normalize_sql(sql), [[k, v] for k, v in params]], default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
@@ -0,0 +1,106 @@
+# streamlit/result_cache.py
+
+import os
+import threading
+import time
+import pandas as pd
+
+# -------------------------
+# Persistent Query Result Cache
+# -------------------------
+# st.cache_data lives in process memory and is lost on every deploy or crash.
+# This cache keeps query results on disk as Parquet files named by the
+# canonical query hash, so a restarted app serves known queries without
+# touching the warehouse.
+DEFAULT_CACHE_DIR = ".query_cache"
+DEFAULT_MAX_MB = 512
+DEFAULT_TTL_HOURS = 24
+
+
+class DiskResultCache:
+    """Size-capped, LRU-evicted Parquet cache of query results keyed by query hash."""
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024,
+                 ttl_seconds: float = DEFAULT_TTL_HOURS * 3600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.parquet")
+
+    def get(self, key: str):
+        """Returns the cached frame for key, or None on a miss or expired entry."""
+        path = self._path(key)
+        try:
+            # mtime records when the entry was written, atime when it was last read
+            written = os.stat(path).st_mtime
+            if self.ttl_seconds and time.time() - written > self.ttl_seconds:
+                os.remove(path)
+                raise FileNotFoundError(path)
+            df = pd.read_parquet(path)
+            os.utime(path, (time.time(), written))
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return df
+
+    def put(self, key: str, df: pd.DataFrame) -> None:
+        """Stores a frame under key, then evicts least recently used entries over the cap."""
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+        except (OSError, ValueError, TypeError):
+            # Results that cannot be written as Parquet are simply not persisted
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self.evict()
+
+    def evict(self) -> None:
+        """Deletes least recently used entries until the cache fits in max_bytes."""
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                if not name.endswith(".parquet"):
+                    continue
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((max(stat.st_atime, stat.st_mtime), stat.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters and the on-disk footprint."""
+        files = [f for f in os.listdir(self.directory) if f.endswith(".parquet")]
+        size = sum(os.path.getsize(os.path.join(self.directory, f)) for f in files)
+        return {"hits": self.hits, "misses": self.misses, "entries": len(files), "bytes": size}
+
+
+def create_result_cache():
+    """Builds the disk cache from OLIST_CACHE_* settings; OLIST_CACHE_DIR='' disables it."""
+    directory = os.getenv("OLIST_CACHE_DIR", DEFAULT_CACHE_DIR)
+    if not directory:
+        return None
+    max_mb = float(os.getenv("OLIST_CACHE_MAX_MB", DEFAULT_MAX_MB))
+    ttl_hours = float(os.getenv("OLIST_CACHE_TTL_HOURS", DEFAULT_TTL_HOURS))
+    return DiskResultCache(directory, int(max_mb * 1024 * 1024), ttl_hours * 3600)
@@ -0,0 +1,94 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+# The app modules are imported by name, as streamlit does when running the app
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from backends import DuckDBBackend
+
+# A few thousand fact rows shaped like the marts. Months come latest first,
+# so results follow data order unless something sorts them.
+FACT_ROWS = 12_000
+WAREHOUSE_SQL = f"""
+CREATE SCHEMA m2_prod;
+CREATE TABLE m2_prod.fact_order_items AS
+SELECT
+    'o' || (i // 2) AS order_id,
+    CAST(i % 2 + 1 AS INTEGER) AS order_item_id,
+    'p' || (i % 5) AS product_id,
+    's' || (i % 4) AS seller_id,
+    'c' || (i // 2) AS customer_id,
+    CAST(strftime(order_date, '%Y%m%d') AS BIGINT) AS order_date_key,
+    order_date,
+    year(order_date) AS year,
+    ['SP', 'RJ', 'MG'][(i // 2) % 3 + 1] AS customer_state,
+    ['SP', 'PR'][i % 4 // 2 + 1] AS seller_state,
+    CAST(i % 3 + 1 AS VARCHAR) AS payment_type_key,
+    CAST(10 + i % 10 AS DECIMAL(12, 2)) AS price,
+    CAST(1.5 AS DECIMAL(12, 2)) AS freight_value,
+    CAST(i % 5 + 1 AS INTEGER) AS review_score,
+    CAST(i % 30 AS BIGINT) AS delivery_time_days
+FROM (
+    SELECT i, CAST(DATE '2018-12-01' - INTERVAL (i % 24) MONTH AS DATE) AS order_date
+    FROM range({FACT_ROWS}) AS t(i)
+);
+CREATE TABLE m2_prod.dim_customers AS
+SELECT DISTINCT customer_id, 'u' || (CAST(substr(customer_id, 2) AS BIGINT) // 2) AS customer_unique_id, customer_state
+FROM m2_prod.fact_order_items;
+CREATE TABLE m2_prod.dim_sellers AS
+SELECT DISTINCT seller_id, seller_state FROM m2_prod.fact_order_items;
+CREATE TABLE m2_prod.dim_dates AS
+SELECT DISTINCT order_date_key AS date_key, order_date AS full_date, year FROM m2_prod.fact_order_items;
+CREATE TABLE m2_prod.dim_products AS
+SELECT * FROM (VALUES
+    ('p0', 'toys', 500.0), ('p1', 'toys', 250.0), ('p2', 'books', 300.0), ('p3', 'garden_tools', 1200.0), ('p4', NULL, NULL)
+) AS t(product_id, product_category_name_english, product_weight_g);
+CREATE TABLE m2_prod.dim_payments AS
+SELECT * FROM (VALUES ('1', 'credit_card'), ('2', 'boleto'), ('3', 'voucher')) AS t(payment_type_key, payment_type);
+CREATE TABLE m2_prod.fact_order_cube AS
+SELECT
+    f.customer_state, f.seller_state, f.year, strftime(f.order_date, '%Y-%m') AS month,
+    COALESCE(p.product_category_name_english, 'untranslated') AS product_category,
+    COALESCE(pay.payment_type, 'not_defined') AS payment_type,
+    SUM(f.price) AS revenue,
+    SUM(f.freight_value) AS freight,
+    COUNT(*) AS item_count,
+    COUNT(DISTINCT f.order_id) AS order_count,
+    SUM(f.review_score) AS review_sum,
+    COUNT(f.review_score) AS review_count,
+    SUM(f.delivery_time_days) AS delivery_days_sum,
+    COUNT(f.delivery_time_days) AS delivery_days_count
+FROM m2_prod.fact_order_items f
+LEFT JOIN m2_prod.dim_products p ON f.product_id = p.product_id
+LEFT JOIN m2_prod.dim_payments pay ON f.payment_type_key = pay.payment_type_key
+GROUP BY 1, 2, 3, 4, 5, 6;
+"""
+
+
+@pytest.fixture(scope="session")
+def report():
+    """olist_report imported in streamlit's bare mode.
+
+    On the BigQuery backend with no project configured the sidebar only shows
+    a warning, so the import itself runs no query.
+    """
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("OLIST_BACKEND", "bigquery")
+        mp.setenv("OLIST_CACHE_DIR", "")
+        mp.delenv("PROJECT_ID", raising=False)
+        yield importlib.import_module("olist_report")
+
+
+@pytest.fixture
+def warehouse(report, monkeypatch):
+    """An in-memory DuckDB holding small marts, serving every olist_report query."""
+    backend = DuckDBBackend(":memory:", read_only=False)
+    backend.conn.execute(WAREHOUSE_SQL)
+    monkeypatch.setattr(report, "get_backend", lambda name=None: backend)
+    report._run_cached_query.clear()
+    report.get_data_version.clear()
+    report.load_fact_slice.clear()
+    return backend
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from backends import COMPACT_MIN_ROWS, DuckDBBackend, arrow_to_frame, bigquery_to_duckdb, downcast_numerics
+
+
+def test_translates_table_refs_and_casts():
+    sql = "SELECT SAFE_CAST(x AS FLOAT64), CAST(y AS INT64) FROM `my-project.m2_prod.fact_order_items`"
+    assert bigquery_to_duckdb(sql) == "SELECT TRY_CAST(x AS DOUBLE), CAST(y AS BIGINT) FROM m2_prod.fact_order_items"
+
+
+def test_translates_date_functions_with_nested_arguments():
+    sql = "SELECT FORMAT_DATE('%Y-%m', DATE(o.ts)), DATE_DIFF(DATE(o.end_ts), DATE(o.ts), DAY) FROM o"
+    assert bigquery_to_duckdb(sql) == (
+        "SELECT strftime(DATE(o.ts), '%Y-%m'), date_diff('day', DATE(o.ts), DATE(o.end_ts)) FROM o"
+    )
+
+
+def test_translates_array_and_scalar_parameters():
+    sql = "SELECT * FROM t WHERE state IN UNNEST(@states) AND year >= @min_year"
+    assert bigquery_to_duckdb(sql) == "SELECT * FROM t WHERE state IN (SELECT UNNEST($states)) AND year >= $min_year"
+
+
+def test_leaves_string_literals_and_comments_untouched():
+    sql = (
+        "SELECT 'SAFE_CAST(x AS FLOAT64) @rate', FORMAT_DATE('%Y-%m', d), 'it''s IN UNNEST(@p)' -- INT64 @q\n"
+        "FROM `p.m2_prod.t` WHERE note = @note"
+    )
+    assert bigquery_to_duckdb(sql) == (
+        "SELECT 'SAFE_CAST(x AS FLOAT64) @rate', strftime(d, '%Y-%m'), 'it''s IN UNNEST(@p)' -- INT64 @q\n"
+        "FROM m2_prod.t WHERE note = $note"
+    )
+
+def test_translated_sql_runs_on_duckdb():
+    backend = DuckDBBackend(":memory:", read_only=False)
+    backend.conn.execute("""
+        CREATE TABLE orders AS SELECT * FROM (VALUES
+            ('SP', DATE '2017-01-05', DATE '2017-01-15', '10.5'),
+            ('RJ', DATE '2017-02-01', DATE '2017-02-04', 'n/a'),
+            ('MG', DATE '2018-03-10', DATE '2018-03-11', '3')
+        ) AS t(state, purchased, delivered, amount)
+    """)
+    df = backend.query(
+        """
+        SELECT state,
+               FORMAT_DATE('%Y-%m', purchased) AS month,
+               DATE_DIFF(delivered, purchased, DAY) AS days,
+               SAFE_CAST(amount AS FLOAT64) AS amount
+        FROM orders
+        WHERE state IN UNNEST(@states)
+        ORDER BY state
+        """,
+        (("states", ("RJ", "SP")),),
+    )
+    assert df["state"].tolist() == ["RJ", "SP"]
+    assert df["month"].tolist() == ["2017-02", "2017-01"]
+    assert df["days"].tolist() == [3, 10]
+    assert np.isnan(df["amount"].iloc[0]) and df["amount"].iloc[1] == 10.5
+
+
+
+def test_large_results_get_categoricals_in_value_order():
+    # Latest month first, as a query without ORDER BY may return them
+    months = [f"2017-{m:02d}" for m in range(12, 0, -1)]
+    rows = COMPACT_MIN_ROWS + 12
+    table = pa.table({
+        "month": [months[i % 12] for i in range(rows)],
+        "revenue": [1.0] * rows,
+        "items": [1] * rows,
+    })
+    df = arrow_to_frame(table)
+
+    assert isinstance(df["month"].dtype, pd.CategoricalDtype)
+    assert list(df["month"].cat.categories) == sorted(months)
+    trend = df.groupby("month", observed=True)["revenue"].sum().reset_index().sort_values("month")
+    assert trend["month"].astype(str).tolist() == sorted(months)
+    cumulative = trend["revenue"].cumsum()
+    assert cumulative.is_monotonic_increasing and cumulative.iloc[-1] == rows
+    # Numerics are left at the engine's width
+    assert df["items"].dtype == np.int64
+
+
+def test_downcast_numerics_keeps_floats_that_lose_precision():
+    df = downcast_numerics(pd.DataFrame({"count": [1, 2, 3], "score": [1.0, 2.5, 5.0], "price": [10.1, 0.3, 99.99]}))
+    assert df["count"].dtype == np.int8
+    assert df["score"].dtype == np.float32
+    assert df["price"].dtype == np.float64
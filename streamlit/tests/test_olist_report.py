@@ -0,0 +1,236 @@
+import math
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from zip_index import grid_cell_degrees
+
+FACT_SLICE_COLUMNS = [
+    "order_id", "order_item_id", "customer_unique_id", "customer_state", "seller_id", "seller_state",
+    "product_category", "product_weight_g", "payment_type", "full_date", "year", "month",
+    "price", "freight_value", "review_score", "delivery_time_days",
+]
+
+
+def test_fact_slice_columns_and_filters(report, warehouse):
+    df = report.get_fact_slice(["RJ", "MG"], [2018])
+    assert list(df.columns) == FACT_SLICE_COLUMNS
+
+    (expected_rows, expected_revenue), = warehouse.conn.execute("""
+        SELECT COUNT(*), SUM(price) FROM m2_prod.fact_order_items
+        WHERE customer_state IN ('RJ', 'MG') AND year = 2018
+    """).fetchall()
+    assert len(df) == expected_rows
+    assert set(df["customer_state"]) == {"RJ", "MG"} and set(df["year"]) == {2018}
+    assert df["price"].dtype == np.float64 and df["price"].sum() == float(expected_revenue)
+    assert set(df["product_category"]) == {"toys", "books", "garden_tools", "untranslated"}
+
+    # No selection means no filter
+    assert len(report.get_fact_slice([], [])) == warehouse.conn.execute(
+        "SELECT COUNT(*) FROM m2_prod.fact_order_items"
+    ).fetchone()[0]
+
+
+def test_fact_slice_aggregates_months_in_calendar_order(report, warehouse):
+    df = report.get_fact_slice([], [])
+    # As the Sales & Revenue page builds its trend and cumulative revenue
+    trends = df.groupby("month", observed=True).agg(total_revenue=("price", "sum")).reset_index().sort_values("month")
+    months = trends["month"].astype(str).tolist()
+    assert months == sorted(months) and len(months) == 24
+
+    expected = warehouse.conn.execute("""
+        SELECT SUM(SUM(price)) OVER (ORDER BY strftime(order_date, '%Y-%m'))
+        FROM m2_prod.fact_order_items GROUP BY strftime(order_date, '%Y-%m') ORDER BY 1
+    """).df().iloc[:, 0].astype(float).to_numpy()
+    np.testing.assert_allclose(trends["total_revenue"].cumsum().to_numpy(), expected)
+    assert pd.to_datetime(trends["month"].astype(str)).is_monotonic_increasing
+
+
+def test_rollups_the_cube_covers_are_routed_to_it(report, warehouse):
+    dimensions, measures = ["month", "customer_state"], ["revenue", "item_count", "avg_review_score"]
+    filters = {"year": (2018,), "payment_type": ("boleto", "voucher")}
+    assert report.can_use_cube(dimensions, measures, filters)
+
+    sql, params = report.rollup_query(dimensions, measures, filters)
+    assert f"FROM `{report.TABLE_CUBE}`" in sql and report.TABLE_FACT not in sql
+    assert "GROUP BY 1, 2" in " ".join(sql.split())
+    assert [name for name, _ in params] == ["payment_type", "year"]
+
+    df = report.run_rollup(dimensions, measures, filters)
+    assert list(df.columns) == dimensions + measures
+    expected = warehouse.conn.execute("""
+        SELECT strftime(f.order_date, '%Y-%m') AS month, f.customer_state,
+               SUM(f.price) AS revenue, COUNT(*) AS item_count, AVG(f.review_score) AS avg_review_score
+        FROM m2_prod.fact_order_items f JOIN m2_prod.dim_payments pay USING (payment_type_key)
+        WHERE f.year = 2018 AND pay.payment_type IN ('boleto', 'voucher')
+        GROUP BY 1, 2 ORDER BY 1, 2
+    """).df()
+    pd.testing.assert_frame_equal(df.astype({"revenue": float}), expected.astype({"revenue": float}), check_dtype=False)
+
+
+def test_rollups_the_cube_cannot_answer_read_the_fact(report, warehouse):
+    cases = [
+        (["customer_state"], ["revenue"], {"review_score": (5,)}),  # filter on a dimension the cube lacks
+        (["review_score"], ["revenue"], {}),                          # dimension the cube lacks
+        (["customer_state"], ["order_count"], {}),                    # measure that is not additive
+    ]
+    for dimensions, measures, filters in cases:
+        assert not report.can_use_cube(dimensions, measures, filters)
+        sql, _ = report.rollup_query(dimensions, measures, filters)
+        assert f"FROM `{report.TABLE_FACT}` f" in sql and report.TABLE_CUBE not in sql
+
+    df = report.run_rollup(["customer_state"], ["order_count"], {"review_score": (5,)})
+    expected = warehouse.conn.execute("""
+        SELECT customer_state, COUNT(DISTINCT order_id) AS order_count FROM m2_prod.fact_order_items
+        WHERE review_score = 5 GROUP BY 1 ORDER BY 1
+    """).df()
+    pd.testing.assert_frame_equal(df, expected, check_dtype=False)
+
+
+def test_run_queries_runs_a_batch_on_worker_threads(report, warehouse, monkeypatch):
+    ctx = object()
+    attached = []
+    monkeypatch.setattr(report, "get_script_run_ctx", lambda: ctx)
+    monkeypatch.setattr(report, "add_script_run_ctx", lambda ctx: attached.append((threading.current_thread(), ctx)))
+
+    queries = {
+        "states": "SELECT customer_state, COUNT(*) AS n FROM `p.m2_prod.fact_order_items` GROUP BY 1 ORDER BY 1",
+        "broken": "SELECT * FROM `p.m2_prod.missing_table`",
+        "years": report.rollup_query(["year"], ["item_count"], {"customer_state": ("SP",)}),
+    }
+    results = report.run_queries(queries)
+
+    assert list(results) == list(queries)
+    # The failing query yields an empty frame; the others still complete
+    assert results["broken"].empty
+    assert results["states"]["customer_state"].tolist() == ["MG", "RJ", "SP"]
+    assert results["states"]["n"].sum() == len(report.get_fact_slice([], []))
+    assert results["years"]["year"].tolist() == [2017, 2018]
+    # Every query ran on a worker thread that was given the page's script context
+    assert len(attached) == len(queries)
+    assert all(thread is not threading.main_thread() and c is ctx for thread, c in attached)
+
+
+def test_haversine_is_importable_from_the_report(report):
+    # Sao Paulo to Rio de Janeiro, about 360 km
+    assert 355 < report.haversine(-46.63, -23.55, -43.20, -22.90) < 365
+
+
+def routes(count: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        "order_id": [f"o{i}" for i in range(count)],
+        "seller_lat": np.linspace(-23.5, -20.0, count),
+        "seller_lon": np.full(count, -46.6),
+        "cust_lat": np.full(count, -8.0),
+        "cust_lon": np.linspace(-35.0, -30.0, count),
+        "distance_km": np.linspace(50.0, 2500.0, count),
+    })
+
+
+def test_route_traces_draw_each_band_as_nan_separated_segments(report):
+    df = routes(10)
+    traces = report.route_traces(df)
+
+    bands = pd.cut(df["distance_km"], bins=report.ROUTE_DISTANCE_BINS, include_lowest=True).value_counts(sort=False)
+    assert len(traces) == (bands > 0).sum()
+    assert sum(len(trace.lon) for trace in traces) == 3 * len(df)
+    for trace in traces:
+        lon, lat = np.asarray(trace.lon, dtype=float), np.asarray(trace.lat, dtype=float)
+        # seller, customer, gap for every route of the band
+        assert np.isnan(lon[2::3]).all() and np.isnan(lat[2::3]).all()
+        assert not np.isnan(lon[0::3]).any() and not np.isnan(lon[1::3]).any()
+        assert set(lon[1::3]) <= set(df["cust_lon"]) and set(lat[0::3]) <= set(df["seller_lat"])
+        assert trace.name.endswith(f"({len(lon) // 3:,})")
+
+
+def test_route_traces_cap_the_routes_drawn(report):
+    traces = report.route_traces(routes(report.MAX_MAP_ROUTES + 100))
+    assert sum(len(trace.lon) for trace in traces) == 3 * report.MAX_MAP_ROUTES
+    traces = report.route_traces(routes(50), max_routes=20)
+    assert sum(len(trace.lon) for trace in traces) == 3 * 20
+
+
+POINTS_SQL = "SELECT lat, lon, spent FROM points WHERE state IN UNNEST(@states)"
+
+
+def test_spatial_bins_count_points_per_cell(report, warehouse):
+    warehouse.conn.execute("""
+        CREATE TABLE points AS SELECT * FROM (VALUES
+            ('SP', -23.55, -46.63, 10.0),
+            ('SP', -23.56, -46.64, 30.0),
+            ('RJ', -22.90, -43.20, 5.0),
+            ('RJ', NULL, NULL, 1.0)
+        ) AS t(state, lat, lon, spent)
+    """)
+    params = (("states", ("RJ", "SP")),)
+    sql, bin_params = report.spatial_bin_query(POINTS_SQL, params, zoom=4, value_column="spent")
+    assert [name for name, _ in bin_params] == ["cell_deg", "states"]
+
+    cells, binned = report.run_spatial_bins(POINTS_SQL, params, zoom=4, value_column="spent", max_points=2)
+    assert binned
+    cells = cells.sort_values("point_count").reset_index(drop=True)
+    assert cells["point_count"].tolist() == [1, 2]
+    assert cells["spent"].tolist() == [5.0, 40.0]
+    sao_paulo = cells.iloc[1]
+    deg = grid_cell_degrees(4)
+    assert (sao_paulo["cell_y"], sao_paulo["cell_x"]) == (math.floor(-23.55 / deg), math.floor(-46.63 / deg))
+    assert math.isclose(sao_paulo["lat"], -23.555)
+
+    # Small selections come back as the raw points
+    points, binned = report.run_spatial_bins(POINTS_SQL, params, zoom=4, value_column="spent")
+    assert not binned
+    assert len(points) == 4 and (points["point_count"] == 1).all()
+
+
+@pytest.fixture
+def items(warehouse):
+    warehouse.conn.execute("CREATE TABLE items AS SELECT i AS price, i % 2 AS parity FROM range(1, 101) AS t(i)")
+    return warehouse
+
+
+def test_histogram_splits_the_range_into_equal_bins(report, items):
+    df = items.query(*report.histogram_query("SELECT price FROM items", (), "price", bins=10))
+    assert df["bucket"].tolist() == list(range(10))
+    assert df["count"].tolist() == [10] * 10
+
+    bins = report.run_histogram("SELECT price FROM items", (), "price", bins=10)
+    assert bins["count"].tolist() == [10] * 10
+    assert bins["bin_start"].iloc[0] == 1 and math.isclose(bins["bin_end"].iloc[-1], 100)
+
+
+def test_histogram_bins_of_fixed_width_and_log_bins(report, items):
+    values_sql = "SELECT price - 50 AS price FROM items WHERE parity = @parity"
+    params = (("parity", 0),)
+
+    bins = report.run_histogram(values_sql, params, "price", bin_width=25)
+    assert bins["count"].sum() == 50 and len(bins) == 4
+    assert bins["bin_start"].tolist() == [-48, -23, 2, 27]
+
+    # Non-positive values are left out of log bins
+    bins = report.run_histogram(values_sql, params, "price", bins=5, log=True)
+    assert bins["count"].sum() == 25
+    assert math.isclose(bins["bin_start"].iloc[0], 2) and math.isclose(bins["bin_end"].iloc[-1], 50)
+
+
+def test_filter_domains_are_reloaded_with_the_data_version(report, warehouse, monkeypatch):
+    version = ["v1"]
+    monkeypatch.setattr(report, "get_data_version", lambda: version[0])
+    report.load_filter_domains.clear()
+
+    years = report.get_filter_domain("year")
+    assert years == [2017, 2018] and all(type(year) is int for year in years)
+    assert report.get_filter_domain("customer_state") == ["MG", "RJ", "SP"]
+    assert report.get_filter_domain("product_category") == ["books", "garden_tools", "toys", "untranslated"]
+    assert report.get_filter_domain("payment_type") == ["boleto", "credit_card", "voucher"]
+
+    warehouse.conn.execute("INSERT INTO m2_prod.dim_customers VALUES ('c-new', 'u-new', 'BA')")
+    assert report.get_filter_domain("customer_state") == ["MG", "RJ", "SP"]  # same version, held in memory
+    version[0] = "v2"
+    assert report.get_filter_domain("customer_state") == ["BA", "MG", "RJ", "SP"]
+
+
+def test_data_version_falls_back_to_the_hour(report, warehouse):
+    # An in-memory database has no file to date the data by
+    assert report.get_data_version().startswith("hour-")
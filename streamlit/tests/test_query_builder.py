@@ -0,0 +1,45 @@
+import pytest
+
+from query_builder import QueryParams, normalize_selection, normalize_sql, query_cache_key
+
+
+def test_normalize_selection_sorts_and_deduplicates():
+    assert normalize_selection(["SP", "RJ", "SP"]) == ("RJ", "SP")
+    assert normalize_selection([2018, None, 2017]) == (2017, 2018, None)
+    assert normalize_selection(None) == ()
+
+
+def test_selecting_every_option_is_no_filter():
+    assert normalize_selection(["RJ", "SP"], options=["SP", "RJ"]) == ()
+    assert normalize_selection(["SP"], options=["SP", "RJ"]) == ("SP",)
+
+
+def test_in_filter_binds_the_normalized_selection():
+    params = QueryParams()
+    assert params.in_filter("f.year", "years", []) == ""
+    assert params.in_filter("f.customer_state", "states", ["SP", "RJ"]) == " AND f.customer_state IN UNNEST(@states)"
+    assert params.freeze() == (("states", ("RJ", "SP")),)
+
+
+def test_rebinding_a_parameter_to_another_value_fails():
+    params = QueryParams()
+    params.add("year", 2017)
+    params.add("year", 2017)
+    with pytest.raises(ValueError):
+        params.add("year", 2018)
+
+
+def test_cache_key_ignores_formatting_and_selection_order():
+    first, second = QueryParams(), QueryParams()
+    first.add("states", ["SP", "RJ"])
+    second.add("states", ["RJ", "SP", "RJ"])
+    sql = "SELECT *\n  FROM t\n  WHERE s IN UNNEST(@states)"
+    assert query_cache_key(sql, first.freeze()) == query_cache_key(" SELECT * FROM t WHERE s IN UNNEST(@states) ", second.freeze())
+    assert query_cache_key(sql, first.freeze()) != query_cache_key(sql, (("states", ("SP",)),))
+    assert query_cache_key(sql) != query_cache_key(sql.replace("t", "u"))
+
+
+def test_normalize_sql_leaves_literals_and_comments_as_written():
+    sql = "SELECT  'a  b'  AS x,\n  \"odd  name\",  'it''s  here' -- a  note\nFROM  t"
+    assert normalize_sql(sql) == "SELECT 'a  b' AS x, \"odd  name\", 'it''s  here' -- a  note\nFROM t"
+    assert query_cache_key("SELECT 'a b'") != query_cache_key("SELECT 'a  b'")
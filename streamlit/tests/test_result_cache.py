@@ -0,0 +1,55 @@
+import os
+import time
+
+import pandas as pd
+
+from result_cache import DiskResultCache
+
+FRAME = pd.DataFrame({"state": ["SP", "RJ"], "revenue": [10.0, 5.0]})
+
+
+def age(cache, key, seconds):
+    """Backdates an entry's read and write times."""
+    then = time.time() - seconds
+    os.utime(cache._path(key), (then, then))
+
+
+def test_round_trip_counts_hits_and_misses(tmp_path):
+    cache = DiskResultCache(str(tmp_path))
+    assert cache.get("a") is None
+    cache.put("a", FRAME)
+    pd.testing.assert_frame_equal(cache.get("a"), FRAME)
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1 and cache.stats()["entries"] == 1
+
+
+def test_expired_entries_are_misses_and_removed(tmp_path):
+    cache = DiskResultCache(str(tmp_path), ttl_seconds=60)
+    cache.put("a", FRAME)
+    age(cache, "a", 120)
+    assert cache.get("a") is None
+    assert not os.path.exists(cache._path("a"))
+
+
+def test_reads_do_not_extend_the_ttl(tmp_path):
+    cache = DiskResultCache(str(tmp_path), ttl_seconds=60)
+    cache.put("a", FRAME)
+    age(cache, "a", 45)
+    assert cache.get("a") is not None
+    # The read refreshed the access time but not the write time
+    written = os.stat(cache._path("a")).st_mtime
+    os.utime(cache._path("a"), (time.time(), written - 30))
+    assert cache.get("a") is None
+
+
+def test_evicts_least_recently_used_entries_over_the_cap(tmp_path):
+    cache = DiskResultCache(str(tmp_path))
+    cache.put("a", FRAME)
+    entry_bytes = os.path.getsize(cache._path("a"))
+    cache.max_bytes = int(entry_bytes * 2.5)
+    cache.put("b", FRAME)
+    age(cache, "a", 200)
+    age(cache, "b", 100)
+    cache.get("a")  # a is now the most recently used of the two
+
+    cache.put("c", FRAME)
+    assert sorted(f[0] for f in os.listdir(tmp_path)) == ["a", "c"]
@@ -0,0 +1,57 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from zip_index import INDEX_ZOOM_LEVELS, ZipSpatialIndex, grid_cell_degrees, haversine
+
+
+def index_frame(points: dict) -> pd.DataFrame:
+    """Builds zip_spatial_index rows the way the dbt model computes them."""
+    frame = pd.DataFrame(
+        [(zip_code, lat, lon) for zip_code, (lat, lon) in points.items()],
+        columns=["geolocation_zip_code_prefix", "latitude", "longitude"],
+    )
+    for zoom in INDEX_ZOOM_LEVELS:
+        deg = grid_cell_degrees(zoom)
+        rows = np.floor(frame["latitude"] / deg).astype(int).astype(str)
+        cols = np.floor(frame["longitude"] / deg).astype(int).astype(str)
+        frame[f"cell_z{zoom}"] = rows + ":" + cols
+    return frame
+
+
+POINTS = {
+    "01001": (-23.550, -46.634),  # São Paulo
+    "01002": (-23.560, -46.640),
+    "04001": (-23.700, -46.700),  # ~20 km south
+    "20001": (-22.900, -43.200),  # Rio de Janeiro
+}
+
+
+def test_nearby_matches_a_full_scan():
+    index = ZipSpatialIndex(index_frame(POINTS))
+    lat, lon = index.centroid("01001")
+    for radius_km in (1, 5, 25, 100, 500):
+        expected = sorted(
+            zip_code for zip_code, (other_lat, other_lon) in POINTS.items()
+            if haversine(lon, lat, other_lon, other_lat) <= radius_km
+        )
+        assert sorted(index.nearby("01001", radius_km)["zip_code_prefix"]) == expected
+    assert index.nearby("01001", 25)["zip_code_prefix"].iloc[0] == "01001"
+    assert index.nearby("99999", 25).empty
+
+
+def test_rollup_sums_counts_per_cell_at_weighted_centroid():
+    index = ZipSpatialIndex(index_frame(POINTS))
+    counts = pd.DataFrame({
+        "zip_code_prefix": ["01001", "01002", "20001", "99999"],
+        "point_count": [1, 3, 2, 7],
+        "total_spent": [10.0, 30.0, 5.0, 1.0],
+    })
+    cells = index.rollup(counts, zoom=4, value_columns=["total_spent"])
+
+    assert cells["point_count"].sum() == 6  # 99999 is not indexed
+    sao_paulo = cells[cells["point_count"] == 4].iloc[0]
+    assert (sao_paulo["cell_y"], sao_paulo["cell_x"]) == index.cell("01001", 4)
+    assert math.isclose(sao_paulo["lat"], (-23.550 * 1 + -23.560 * 3) / 4)
+    assert sao_paulo["total_spent"] == 40.0
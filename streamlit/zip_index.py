@@ -0,0 +1,161 @@
+# streamlit/zip_index.py
+
+import math
+import numpy as np
+import pandas as pd
+
+# -------------------------
+# Map Grid
+# -------------------------
+# Map layers are aggregated into square lat/lon cells sized for the chosen zoom
+# level: about MAP_CELL_PIXELS screen pixels per cell on a 256px web-mercator
+# tile. The zip_spatial_index mart precomputes the cells of INDEX_ZOOM_LEVELS
+# with the same formula (dbt_olist/macros/grid_cell.sql).
+MAP_CELL_PIXELS = 8
+INDEX_ZOOM_LEVELS = (4, 6, 8)
+EARTH_RADIUS_KM = 6371
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+def grid_cell_degrees(zoom: int) -> float:
+    """Returns the grid cell size in degrees for a map zoom level."""
+    return 360 / 2 ** zoom * MAP_CELL_PIXELS / 256
+
+def index_zoom(zoom: int) -> int:
+    """Returns the coarsest indexed zoom level at least as detailed as zoom
+    (the most detailed one for higher zooms)."""
+    return next((level for level in INDEX_ZOOM_LEVELS if level >= zoom), INDEX_ZOOM_LEVELS[-1])
+
+def haversine(lon1, lat1, lon2, lat2):
+    """Calculate the great circle distance in km between points.
+
+    Accepts scalars or equal-length arrays/Series and computes element-wise
+    with NumPy, so whole columns are handled in one call.
+    """
+    lon1, lat1, lon2, lat2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lon1, lat1, lon2, lat2))
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    c = 2 * np.arcsin(np.sqrt(a))
+    return c * EARTH_RADIUS_KM
+
+
+# -------------------------
+# Zip Prefix Spatial Index
+# -------------------------
+class ZipSpatialIndex:
+    """In-memory lookup over the zip_spatial_index mart.
+
+    Holds each zip prefix's centroid and grid cells, plus the zips of every
+    cell, so locating zips, finding the zips near one and rolling per-zip
+    values up to map cells are dictionary and array lookups instead of joins
+    against the geolocation tables.
+    """
+
+    def __init__(self, frame: pd.DataFrame):
+        self.zips = frame["geolocation_zip_code_prefix"].astype(str).to_numpy()
+        self.lat = frame["latitude"].to_numpy(dtype=np.float64)
+        self.lon = frame["longitude"].to_numpy(dtype=np.float64)
+        self.position = {zip_code: i for i, zip_code in enumerate(self.zips)}
+        self.cells = {}
+        self.members = {}
+        for zoom in INDEX_ZOOM_LEVELS:
+            cells = frame[f"cell_z{zoom}"].str.split(":", expand=True).to_numpy(dtype=np.int64).reshape(-1, 2)
+            members = {}
+            for i, cell in enumerate(map(tuple, cells)):
+                members.setdefault(cell, []).append(i)
+            self.cells[zoom] = cells
+            self.members[zoom] = {cell: np.array(ids) for cell, ids in members.items()}
+
+    def __len__(self) -> int:
+        return len(self.zips)
+
+    def __contains__(self, zip_code) -> bool:
+        return str(zip_code) in self.position
+
+    def _positions(self, zip_codes) -> pd.Series:
+        return pd.Series(zip_codes).astype(str).map(self.position)
+
+    def centroid(self, zip_code):
+        """Returns (lat, lon) of a zip prefix, or None when it is not indexed."""
+        i = self.position.get(str(zip_code))
+        return None if i is None else (self.lat[i], self.lon[i])
+
+    def locate(self, zip_codes) -> pd.DataFrame:
+        """Returns lat/lon columns aligned with zip_codes (NaN where not indexed)."""
+        positions = self._positions(zip_codes)
+        known = positions.notna().to_numpy()
+        ids = positions[known].astype(np.int64).to_numpy()
+        lat = np.full(len(positions), np.nan)
+        lon = np.full(len(positions), np.nan)
+        lat[known], lon[known] = self.lat[ids], self.lon[ids]
+        return pd.DataFrame({"lat": lat, "lon": lon})
+
+    def cell(self, zip_code, zoom: int):
+        """Returns the (row, col) cell of a zip prefix at an indexed zoom level, or None."""
+        i = self.position.get(str(zip_code))
+        return None if i is None else tuple(int(v) for v in self.cells[zoom][i])
+
+    @staticmethod
+    def neighbor_cells(cell, rings: int = 1) -> list:
+        """Returns the cells within `rings` steps of cell, cell itself included."""
+        row, col = cell
+        return [(row + dy, col + dx) for dy in range(-rings, rings + 1) for dx in range(-rings, rings + 1)]
+
+    def nearby(self, zip_code, radius_km: float) -> pd.DataFrame:
+        """Returns the zip prefixes whose centroid is within radius_km of zip_code's,
+        nearest first, as zip_code_prefix and distance_km columns.
+
+        Only the zips of the cells around zip_code are measured: the most
+        detailed level whose cells are at least radius_km wide, so the cell and
+        its neighbours cover the radius (more rings at the coarsest level).
+        """
+        i = self.position.get(str(zip_code))
+        if i is None:
+            return pd.DataFrame({"zip_code_prefix": [], "distance_km": []})
+        # Cells are narrowest east-west, by cos(latitude)
+        km_per_cell = {zoom: grid_cell_degrees(zoom) * KM_PER_DEGREE * math.cos(math.radians(self.lat[i]))
+                       for zoom in INDEX_ZOOM_LEVELS}
+        zoom = next((z for z in reversed(INDEX_ZOOM_LEVELS) if km_per_cell[z] >= radius_km), INDEX_ZOOM_LEVELS[0])
+        rings = max(1, math.ceil(radius_km / km_per_cell[zoom]))
+
+        members = self.members[zoom]
+        candidates = [members[cell] for cell in self.neighbor_cells(tuple(self.cells[zoom][i]), rings) if cell in members]
+        ids = np.concatenate(candidates)
+        distance = haversine(self.lon[i], self.lat[i], self.lon[ids], self.lat[ids])
+        within = distance <= radius_km
+        order = np.argsort(distance[within], kind="stable")
+        return pd.DataFrame({
+            "zip_code_prefix": self.zips[ids[within]][order],
+            "distance_km": distance[within][order],
+        })
+
+    def rollup(self, frame: pd.DataFrame, zoom: int, zip_column: str = "zip_code_prefix",
+               count_column: str = "point_count", value_columns=()) -> pd.DataFrame:
+        """Aggregates per-zip rows into the grid cells of a map zoom level.
+
+        Returns the columns of olist_report.spatial_bin_query: cell_y, cell_x,
+        the count-weighted centroid of the cell's zips as lat/lon, count_column
+        and value_columns summed. Cells come from the indexed level returned by
+        index_zoom(zoom); rows whose zip is not indexed are dropped.
+        """
+        if frame.empty:
+            return pd.DataFrame(columns=["cell_y", "cell_x", "lat", "lon", count_column, *value_columns])
+        zoom = index_zoom(zoom)
+        positions = self._positions(frame[zip_column])
+        known = positions.notna().to_numpy()
+        ids = positions[known].astype(np.int64).to_numpy()
+        frame = frame[known]
+        counts = frame[count_column].to_numpy(dtype=np.float64)
+        cells = self.cells[zoom][ids]
+        df = pd.DataFrame({
+            "cell_y": cells[:, 0],
+            "cell_x": cells[:, 1],
+            "lat": self.lat[ids] * counts,
+            "lon": self.lon[ids] * counts,
+            count_column: counts,
+            **{column: frame[column].to_numpy() for column in value_columns},
+        })
+        cells = df.groupby(["cell_y", "cell_x"], as_index=False).sum()
+        cells["lat"] /= cells[count_column]
+        cells["lon"] /= cells[count_column]
+        return cells